@@ -0,0 +1,79 @@
+"""请求合并：页面将同一时刻发起的多个 GET 请求合并为一次 POST，由 BatchDispatcher 并发执行后一起返回"""
+import asyncio
+import inspect
+import logging
+from typing import Any, Callable, Dict, List, Mapping
+from urllib.parse import parse_qsl, urlsplit
+
+from .types import RawJSON, dumps, encode_response
+
+Handler = Callable[[Dict[str, str], Any], Any]
+
+logger = logging.getLogger(__name__)
+
+
+class BatchDispatcher:
+    """
+    批量请求的分发器，配合 Page.render(batch_url=...) 使用。
+    批量接口收到的请求体为 [{url, method, data}, ...]，
+    handle 按 url 的路径找到注册的处理函数并发执行，返回与请求一一对应的 [{status, data}, ...]，
+    其中 data 为各处理函数编码好的接口返回内容。
+    """
+
+    def __init__(self, max_requests: int = 50, timeout: float = None):
+        self.max_requests = max_requests
+        """单次批量请求中最多包含的请求数"""
+        self.timeout = timeout
+        """单个请求的超时秒数"""
+        self._routes: Dict[str, Handler] = {}
+
+    def route(self, path: str, handler: Handler = None):
+        """
+        注册处理函数，handler(params, data) 接收查询参数与请求体，返回 BaseAmisApiOut 或其 data，可以是协程函数。
+        不传 handler 时作为装饰器使用。
+        """
+        if handler is None:
+            return lambda func: self.route(path, func) or func
+        self._routes[path] = handler
+
+    async def _call(self, request: Mapping[str, Any]) -> Dict[str, Any]:
+        if not isinstance(request, Mapping) or not isinstance(request.get('url'), str):
+            return {'status': 400, 'data': {'status': 400, 'msg': 'invalid request'}}
+        parts = urlsplit(request['url'])
+        handler = self._routes.get(parts.path)
+        if handler is None:
+            return {'status': 404, 'data': {'status': 404, 'msg': f'{parts.path} not found'}}
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        try:
+            result = handler(params, request.get('data'))
+            if inspect.isawaitable(result):
+                result = await asyncio.wait_for(result, self.timeout)
+            return {'status': 200, 'data': RawJSON(encode_response(result))}
+        except asyncio.TimeoutError:
+            return {'status': 504, 'data': {'status': 504, 'msg': 'timeout'}}
+        except Exception:
+            # 与 PushHub 一致，异常信息只记录日志，不返回给浏览器
+            logger.exception('batched request %s failed', parts.path)
+            return {'status': 500, 'data': {'status': 500, 'msg': 'internal error'}}
+
+    async def handle(self, requests: List[Mapping[str, Any]]) -> RawJSON:
+        """并发执行批量请求，返回编码好的响应体；某个请求出错不影响其他请求"""
+        if not isinstance(requests, list):
+            return RawJSON(dumps([]))
+        if len(requests) > self.max_requests:
+            error = {'status': 413, 'data': {'status': 413, 'msg': f'at most {self.max_requests} requests per batch'}}
+            return RawJSON(dumps([error] * len(requests)))
+        responses = await asyncio.gather(*(self._call(r) for r in requests))
+        return RawJSON(dumps(responses))
+
+
+def batch_fetcher(url: str, wait: int = 0, max_requests: int = 50) -> str:
+    """
+    生成注入到页面模板中的 fetcher 配置，wait 为收集请求的毫秒数，0 表示只合并同一时刻发起的请求。
+    带自定义请求头（如鉴权、租户）或 withCredentials 的请求不合并，按原样单独发送；
+    api.config 中的 cancelExecutor、timeout 对合并的请求同样生效。
+    """
+    from .components import env
+
+    return env.get_template('batch_fetcher.jinja2').render(
+        batch_url=dumps(url), batch_wait=int(wait), batch_max=int(max_requests))
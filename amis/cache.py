@@ -0,0 +1,243 @@
+"""进程内的异步接口响应缓存：相同请求并发时只计算一次（single-flight），结果在短时间内复用"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterator, Mapping, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+
+from .types import AmisAPI, BaseAmisModel, RawJSON, dumps, encode_response
+from .utils import split_api
+
+Compute = Callable[[], Awaitable[Any]]
+
+IGNORED_PARAMS = {'_', '_t', '_ts'}
+"""计算缓存键时忽略的参数，通常是防缓存用的时间戳"""
+
+READ_API_FIELDS = ('source', 'initApi', 'schemaApi', 'autoComplete')
+"""只读取数据、可以在客户端缓存的接口字段"""
+SOURCE_API_TYPES = {'select', 'radios', 'checkboxes', 'button-group-select', 'list-select', 'chained-select',
+                    'nested-select', 'tree-select', 'input-tree', 'input-tag', 'input-text', 'input-password',
+                    'matrix-checkboxes', 'picker', 'transfer', 'transfer-picker', 'tabs-transfer',
+                    'tabs-transfer-picker', 'mapping', 'nav', 'steps', 'timeline'}
+"""source 为接口地址的组件类型，其他组件（Table、CRUD、Each 等）的 source 是数据映射"""
+REPEATED_TYPES = {'input-table', 'combo', 'each', 'table', 'crud', 'list', 'cards'}
+"""其中的组件会按数据行重复渲染的组件类型"""
+
+
+def request_key(url: str, method: str = 'get', params: Mapping[str, Any] = None, data: Any = None,
+                page_field: str = 'page', per_page_field: str = 'perPage') -> str:
+    """
+    规范化的请求键：参数与地址中的查询参数合并后排序，分页参数按整数比较，
+    忽略 IGNORED_PARAMS 中的参数；请求体按内容摘要参与比较。
+    """
+    parts = urlsplit(url)
+    params = params or {}
+    # 重复的查询参数（如 id=1&id=2）保留全部值
+    pairs = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in params]
+    pairs.extend(params.items())
+    items = []
+    for k, v in pairs:
+        if k in IGNORED_PARAMS:
+            continue
+        if k in (page_field, per_page_field):
+            try:
+                v = int(v)
+            except (TypeError, ValueError):
+                pass
+        items.append((k, v if isinstance(v, (list, dict)) else str(v)))
+    # 按参数名稳定排序，同名参数保持原有顺序
+    items.sort(key=lambda kv: kv[0])
+    raw = dumps([method.lower(), parts.path, items, data], str, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def interval_ttl(node: Any, ratio: float = 0.5, default: float = 1.0) -> float:
+    """
+    由组件的轮询间隔（毫秒）推算缓存秒数，为间隔的 ratio 倍：
+    无论多少客户端在轮询，每个间隔内同一请求最多计算 1/ratio 次，数据最多滞后 ratio 个间隔。
+    组件没有配置 interval 时返回 default。
+    """
+    interval = node.get('interval') if isinstance(node, dict) else getattr(node, 'interval', None)
+    try:
+        return float(interval) / 1000 * ratio if interval else default
+    except (TypeError, ValueError):
+        return default
+
+
+class ResponseCache:
+    """
+    异步的 single-flight 响应缓存：
+    - 同一请求键同时只有一个计算在执行，其余调用等待同一结果
+    - 结果编码一次后以 RawJSON 形式缓存 ttl 秒，直接作为响应体返回
+    - 计算出错时错误会传给所有等待者，不会被缓存
+    """
+
+    def __init__(self, ttl: float = 1.0, max_size: int = 1024):
+        self.ttl = ttl
+        """默认缓存秒数"""
+        self.max_size = max_size
+        """最多缓存的响应数"""
+        self.hits = 0
+        """命中缓存的次数"""
+        self.coalesced = 0
+        """与正在执行的计算合并的次数"""
+        self.misses = 0
+        """实际计算的次数"""
+        self._entries: 'OrderedDict[str, Tuple[float, str, RawJSON]]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+
+    def key_for(self, node: Any, params: Mapping[str, Any] = None, data: Any = None, api: Any = None) -> str:
+        """按组件（CRUD/Service 等）的 api 与分页字段配置计算请求键"""
+        method, url = split_api(api if api is not None else getattr(node, 'api', None))
+        return request_key(url, method, params, data,
+                           getattr(node, 'pageField', None) or 'page',
+                           getattr(node, 'perPageField', None) or 'perPage')
+
+    async def fetch(self, key: str, compute: Compute, ttl: float = None, path: str = '') -> RawJSON:
+        """
+        取出请求键对应的响应体，没有缓存时调用 compute 计算，
+        compute 返回 BaseAmisApiOut 或其 data；path 用于按地址前缀失效。
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            del self._entries[key]
+        future = self._inflight.get(key)
+        if future is None:
+            self.misses += 1
+            future = self._inflight[key] = asyncio.ensure_future(
+                self._compute(key, compute, self.ttl if ttl is None else ttl, path))
+        else:
+            self.coalesced += 1
+        # 某个调用方被取消时不应影响共享的计算
+        return await asyncio.shield(future)
+
+    async def fetch_for(self, node: Any, compute: Compute, params: Mapping[str, Any] = None, data: Any = None,
+                        api: Any = None, ratio: float = 0.5) -> RawJSON:
+        """按组件计算请求键，并由组件的 interval 推算缓存时间"""
+        path = urlsplit(split_api(api if api is not None else getattr(node, 'api', None))[1]).path
+        return await self.fetch(self.key_for(node, params, data, api), compute,
+                                interval_ttl(node, ratio, self.ttl), path)
+
+    async def _compute(self, key: str, compute: Compute, ttl: float, path: str) -> RawJSON:
+        generation = self._generation
+        try:
+            body = RawJSON(encode_response(await compute()))
+            # 计算期间缓存被失效过时，结果可能已过期，只返回不缓存
+            if ttl > 0 and generation == self._generation:
+                self._entries[key] = (time.monotonic() + ttl, path, body)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            return body
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def invalidate(self, path: Optional[str] = None) -> int:
+        """失效地址以 path 开头的缓存，不传时失效全部，返回失效的条数；之后的请求不再合并到正在执行的计算"""
+        self._generation += 1
+        self._inflight.clear()
+        if path is None:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+        keys = [k for k, entry in self._entries.items() if entry[1].startswith(path)]
+        for k in keys:
+            del self._entries[k]
+        return len(keys)
+
+
+def share_api_cache(root: Any, ttl: int = 30000) -> int:
+    """
+    为组件树中相同的只读接口（READ_API_FIELDS 中 GET 方式的接口，source 只处理 SOURCE_API_TYPES 中的组件）
+    设置统一的客户端缓存时间（毫秒）：
+    出现多次的接口，以及位于 InputTable、Combo 等重复渲染的组件中的接口，会被规范化为 AmisAPI 并设置 cache，
+    已配置了 cache 的接口沿用其中最大的值。
+    返回每次页面加载至少可以省去的重复请求数（按行重复渲染的次数无法静态得知，不计入）。
+    """
+    groups: Dict[str, list] = {}
+    stack = [(node, False) for node in reversed(list(_iter_nodes(root)))]
+    while stack:
+        node, repeated = stack.pop()
+        values = node if isinstance(node, dict) else node.__dict__
+        for field in READ_API_FIELDS:
+            api = values.get(field)
+            if not api or isinstance(api, bool):
+                continue
+            if field == 'source' and values.get('type') not in SOURCE_API_TYPES:
+                continue
+            method, url = split_api(api)
+            # 以 $ 开头的是数据映射（如 ${items}），不是接口
+            if method != 'get' or not url or url.startswith('$'):
+                continue
+            if isinstance(api, str):
+                options = {'url': url}
+            else:
+                options = api.to_dict() if isinstance(api, BaseAmisModel) else dict(api)
+                options.pop('method', None)
+                options.pop('cache', None)
+                # 与默认值相同的配置不影响请求，忽略后再比较
+                defaults = AmisAPI.__fields__
+                for k in [k for k, v in options.items() if k in defaults and defaults[k].default == v]:
+                    del options[k]
+            key = dumps(options, str, sort_keys=True)
+            groups.setdefault(key, []).append((node, field, api, repeated))
+        child_repeated = repeated or values.get('type') in REPEATED_TYPES
+        children = []
+        for value in values.values():
+            children.extend(_iter_nodes(value))
+        stack.extend((child, child_repeated) for child in reversed(children))
+
+    eliminated = 0
+    for uses in groups.values():
+        if len(uses) == 1 and not uses[0][3]:
+            continue
+        eliminated += len(uses) - 1
+        current = [_api_cache(api) for _, _, api, _ in uses]
+        shared = max([c for c in current if c] or [ttl])
+        for node, field, api, _ in uses:
+            if isinstance(node, dict):
+                node[field] = _with_cache(api, shared)
+            else:
+                setattr(node, field, _with_cache(api, shared))
+    return eliminated
+
+
+def _iter_nodes(value: Any) -> Iterator[Union[BaseAmisModel, dict]]:
+    """
+    与 iter_children 相同，但也包括以字典形式配置的组件（带 type 或只读接口字段的字典），
+    如 TableColumn.quickEdit、InputTable 的列
+    """
+    if isinstance(value, BaseAmisModel):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _iter_nodes(item)
+    elif isinstance(value, dict):
+        if 'type' in value or any(field in value for field in READ_API_FIELDS):
+            yield value
+        else:
+            for item in value.values():
+                yield from _iter_nodes(item)
+
+
+def _api_cache(api: Any) -> Optional[int]:
+    if isinstance(api, dict):
+        return api.get('cache')
+    return getattr(api, 'cache', None)
+
+
+def _with_cache(api: Any, cache: int) -> Any:
+    if isinstance(api, str):
+        # 不填充 dataType 等默认值，保持输出与原字符串等价
+        return AmisAPI.construct(url=split_api(api)[1], method='get', cache=cache,
+                                 dataType=None, qsOptions=None, replaceData=None)
+    if isinstance(api, dict):
+        return {**api, 'cache': cache}
+    api.cache = cache
+    return api
@@ -1,13 +1,17 @@
 """详细文档阅读地址: https://baidu.gitee.io/amis/zh-CN/components"""
 from pathlib import Path
-from typing import Literal
+from typing import Literal, TYPE_CHECKING
 from typing import Union, List, Optional, Any, Dict, Tuple
 
 from jinja2 import Environment, FileSystemLoader
-from pydantic import Field
+from pydantic import Field, StrictInt
 
 from .constants import LevelEnum, DisplayModeEnum, SizeEnum, TabsModeEnum
-from .types import API, Expression, AmisNode, SchemaNode, Template, BaseAmisModel, OptionsNode, Tpl
+from .types import API, Expression, AmisNode, SchemaNode, Template, BaseAmisModel, OptionsNode, Tpl, RawJSON, ArrayData
+
+if TYPE_CHECKING:
+    from .condition import ConditionCompiler
+    from .validation import FormValidator
 
 env = Environment(loader=FileSystemLoader(Path(__file__).parent / 'templates'))
 
@@ -116,6 +120,8 @@ class Page(AmisNode):
     """Header 区域 dom 类名"""
     initApi: API = None
     """Page 用来获取初始数据的 api。返回的数据可以整个 page 级别使用。"""
+    data: Union[RawJSON, dict] = None
+    """页面的初始数据"""
     initFetch: bool = True
     """是否起始拉取 initApi"""
     initFetchOn: Expression = None
@@ -141,9 +147,17 @@ class Page(AmisNode):
             routerModel:str = 'createHashHistory',
             requestAdaptor: str = '',
             responseAdaptor: str = '',
+            batch_url: str = '',
+            batch_wait: int = 0,
+            hydrate: Any = None,
 
     ) -> str:
-        """渲染html模板"""
+        """
+        渲染html模板
+        batch_url 不为空时，页面中同一时刻发起的 GET 请求会合并为一次 POST 发送到该地址，
+        batch_wait 为收集请求的毫秒数，服务端使用 amis.batch.BatchDispatcher 处理
+        hydrate 不为空时，在服务端执行 initApi 等初始化接口并将结果内联到页面中，用法见 amis.hydrate.hydrate
+        """
         if theme == 'default':
             theme_css = 'sdk.css'
             theme_name = 'cxd'
@@ -151,9 +165,20 @@ class Page(AmisNode):
             theme_css = f'{theme}.css'
             theme_name = theme
         template_name = template_name or self.__default_template_path__
+        page = self
+        if hydrate is not None:
+            from .hydrate import hydrate as hydrate_page
+
+            page = self.copy(deep=True)
+            hydrate_page(page, hydrate)
+        fetcher = ''
+        if batch_url:
+            from .batch import batch_fetcher
+
+            fetcher = batch_fetcher(batch_url, batch_wait)
         return env.get_template(template_name).render(
             **{
-                'AmisSchemaJson': self.to_json(),
+                'AmisSchemaJson': page.to_json(),
                 'locale': locale,
                 'cdn': cdn,
                 'version': version,
@@ -163,7 +188,8 @@ class Page(AmisNode):
                 'theme_name': theme_name,
                 'routerModel':routerModel,
                 'requestAdaptor': requestAdaptor,
-                'responseAdaptor': responseAdaptor
+                'responseAdaptor': responseAdaptor,
+                'fetcher': fetcher
             }
         )
 
@@ -1113,6 +1139,8 @@ class Service(AmisNode):
     """内容容器"""
     api: API = None
     """初始化数据域接口地址"""
+    data: Union[RawJSON, dict] = None
+    """初始数据"""
     ws: Union[str, dict] = None
     """WebScocket 地址"""
     dataProvider: str = None
@@ -1311,9 +1339,9 @@ class Validation(BaseAmisModel):
     """最小长度。"""
     maxLength: int = None
     """最大长度。"""
-    maximum: int = None
+    maximum: Union[StrictInt, float] = None
     """最大值。"""
-    minimum: int = None
+    minimum: Union[StrictInt, float] = None
     """最小值。"""
     equals: str = None
     """当前值必须完全等于 xxx。"""
@@ -1486,6 +1514,8 @@ class Form(AmisNode):
     """Form 用来保存数据的 api。"""
     initApi: API = None
     """Form 用来获取初始数据的 api。"""
+    data: Union[RawJSON, dict] = None
+    """表单的初始数据"""
     rules: List = None
     """表单组合校验规则 Array<{rule:string;message:string}>"""
     interval: int = None
@@ -1561,6 +1591,20 @@ class Form(AmisNode):
     closeDialogOnSubmit: bool = None
     """提交的时候是否关闭弹窗。当 form 里面有且只有一个弹窗的时候，本身提交会触发弹窗关闭，此属性可以关闭此行为"""
 
+    def compile_validator(self) -> "FormValidator":
+        """
+        根据表单项的 name、required、validations 及 InputNumber 的 min、max 编译服务端校验器，
+        visibleOn/hiddenOn/requiredOn 按提交的数据求值，支持嵌套的 Combo、InputTable、InputSubForm，详见 amis.validation
+        """
+        from .validation import compile_validator
+        return compile_validator(self)
+
+    @classmethod
+    def from_model(cls, model: type, api: API = None, **kwargs) -> "Form":
+        """由 pydantic 模型、dataclass 或 SQLAlchemy 模型生成表单，结果会被缓存，详见 amis.schema.form_from_model"""
+        from .schema import form_from_model
+        return form_from_model(model, api, **kwargs)
+
 
 class Options(FormItem):
     """选择器表单项"""
@@ -1936,6 +1980,11 @@ class ConditionBuilder(FormItem):
     selectMode: Literal["list", "tree"] = "list"
     """组合条件左侧选项类型"""
 
+    def compiler(self, **kwargs) -> "ConditionCompiler":
+        """生成绑定到当前字段定义的条件编译器，可将条件编译为 SQL 或 numpy 掩码，详见 amis.condition"""
+        from .condition import ConditionCompiler
+        return ConditionCompiler(self, **kwargs)
+
 
 class DiffEditor(FormItem):
     """对比编辑器"""
@@ -3334,6 +3383,8 @@ class InputTree(FormItem):
     """动态选项组"""
     autoComplete: API = None
     """自动提示补全"""
+    deferApi: API = None
+    """用来延时加载选项的接口，选项中有 defer 为 true 的节点展开时会调用此接口拉取子节点"""
     multiple: bool = False
     """是否多选"""
     delimiter: Union[str, bool] = False
@@ -3523,7 +3574,7 @@ class Images(AmisNode):
     """外层 CSS 类名"""
     defaultImage: str = None
     """默认展示图片"""
-    value: Union[str, List[str], List[dict]] = None
+    value: Union[str, ArrayData, List[str], List[dict]] = None
     """图片数组"""
     source: str = None
     """数据源"""
@@ -3755,6 +3806,21 @@ class CRUD(AmisNode):
     defaultChecked: bool = None
     """当可批量操作时，默认是否全部勾选。"""
 
+    @classmethod
+    def from_dataframe(cls, df: Any, api: API, **kwargs) -> "CRUD":
+        """
+        根据 pandas DataFrame 的列类型生成 CRUD，日期时间列为 Date，分类列为 Mapping，数值列右对齐，
+        接口用 amis.crud.DataFrameBackend 处理，详见 amis.crud.crud_from_dataframe
+        """
+        from .crud import crud_from_dataframe
+        return crud_from_dataframe(df, api, **kwargs)
+
+    @classmethod
+    def from_model(cls, model: type, api: API, **kwargs) -> "CRUD":
+        """由 pydantic 模型、dataclass 或 SQLAlchemy 模型生成 CRUD，结果会被缓存，详见 amis.schema.crud_from_model"""
+        from .schema import crud_from_model
+        return crud_from_model(model, api, **kwargs)
+
 
 class AmisList(AmisNode):
     """列表"""
@@ -4161,13 +4227,13 @@ class Chart(AmisNode):
     """内容容器"""
     api: API = None
     """配置项接口地址"""
-    source: Union[dict, str] = None
+    source: Union[RawJSON, dict, str] = None
     """通过数据映射获取数据链中变量值作为配置"""
     initFetch: bool = None
     """组件初始化时，是否请求接口"""
     interval: int = None
     """刷新时间(最小 1000)"""
-    config: Union[dict, str] = None
+    config: Union[RawJSON, dict, str] = None
     """设置 eschars 的配置项,当为string的时候可以设置 function 等配置项"""
     style: dict = None
     """设置根元素的 style"""
@@ -4254,7 +4320,7 @@ class Each(AmisNode):
     """循环渲染器"""
     type: str = 'each'
     """指定为 each 渲染器"""
-    value: list = []
+    value: Union[RawJSON, ArrayData, list] = []
     """用于循环的值"""
     name: str = None
     """获取数据域中变量"""
@@ -4272,7 +4338,7 @@ class Json(AmisNode):
     """指定为 json 渲染器，如果在 Table、Card 和 List 中，为"json"；在 Form 中用作静态展示，为"static-json"""
     className: str = None
     """外层 CSS 类名"""
-    value: Union[dict, str] = None
+    value: Union[RawJSON, dict, str] = None
     """json 值，如果是 string 会自动 parse"""
     source: str = ""
     """通过数据映射获取数据链中的值"""
@@ -4344,7 +4410,7 @@ class Mapping(AmisNode):
     """外层 CSS 类名"""
     placeholder: str = None
     """占位文本"""
-    map: Union[dict, List[dict]] = None
+    map: Union[RawJSON, dict, List[dict]] = None
     """映射配置"""
     source: Union[str, API] = None
     """API 或 数据映射"""
@@ -4364,6 +4430,16 @@ class Mapping(AmisNode):
     """
 
 
+class ColumnDate(Date, TableColumn):
+    """日期列"""
+    pass
+
+
+class ColumnMapping(Mapping, TableColumn):
+    """映射列"""
+    pass
+
+
 class Progress(AmisNode):
     """进度条"""
     type: str = "progress"
@@ -4658,7 +4734,7 @@ class Dialog(AmisNode):
     """如果设置此属性，则该 Dialog 只读没有提交操作。"""
     actions: List[Action] = None
     """如果想不显示底部按钮，可以配置：[]  "【确认】和【取消】"""
-    data: dict = None
+    data: Union[RawJSON, dict] = None
     """支持数据映射，如果不设定将默认将触发按钮的上下文中继承数据。"""
 
 
@@ -4889,6 +4965,8 @@ class Sparkline(AmisNode):
     """高度"""
     placeholder: str = None
     """数据为空时显示的内容"""
+    value: Union[RawJSON, ArrayData, list] = None
+    """数值列表，可以是numpy数组，不配置时使用 name 关联的变量"""
 
 
 class Status(AmisNode):
@@ -0,0 +1,259 @@
+"""将 ConditionBuilder 产生的条件编译为参数化的 SQL WHERE 子句或 numpy 向量化掩码"""
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+
+from .components import ConditionBuilder
+from .types import dumps
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_OPERATORS = {
+    'text': ['equal', 'not_equal', 'is_empty', 'is_not_empty', 'like', 'not_like', 'starts_with', 'ends_with'],
+    'number': ['equal', 'not_equal', 'less', 'less_or_equal', 'greater', 'greater_or_equal', 'between',
+               'not_between', 'is_empty', 'is_not_empty'],
+    'select': ['select_equals', 'select_not_equals', 'select_any_in', 'select_not_any_in'],
+    'boolean': ['equal', 'not_equal'],
+}
+"""amis 中各类型字段默认支持的操作符"""
+DEFAULT_OPERATORS['date'] = DEFAULT_OPERATORS['datetime'] = DEFAULT_OPERATORS['time'] = DEFAULT_OPERATORS['number']
+
+_COMPARE = {'equal': '=', 'not_equal': 'IS NOT', 'less': '<', 'less_or_equal': '<=', 'greater': '>',
+            'greater_or_equal': '>=', 'select_equals': '=', 'select_not_equals': 'IS NOT'}
+_LIKE = {'like': '%{}%', 'not_like': '%{}%', 'starts_with': '{}%', 'ends_with': '%{}'}
+
+Mask = Callable[[Mapping[str, Any]], Any]
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _escape_like(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def fingerprint(condition: Mapping) -> str:
+    """条件的指纹，忽略前端生成的 id"""
+
+    def strip(value):
+        if isinstance(value, dict):
+            return {k: strip(v) for k, v in value.items() if k != 'id'}
+        if isinstance(value, list):
+            return [strip(v) for v in value]
+        return value
+
+    return hashlib.sha1(dumps(strip(condition), sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ConditionCompiler:
+    """
+    绑定到 ConditionBuilder 定义的条件编译器：
+    - 按声明的 fields 及其 operators 校验条件树，未声明的字段、操作符会抛出 ValueError
+    - to_sql 生成 SQLite 方言的参数化 WHERE 子句
+    - to_mask 生成作用于列式数据（字段名 -> numpy 数组）的布尔掩码
+    编译结果按条件指纹缓存。
+    """
+
+    def __init__(self, builder: ConditionBuilder, columns: Dict[str, str] = None, cache_size: int = 256):
+        self.fields: Dict[str, Tuple[str, List[str]]] = {}
+        """字段名 -> (字段类型, 允许的操作符)"""
+        stack = list(builder.fields or [])
+        while stack:
+            field = stack.pop()
+            children = getattr(field, 'children', None)
+            if children:
+                stack.extend(children)
+                continue
+            if isinstance(field, dict):
+                field = ConditionBuilder.Field.parse_obj(field)
+            if 'operators' in field.__fields_set__ or field.type not in DEFAULT_OPERATORS:
+                operators = field.operators
+                operators = list(operators) if isinstance(operators, (list, dict)) else [operators]
+                operators = [o if isinstance(o, str) else o.get('value') for o in operators]
+            else:
+                operators = DEFAULT_OPERATORS[field.type]
+            self.fields[field.name] = (field.type, operators)
+        self.columns = columns or {}
+        """字段名与数据列名不一致时的映射"""
+        self.cache_size = cache_size
+        self._sql_cache: 'OrderedDict[str, Tuple[str, List[Any]]]' = OrderedDict()
+        self._mask_cache: 'OrderedDict[str, Mask]' = OrderedDict()
+
+    def _cached(self, cache: OrderedDict, condition: Mapping, build: Callable):
+        key = fingerprint(condition)
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        result = cache[key] = build(condition)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return result
+
+    def _column(self, name: str) -> str:
+        return self.columns.get(name, name)
+
+    def _check(self, item: Mapping) -> Tuple[str, str, str, Any]:
+        left = item.get('left') or {}
+        if left.get('type', 'field') != 'field' or left.get('field') not in self.fields:
+            raise ValueError(f'unknown field {left.get("field")!r}')
+        field = left['field']
+        field_type, operators = self.fields[field]
+        op = item.get('op')
+        if op not in operators:
+            raise ValueError(f'operator {op!r} is not allowed on field {field!r}')
+        right = item.get('right')
+        if isinstance(right, dict):
+            if right.get('type') != 'field' or right.get('field') not in self.fields:
+                raise ValueError(f'unsupported right value {right!r}')
+        elif op in ('between', 'not_between'):
+            if not isinstance(right, (list, tuple)) or len(right) != 2:
+                raise ValueError(f'{op} requires two values')
+            right = [self._coerce(field_type, v) for v in right]
+        elif op in ('select_any_in', 'select_not_any_in'):
+            right = right.split(',') if isinstance(right, str) else list(right or [])
+        elif op not in ('is_empty', 'is_not_empty'):
+            right = self._coerce(field_type, right)
+        return field, field_type, op, right
+
+    @staticmethod
+    def _coerce(field_type: str, value: Any) -> Any:
+        if field_type == 'number' and isinstance(value, str):
+            try:
+                return int(value)
+            except ValueError:
+                return float(value)
+        return value
+
+    def validate(self, condition: Mapping):
+        """校验条件树，不合法时抛出 ValueError"""
+        for child in condition.get('children') or []:
+            if 'children' in child:
+                self.validate(child)
+            else:
+                self._check(child)
+
+    def to_sql(self, condition: Mapping) -> Tuple[str, List[Any]]:
+        """编译为 SQLite 的 WHERE 子句及参数，空条件编译为 '1'"""
+        return self._cached(self._sql_cache, condition, self._build_sql)
+
+    def _build_sql(self, group: Mapping) -> Tuple[str, List[Any]]:
+        parts, params = [], []
+        for child in group.get('children') or []:
+            if 'children' in child:
+                sql, child_params = self._build_sql(child)
+            else:
+                sql, child_params = self._item_sql(child)
+            parts.append(sql)
+            params.extend(child_params)
+        joiner = ' OR ' if group.get('conjunction') == 'or' else ' AND '
+        sql = '(' + joiner.join(parts) + ')' if parts else '1'
+        if group.get('not'):
+            sql = f'NOT {sql}'
+        return sql, params
+
+    def _item_sql(self, item: Mapping) -> Tuple[str, List[Any]]:
+        field, field_type, op, right = self._check(item)
+        column = _quote(self._column(field))
+        if isinstance(right, dict):
+            if op not in _COMPARE:
+                raise ValueError(f'operator {op!r} does not support field values')
+            return f'{column} {_COMPARE[op]} {_quote(self._column(right["field"]))}', []
+        if op in _COMPARE:
+            return f'{column} {_COMPARE[op]} ?', [right]
+        if op in _LIKE:
+            sql = f"{column} {'NOT LIKE' if op == 'not_like' else 'LIKE'} ? ESCAPE '\\'"
+            return sql, [_LIKE[op].format(_escape_like(right))]
+        if op in ('between', 'not_between'):
+            return f'{column} {"NOT BETWEEN" if op == "not_between" else "BETWEEN"} ? AND ?', list(right)
+        if op in ('select_any_in', 'select_not_any_in'):
+            if not right:
+                return ('0' if op == 'select_any_in' else '1'), []
+            marks = ','.join('?' * len(right))
+            return f'{column} {"NOT IN" if op == "select_not_any_in" else "IN"} ({marks})', list(right)
+        empty = f"({column} IS NULL OR {column} = '')" if field_type == 'text' else f'{column} IS NULL'
+        return (empty if op == 'is_empty' else f'NOT {empty}'), []
+
+    def to_mask(self, condition: Mapping, data: Mapping[str, Any]) -> Any:
+        """在列式数据上计算条件，返回布尔数组"""
+        if np is None:
+            raise RuntimeError('numpy is required for to_mask')
+        return self._cached(self._mask_cache, condition, self._build_mask)(data)
+
+    def _build_mask(self, group: Mapping) -> Mask:
+        children = [self._build_mask(c) if 'children' in c else self._item_mask(c)
+                    for c in group.get('children') or []]
+        combine = np.logical_or if group.get('conjunction') == 'or' else np.logical_and
+        negate = bool(group.get('not'))
+
+        def mask(data):
+            if not children:
+                size = len(next(iter(data.values()))) if data else 0
+                result = np.ones(size, dtype=bool)
+            else:
+                result = children[0](data)
+                for child in children[1:]:
+                    result = combine(result, child(data))
+            return ~result if negate else result
+
+        return mask
+
+    def _item_mask(self, item: Mapping) -> Mask:
+        field, field_type, op, right = self._check(item)
+        column = self._column(field)
+        right_column = self._column(right['field']) if isinstance(right, dict) else None
+
+        def value(data, v):
+            if right_column is not None:
+                return data[right_column]
+            arr = data[column]
+            if arr.dtype.kind == 'M':
+                return np.datetime64(v)
+            return v
+
+        def text(data):
+            arr = np.asarray(data[column])
+            return np.char.lower(arr.astype(str))
+
+        def empty(data):
+            arr = np.asarray(data[column])
+            if arr.dtype.kind == 'f':
+                return np.isnan(arr)
+            if arr.dtype.kind == 'M':
+                return np.isnat(arr)
+            if arr.dtype.kind == 'O':
+                return np.equal(arr, None) | (arr == '') if field_type == 'text' else np.equal(arr, None)
+            return arr == '' if arr.dtype.kind == 'U' else np.zeros(len(arr), dtype=bool)
+
+        if op in ('equal', 'select_equals'):
+            return lambda data: np.asarray(data[column]) == value(data, right)
+        if op in ('not_equal', 'select_not_equals'):
+            return lambda data: np.asarray(data[column]) != value(data, right)
+        if op in ('less', 'less_or_equal', 'greater', 'greater_or_equal'):
+            compare = {'less': np.less, 'less_or_equal': np.less_equal, 'greater': np.greater,
+                       'greater_or_equal': np.greater_equal}[op]
+            return lambda data: compare(np.asarray(data[column]), value(data, right))
+        if op in ('between', 'not_between'):
+            def between(data):
+                arr = np.asarray(data[column])
+                result = (arr >= value(data, right[0])) & (arr <= value(data, right[1]))
+                return ~result if op == 'not_between' else result
+
+            return between
+        if op in _LIKE:
+            needle = str(right).lower()
+            if op == 'starts_with':
+                return lambda data: np.char.startswith(text(data), needle)
+            if op == 'ends_with':
+                return lambda data: np.char.endswith(text(data), needle)
+            if op == 'like':
+                return lambda data: np.char.find(text(data), needle) >= 0
+            return lambda data: np.char.find(text(data), needle) < 0
+        if op in ('select_any_in', 'select_not_any_in'):
+            return lambda data: np.isin(np.asarray(data[column]), right, invert=op == 'select_not_any_in')
+        if op == 'is_empty':
+            return empty
+        return lambda data: ~empty(data)
@@ -0,0 +1,698 @@
+"""CRUD 服务端查询引擎：按 amis CRUD 的请求协议解析分页、排序、过滤参数，并在可插拔的数据后端上执行查询"""
+import base64
+import hashlib
+import json
+import sqlite3
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Literal, Mapping, Optional, Sequence, Set, Tuple, Union
+
+from .components import CRUD, ColumnDate, ColumnMapping, Form, Select, Table, TableColumn
+from .expression import expression_vars, WHOLE_SCOPE
+from .types import BaseAmisModel, BaseAmisApiOut, RawJSON, dumps
+from .utils import walk
+
+try:
+    import numpy as np
+    import pandas as pd
+    from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_float_dtype, is_numeric_dtype
+except ImportError:
+    pd = None
+
+FilterOp = Literal['eq', 'like', 'in']
+
+ROW_SCOPED_FIELDS = ('columns', 'card', 'listItem', 'itemAction', 'itemActions', 'labelTpl', 'rowClassNameExpr',
+                     'itemCheckableOn', 'itemDraggableOn', 'itemBadge')
+"""CRUD/Table 中以单行数据为数据域的配置项"""
+EXPRESSION_FIELDS = {'visibleOn', 'hiddenOn', 'disabledOn', 'requiredOn', 'readOnlyOn', 'staticOn', 'activeOn',
+                     'sendOn', 'itemCheckableOn', 'itemDraggableOn', 'expression', 'stopAutoRefreshWhen'}
+"""值为表达式（可以不带 ${}）的配置项"""
+SELECT_TYPES = ('select', 'radios', 'checkboxes', 'button-group-select', 'list-select', 'tree-select', 'input-tree')
+"""按值过滤的选择器类型"""
+
+
+class Filter(BaseAmisModel):
+    """单个过滤条件"""
+    field: str
+    """字段名"""
+    op: FilterOp = 'eq'
+    """比较方式：eq 相等，like 包含(不区分大小写)，in 属于(多个值用英文逗号分隔)"""
+    value: Any = None
+    """过滤值"""
+
+
+class CRUDQuery(BaseAmisModel):
+    """解析后的查询"""
+    page: int = 1
+    """页码，从1开始"""
+    per_page: int = 10
+    """每页条数"""
+    order_by: str = None
+    """排序字段"""
+    order_dir: Literal['asc', 'desc'] = 'asc'
+    """排序方向"""
+    filters: List[Filter] = []
+    """过滤条件，之间为且的关系"""
+    sort_keys: List[str] = []
+    """实际排序的字段，排序字段之后会追加主键保证顺序稳定"""
+    offset: int = 0
+    """跳过的条数"""
+    after: List[Any] = None
+    """键集分页的起点，即上一页最后一行的 sort_keys 值，设置后 offset 不再生效"""
+    count: bool = True
+    """是否需要统计总数，为 False 时只判断是否有下一页"""
+    fields: List[str] = None
+    """需要返回的字段，为 None 时返回全部字段"""
+
+
+class Backend:
+    """数据后端基类，实现 fetch 即可接入查询引擎"""
+
+    def fetch(self, query: CRUDQuery) -> Tuple[List[dict], Optional[int]]:
+        """
+        返回 (行, 总数)，最多返回 per_page + 1 行以便判断是否有下一页；
+        query.count 为 False 时总数返回 None
+        """
+        raise NotImplementedError
+
+    def invalidate(self):
+        """数据发生变化时调用，清除后端自身的缓存"""
+
+    def update_many(self, primary_field: str, batches: Mapping[Tuple[str, ...], List[tuple]]) -> int:
+        """
+        批量更新，batches 为 修改的字段 -> [(字段值..., 主键值)]，同一组字段的修改一次写入；
+        全部写入成功或全部不写入，返回更新的行数
+        """
+        raise NotImplementedError
+
+    def neighbor(self, field: str, value: Any, after: bool, primary_field: str, exclude: Sequence[Any]) -> Any:
+        """field 大于（after 为 False 时小于）value 的最近一个值，跳过主键在 exclude 中的行，没有时返回 None"""
+        raise NotImplementedError
+
+    def get(self, primary_field: str, ids: Sequence[Any], field: str) -> Dict[str, Any]:
+        """主键在 ids 中的行的 field 值，返回 主键文本 -> 值，找不到的行不包含在结果中"""
+        raise NotImplementedError
+
+
+def _sort_key(value: Any) -> tuple:
+    # None 排在最前，不同类型之间按类型名排序，避免比较报错
+    return (value is not None, type(value).__name__ if not isinstance(value, (int, float)) else '', value)
+
+
+class ListBackend(Backend):
+    """内存列表后端，按排序字段缓存排好序的行，简单分页模式下找到足够的行即停止扫描"""
+
+    def __init__(self, rows: List[dict]):
+        self.rows = rows
+        self._sorted: Dict[Tuple[str, ...], Tuple[List[dict], List[tuple]]] = {}
+        self._index: Dict[str, Dict[str, dict]] = {}
+
+    def invalidate(self):
+        self._sorted.clear()
+        self._index.clear()
+
+    def _row_index(self, primary_field: str) -> Dict[str, dict]:
+        index = self._index.get(primary_field)
+        if index is None or len(index) != len(self.rows):
+            index = self._index[primary_field] = {str(r.get(primary_field)): r for r in self.rows}
+        return index
+
+    def update_many(self, primary_field: str, batches: Mapping[Tuple[str, ...], List[tuple]]) -> int:
+        index = self._row_index(primary_field)
+        targets = [(fields, index.get(str(values[-1])), values) for fields, rows in batches.items()
+                   for values in rows]
+        for fields, row, values in targets:
+            if row is not None:
+                row.update(zip(fields, values))
+        self._sorted.clear()
+        return sum(row is not None for _, row, _ in targets)
+
+    def neighbor(self, field: str, value: Any, after: bool, primary_field: str, exclude: Sequence[Any]) -> Any:
+        rows, keys = self._sorted_rows((field, primary_field))
+        exclude = set(map(str, exclude))
+        key = _sort_key(value)
+        start = bisect_left(keys, (key,))
+        if after:
+            candidates = (rows[i] for i in range(start, len(rows)) if keys[i][0] != key)
+        else:
+            candidates = map(rows.__getitem__, range(start - 1, -1, -1))
+        for row in candidates:
+            if str(row.get(primary_field)) not in exclude and row.get(field) is not None:
+                return row.get(field)
+        return None
+
+    def get(self, primary_field: str, ids: Sequence[Any], field: str) -> Dict[str, Any]:
+        index = self._row_index(primary_field)
+        rows = ((str(i), index.get(str(i))) for i in ids)
+        return {key: row.get(field) for key, row in rows if row is not None}
+
+    def _sorted_rows(self, keys: Sequence[str]) -> Tuple[List[dict], List[tuple]]:
+        keys = tuple(keys)
+        if keys not in self._sorted:
+            decorated = sorted(((tuple(_sort_key(r.get(k)) for k in keys), r) for r in self.rows),
+                               key=lambda x: x[0])
+            self._sorted[keys] = ([r for _, r in decorated], [k for k, _ in decorated])
+        return self._sorted[keys]
+
+    @staticmethod
+    def _predicate(filters: List[Filter]):
+        checks = []
+        for f in filters:
+            if f.op == 'like':
+                needle = str(f.value).lower()
+                checks.append(lambda r, k=f.field, n=needle: n in str(r.get(k, '')).lower())
+            elif f.op == 'in':
+                values = set(str(f.value).split(',')) if isinstance(f.value, str) else set(map(str, f.value))
+                checks.append(lambda r, k=f.field, vs=values: str(r.get(k)) in vs)
+            else:
+                checks.append(lambda r, k=f.field, v=f.value: r.get(k) == v or str(r.get(k)) == str(v))
+        return lambda r: all(check(r) for check in checks)
+
+    def fetch(self, query: CRUDQuery) -> Tuple[List[dict], Optional[int]]:
+        rows, keys = self._sorted_rows(query.sort_keys)
+        desc = query.order_dir == 'desc'
+        limit = query.per_page + 1
+        if query.count and query.filters:
+            # 需要总数时无论如何都要完整扫描一遍，直接按 offset 分页
+            ordered = reversed(rows) if desc else rows
+            matched = list(filter(self._predicate(query.filters), ordered))
+            total = len(matched)
+            page = matched[query.offset:query.offset + limit]
+        else:
+            total = len(rows) if query.count else None
+            lo, hi, start = 0, len(rows), query.offset
+            if query.after is not None:
+                after = tuple(_sort_key(v) for v in query.after)
+                if desc:
+                    hi = bisect_left(keys, after)
+                else:
+                    lo = bisect_right(keys, after)
+                start = 0
+            ordered = map(rows.__getitem__, range(hi - 1, lo - 1, -1) if desc else range(lo, hi))
+            if query.filters:
+                ordered = filter(self._predicate(query.filters), ordered)
+            page = list(islice(ordered, start, start + limit))
+        if query.fields is not None:
+            page = [{k: r[k] for k in query.fields if k in r} for r in page]
+        return page, total
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _keyset_condition(keys: Sequence[str], values: Sequence[Any], desc: bool) -> Tuple[str, List[Any]]:
+    """
+    键集分页条件：排在 values 之后的行。按 SQLite 的排序规则 NULL 最小（升序在前、降序在后），
+    逐个字段展开比较，不使用行值比较，因为与 NULL 比较的结果为 NULL 会漏掉行
+    """
+    branches, params = [], []
+    for i, (key, value) in enumerate(zip(keys, values)):
+        column = _quote(key)
+        if value is None:
+            if desc:
+                # 降序时 NULL 排在最后，之后不会再有该字段更小的行
+                condition = None
+            else:
+                condition = f'{column} IS NOT NULL'
+        elif desc:
+            condition = f'({column} < ? OR {column} IS NULL)'
+        else:
+            condition = f'{column} > ?'
+        if condition is not None:
+            equal = [f'{_quote(k)} IS ?' for k in keys[:i]]
+            branches.append('(' + ' AND '.join([*equal, condition]) + ')')
+            params.extend(values[:i])
+            if value is not None:
+                params.append(value)
+    return '(' + (' OR '.join(branches) or '0') + ')', params
+
+
+class SQLiteBackend(Backend):
+    """SQLite 后端，生成参数化的查询语句；简单分页模式下不执行 COUNT(*)，键集分页按字段逐个比较并处理 NULL"""
+
+    def __init__(self, conn: sqlite3.Connection, table: str):
+        self.conn = conn
+        self.table = table
+        self._columns = None
+
+    def columns(self) -> List[str]:
+        """表的全部字段名"""
+        if self._columns is None:
+            self._columns = [row[1] for row in self.conn.execute(f'PRAGMA table_info({_quote(self.table)})')]
+        return self._columns
+
+    def invalidate(self):
+        self._columns = None
+
+    def update_many(self, primary_field: str, batches: Mapping[Tuple[str, ...], List[tuple]]) -> int:
+        table, key = _quote(self.table), _quote(primary_field)
+        count = 0
+        with self.conn:
+            for fields, rows in batches.items():
+                assignments = ', '.join(f'{_quote(f)} = ?' for f in fields)
+                count += self.conn.executemany(f'UPDATE {table} SET {assignments} WHERE {key} = ?', rows).rowcount
+        return count
+
+    def neighbor(self, field: str, value: Any, after: bool, primary_field: str, exclude: Sequence[Any]) -> Any:
+        column = _quote(field)
+        sql = f'SELECT {"MIN" if after else "MAX"}({column}) FROM {_quote(self.table)} ' \
+              f'WHERE {column} {">" if after else "<"} ?'
+        if exclude:
+            sql += f' AND {_quote(primary_field)} NOT IN ({",".join("?" * len(exclude))})'
+        return self.conn.execute(sql, [value, *exclude]).fetchone()[0]
+
+    def get(self, primary_field: str, ids: Sequence[Any], field: str) -> Dict[str, Any]:
+        if not ids:
+            return {}
+        key = _quote(primary_field)
+        sql = f'SELECT {key}, {_quote(field)} FROM {_quote(self.table)} WHERE {key} IN ({",".join("?" * len(ids))})'
+        return {str(k): v for k, v in self.conn.execute(sql, list(ids))}
+
+    def where(self, query: CRUDQuery) -> Tuple[str, List[Any]]:
+        """生成过滤条件的 WHERE 子句（不含键集分页条件）"""
+        clauses, params = [], []
+        for f in query.filters:
+            column = _quote(f.field)
+            if f.op == 'like':
+                clauses.append(f"{column} LIKE ? ESCAPE '\\'")
+                value = str(f.value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                params.append(f'%{value}%')
+            elif f.op == 'in':
+                values = str(f.value).split(',') if isinstance(f.value, str) else list(f.value)
+                clauses.append(f'{column} IN ({",".join("?" * len(values))})')
+                params.extend(values)
+            else:
+                clauses.append(f'{column} = ?')
+                params.append(f.value)
+        return ' AND '.join(clauses), params
+
+    def fetch(self, query: CRUDQuery) -> Tuple[List[dict], Optional[int]]:
+        where, params = self.where(query)
+        table = _quote(self.table)
+        total = None
+        if query.count:
+            sql = f'SELECT COUNT(*) FROM {table}' + (f' WHERE {where}' if where else '')
+            total = self.conn.execute(sql, params).fetchone()[0]
+        conditions, page_params = [where] if where else [], list(params)
+        if query.after is not None:
+            condition, after_params = _keyset_condition(query.sort_keys, query.after, query.order_dir == 'desc')
+            conditions.append(condition)
+            page_params.extend(after_params)
+        columns = '*'
+        if query.fields is not None:
+            existing = set(self.columns())
+            columns = ', '.join(_quote(f) for f in query.fields if f in existing) or '*'
+        sql = f'SELECT {columns} FROM {table}'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        if query.sort_keys:
+            sql += ' ORDER BY ' + ', '.join(f'{_quote(k)} {query.order_dir.upper()}' for k in query.sort_keys)
+        sql += ' LIMIT ? OFFSET ?'
+        page_params.extend((query.per_page + 1, 0 if query.after is not None else query.offset))
+        cursor = self.conn.execute(sql, page_params)
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()], total
+
+
+def _records(frame: Any) -> List[dict]:
+    """将 DataFrame 的行转换为 dict，值为 python 原生类型，日期时间为秒级时间戳，空值为 None"""
+    columns = []
+    for name in frame.columns:
+        series = frame[name]
+        if is_datetime64_any_dtype(series):
+            columns.append([None if pd.isna(t) else int(t.timestamp()) for t in series])
+        else:
+            columns.append(series.astype(object).where(series.notna(), None).tolist())
+    names = [str(name) for name in frame.columns]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+class DataFrameBackend(Backend):
+    """
+    pandas DataFrame 后端，排序、过滤、分页均为向量化操作：
+    按排序字段缓存排好序的行号，过滤条件生成布尔掩码，再按 offset 切片，只有当前页的行会转换为 dict。
+    切片本身已是 O(1)，因此不使用键集分页。
+    update_many 按主键定位行号后整列写入新的 DataFrame，支持 QuickSaveHandler 的快速编辑与拖拽排序。
+    """
+
+    def __init__(self, df: Any):
+        if pd is None:
+            raise RuntimeError('pandas is required for DataFrameBackend')
+        self.df = df.reset_index(drop=True)
+        self._orders: Dict[Tuple[str, ...], 'np.ndarray'] = {}
+        self._texts: Dict[str, Any] = {}
+
+    def invalidate(self):
+        self._orders.clear()
+        self._texts.clear()
+
+    def _order(self, keys: Sequence[str]) -> 'np.ndarray':
+        # 不存在的字段（如没有 id 列时的主键）不参与排序，稳定排序下保持原有顺序
+        keys = tuple(k for k in keys if k in self.df.columns)
+        if keys not in self._orders:
+            if not keys:
+                order = np.arange(len(self.df))
+            else:
+                try:
+                    frame = self.df.sort_values(list(keys), kind='stable', na_position='first')
+                except TypeError:
+                    # 混合类型的列按文本排序
+                    frame = self.df.sort_values(list(keys), kind='stable', na_position='first',
+                                                key=lambda c: c.astype(str) if c.dtype == object else c)
+                order = frame.index.to_numpy()
+            self._orders[keys] = order
+        return self._orders[keys]
+
+    def _text(self, field: str) -> Any:
+        if field not in self._texts:
+            column = self.df[field]
+            self._texts[field] = column.astype(object).where(column.notna(), '').astype(str)
+        return self._texts[field]
+
+    def _mask(self, filters: List[Filter]) -> 'np.ndarray':
+        mask = np.ones(len(self.df), dtype=bool)
+        for f in filters:
+            if f.field not in self.df.columns:
+                mask[:] = False
+                break
+            text = self._text(f.field)
+            if f.op == 'like':
+                matched = text.str.contains(str(f.value), case=False, regex=False)
+            elif f.op == 'in':
+                values = str(f.value).split(',') if isinstance(f.value, str) else list(map(str, f.value))
+                matched = text.isin(values)
+            else:
+                matched = text == str(f.value)
+                column = self.df[f.field]
+                if is_numeric_dtype(column) and not is_bool_dtype(column):
+                    try:
+                        matched |= column == float(f.value)
+                    except (TypeError, ValueError):
+                        pass
+            mask &= matched.to_numpy(dtype=bool)
+        return mask
+
+    def fetch(self, query: CRUDQuery) -> Tuple[List[dict], Optional[int]]:
+        order = self._order(query.sort_keys)
+        if query.order_dir == 'desc':
+            order = order[::-1]
+        if query.filters:
+            order = order[self._mask(query.filters)[order]]
+        total = len(order) if query.count else None
+        frame = self.df.iloc[order[query.offset:query.offset + query.per_page + 1]]
+        if query.fields is not None:
+            frame = frame[[f for f in query.fields if f in frame.columns]]
+        return _records(frame), total
+
+    def _positions(self, primary_field: str, keys: List[Any]) -> 'np.ndarray':
+        # 按主键的文本查找行号，与 ListBackend 一致，找不到的为 -1
+        if primary_field not in self.df.columns:
+            return np.full(len(keys), -1)
+        text = self._text(primary_field)
+        unique = ~text.duplicated(keep='last').to_numpy(dtype=bool)
+        rows = np.flatnonzero(unique)
+        found = pd.Index(text[unique]).get_indexer([str(k) for k in keys])
+        return np.where(found >= 0, rows[found], -1)
+
+    def update_many(self, primary_field: str, batches: Mapping[Tuple[str, ...], List[tuple]]) -> int:
+        columns: Dict[str, Any] = {}
+        count = 0
+        for fields, rows in batches.items():
+            positions = self._positions(primary_field, [values[-1] for values in rows])
+            found = positions >= 0
+            count += int(found.sum())
+            for i, field in enumerate(fields):
+                if field not in columns:
+                    columns[field] = (self.df[field].astype(object).to_numpy(copy=True) if field in self.df.columns
+                                      else np.full(len(self.df), None, dtype=object))
+                columns[field][positions[found]] = [values[i] for values, ok in zip(rows, found) if ok]
+        # 所有修改先写入副本，最后一起替换，保证全部写入或全部不写入
+        df = self.df.copy(deep=False)
+        for field, values in columns.items():
+            df[field] = pd.Series(values, index=df.index, name=field).infer_objects()
+        self.df = df
+        self.invalidate()
+        return count
+
+    def neighbor(self, field: str, value: Any, after: bool, primary_field: str, exclude: Sequence[Any]) -> Any:
+        if field not in self.df.columns:
+            return None
+        column = self.df[field]
+        mask = column.notna().to_numpy(dtype=bool, copy=True)
+        if exclude and primary_field in self.df.columns:
+            mask &= ~self._text(primary_field).isin([str(i) for i in exclude]).to_numpy(dtype=bool)
+        candidates = column[mask]
+        try:
+            candidates = candidates[(candidates > value) if after else (candidates < value)]
+        except TypeError:
+            # 混合类型的列按 _sort_key 比较
+            key = _sort_key(value)
+            candidates = candidates[[(_sort_key(v) > key) if after else (_sort_key(v) < key) for v in candidates]]
+            if candidates.empty:
+                return None
+            return (min if after else max)(candidates.tolist(), key=_sort_key)
+        if candidates.empty:
+            return None
+        result = candidates.min() if after else candidates.max()
+        return result.item() if hasattr(result, 'item') else result
+
+    def get(self, primary_field: str, ids: Sequence[Any], field: str) -> Dict[str, Any]:
+        if field not in self.df.columns:
+            return {}
+        positions = self._positions(primary_field, list(ids))
+        found = positions >= 0
+        values = _records(self.df[[field]].iloc[positions[found]])
+        return {str(i): row[field] for i, row in zip(np.asarray(ids, dtype=object)[found], values)}
+
+
+def crud_from_dataframe(df: Any, api: Any, primary_field: str = None, searchable: bool = True,
+                        sortable: bool = True, decimals: int = 2, per_page: int = 20, **kwargs) -> CRUD:
+    """
+    根据 DataFrame 的列类型生成 CRUD：
+    - 日期时间列为 Date 列，全部为零点时只显示日期
+    - 分类列为 Mapping 列，快速搜索为按值过滤的下拉框
+    - 布尔列为 status 列，数值列右对齐，浮点数保留 decimals 位小数
+    - 文本列可快速搜索（包含），所有列可排序
+    接口需路由到 CRUDQueryEngine(crud, DataFrameBackend(df)).handle。
+    """
+    if pd is None:
+        raise RuntimeError('pandas is required for crud_from_dataframe')
+    columns = []
+    for name in df.columns:
+        series, key = df[name], str(name)
+        common = {'name': key, 'label': key, 'sortable': sortable}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories.tolist()
+            column = ColumnMapping(map={str(c): str(c) for c in categories}, **common)
+            if searchable:
+                column.searchable = Select(name=key, clearable=True,
+                                           options=[{'label': str(c), 'value': str(c)} for c in categories])
+        elif is_datetime64_any_dtype(series):
+            values = series.dropna()
+            with_time = bool((values != values.dt.normalize()).any())
+            column = ColumnDate(format='YYYY-MM-DD HH:mm:ss' if with_time else 'YYYY-MM-DD', **common)
+        elif is_bool_dtype(series):
+            column = TableColumn(type='status', **common)
+        elif is_numeric_dtype(series):
+            column = TableColumn(align='right', **common)
+            if is_float_dtype(series):
+                column.type = 'tpl'
+                column.tpl = f'${{{key}|round:{decimals}}}'
+        else:
+            column = TableColumn(searchable=searchable, **common)
+        columns.append(column)
+    kwargs.setdefault('primaryField', primary_field or ('id' if 'id' in df.columns else None))
+    kwargs.setdefault('perPage', per_page)
+    return CRUD(api=api, columns=columns, **kwargs)
+
+
+def _get(node: Any, key: str, default: Any = None) -> Any:
+    if isinstance(node, dict):
+        return node.get(key, default)
+    return getattr(node, key, default)
+
+
+def _search_op(searchable: Any) -> FilterOp:
+    """列的快速搜索为选择器时按值匹配（多选时为属于），否则为包含"""
+    kind = _get(searchable, 'type') if searchable is not True else None
+    if kind not in SELECT_TYPES:
+        return 'like'
+    return 'in' if kind == 'checkboxes' or _get(searchable, 'multiple') else 'eq'
+
+
+def _collect_refs(value: Any, key: str, refs: Set[str]):
+    if isinstance(value, str):
+        if key == 'name':
+            refs.add(value)
+        refs |= expression_vars(value, key in EXPRESSION_FIELDS)
+    elif isinstance(value, BaseAmisModel):
+        for k, v in value.__dict__.items():
+            _collect_refs(v, k, refs)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            _collect_refs(v, k, refs)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _collect_refs(v, key, refs)
+
+
+def referenced_fields(node: Union[CRUD, Table, dict], primary_field: str = None) -> Optional[Set[str]]:
+    """
+    从 CRUD/Table 中推导出每行数据实际用到的字段：列的 name、模板/映射/labelTpl 中 ${...} 引用的变量、
+    quickEdit 及操作按钮弹窗中的表单项 name 与引用的变量，并总是包含主键。
+    若引用了整行数据（如 ${&}），则无法裁剪，返回 None。
+    """
+    refs: Set[str] = set()
+    for key in ROW_SCOPED_FIELDS:
+        _collect_refs(_get(node, key), key, refs)
+    if WHOLE_SCOPE in refs:
+        return None
+    refs.add(primary_field or _get(node, 'primaryField') or 'id')
+    return refs
+
+
+def trim_items(out: BaseAmisApiOut, fields: Iterable[str]) -> BaseAmisApiOut:
+    """将接口返回的 data.items（或 data.rows）中每行裁剪为只包含 fields 中的字段"""
+    if isinstance(out.data, dict):
+        fields = list(fields)
+        for key in ('items', 'rows'):
+            rows = out.data.get(key)
+            if isinstance(rows, list):
+                out.data[key] = [{k: r[k] for k in fields if k in r} if isinstance(r, dict) else r for r in rows]
+    return out
+
+
+class CRUDQueryEngine:
+    """
+    绑定到 CRUD 定义的查询引擎：
+    - 分页、主键字段名取自 CRUD 的 pageField、perPageField、primaryField、perPage
+    - 只允许按 sortable 的列和主键排序，只允许按 searchable 的列、filter 表单项、defaultParams 中的字段过滤
+    - count 为 False 时返回 hasNext 而不是 total，配合简单分页使用，后端无需统计总数
+    - 有下一页时返回 cursor（本页最后一行的排序键），请求带上 cursor 参数（如 api 为 /api/x?cursor=${cursor}）
+      翻到紧接着的下一页时改用键集分页代替 OFFSET；cursor 与页码、查询条件不匹配时仍使用 OFFSET，
+      引擎自身不保存任何分页状态
+    - projection 为 True 时只查询、返回列定义中用到的字段，见 referenced_fields
+    """
+
+    def __init__(self, crud: CRUD, backend: Backend, filters: Dict[str, FilterOp] = None, count: bool = True,
+                 keyset: bool = True, projection: bool = False, max_per_page: int = 200,
+                 cursor_field: str = 'cursor'):
+        self.crud = crud
+        self.backend = backend
+        self.count = count
+        """是否统计总数"""
+        self.keyset = keyset
+        """是否启用键集分页"""
+        self.cursor_field = cursor_field
+        """键集分页游标的参数名，同时是返回数据中游标的字段名"""
+        self.max_per_page = max_per_page
+        """每页条数上限"""
+        self.fields = referenced_fields(crud) if projection else None
+        """开启 projection 后，只向后端查询并返回 CRUD 中实际用到的字段"""
+        self.page_field = crud.pageField or 'page'
+        self.per_page_field = crud.perPageField or 'perPage'
+        self.primary_field = crud.primaryField or 'id'
+        self.sortable = {self.primary_field}
+        if crud.orderField:
+            self.sortable.add(crud.orderField)
+        self.filters: Dict[str, FilterOp] = {}
+        for column in _get(crud, 'columns', None) or []:
+            name = _get(column, 'name')
+            if not name:
+                continue
+            if _get(column, 'sortable'):
+                self.sortable.add(name)
+            searchable = _get(column, 'searchable')
+            if searchable:
+                self.filters[name] = _search_op(searchable)
+        if crud.filter is not None:
+            for node in walk(crud.filter):
+                # AmisAPI 等非表单项的模型没有 name
+                name = getattr(node, 'name', None)
+                if not isinstance(node, Form) and name:
+                    self.filters.setdefault(name, 'eq')
+        for name in crud.defaultParams or {}:
+            if name not in (self.page_field, self.per_page_field, 'orderBy', 'orderDir', cursor_field):
+                self.filters.setdefault(name, 'eq')
+        self.filters.update(filters or {})
+
+    def invalidate(self):
+        """数据发生变化时调用，清除后端缓存"""
+        self.backend.invalidate()
+
+    def parse(self, params: Mapping[str, Any]) -> CRUDQuery:
+        """解析请求参数，非法的分页、排序参数会抛出 ValueError"""
+        params = {**(self.crud.defaultParams or {}), **params}
+        page = max(int(params.get(self.page_field) or 1), 1)
+        per_page = min(max(int(params.get(self.per_page_field) or self.crud.perPage or 10), 1), self.max_per_page)
+        order_by = params.get('orderBy') or None
+        if order_by is not None and order_by not in self.sortable:
+            raise ValueError(f'cannot order by {order_by!r}')
+        order_dir = (params.get('orderDir') or 'asc').lower()
+        if order_dir not in ('asc', 'desc'):
+            raise ValueError(f'invalid orderDir {order_dir!r}')
+        filters = [Filter(field=name, op=op, value=params[name]) for name, op in self.filters.items()
+                   if params.get(name) not in (None, '')]
+        sort_keys = [order_by] if order_by and order_by != self.primary_field else []
+        sort_keys.append(self.primary_field)
+        query = CRUDQuery(page=page, per_page=per_page, order_by=order_by, order_dir=order_dir, filters=filters,
+                          sort_keys=sort_keys, offset=(page - 1) * per_page, count=self.count,
+                          fields=sorted(self.fields) if self.fields is not None else None)
+        if self.keyset and page > 1 and params.get(self.cursor_field):
+            query.after = self._decode_cursor(query, params[self.cursor_field])
+        return query
+
+    @staticmethod
+    def _fingerprint(query: CRUDQuery, page: int) -> str:
+        filters = [(f.field, f.op, str(f.value)) for f in query.filters]
+        raw = dumps([page, filters, query.sort_keys, query.order_dir, query.per_page], str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+    def _encode_cursor(self, query: CRUDQuery, row: Mapping[str, Any]) -> Optional[str]:
+        values = [row.get(k) for k in query.sort_keys]
+        # 只有 JSON 原生类型能原样还原，其他类型（如日期）不生成游标
+        if not all(v is None or isinstance(v, (str, int, float)) for v in values):
+            return None
+        raw = dumps([self._fingerprint(query, query.page), values])
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def _decode_cursor(self, query: CRUDQuery, cursor: Any) -> Optional[List[Any]]:
+        """游标属于同一查询条件下的上一页时返回其中的排序键，否则返回 None（使用 OFFSET）"""
+        try:
+            raw = base64.urlsafe_b64decode(str(cursor) + '=' * (-len(str(cursor)) % 4))
+            fingerprint, values = json.loads(raw)
+        except (ValueError, TypeError):
+            return None
+        if fingerprint != self._fingerprint(query, query.page - 1) or not isinstance(values, list) \
+                or len(values) != len(query.sort_keys):
+            return None
+        return values
+
+    def execute(self, query: CRUDQuery) -> dict:
+        """执行查询，返回 amis CRUD 所需的 data 部分"""
+        fields = query.fields
+        if fields is not None:
+            query.fields = list(dict.fromkeys([*fields, *query.sort_keys]))
+        rows, total = self.backend.fetch(query)
+        has_next = len(rows) > query.per_page
+        rows = rows[:query.per_page]
+        cursor = self._encode_cursor(query, rows[-1]) if self.keyset and rows and has_next else None
+        if fields is not None and len(fields) != len(query.fields):
+            rows = [{k: r[k] for k in fields if k in r} for r in rows]
+        data = {'items': rows, 'hasNext': has_next} if total is None else {'items': rows, 'total': total}
+        if cursor is not None:
+            data[self.cursor_field] = cursor
+        return data
+
+    def query(self, params: Mapping[str, Any]) -> dict:
+        """解析请求参数并执行查询"""
+        return self.execute(self.parse(params))
+
+    def handle(self, params: Mapping[str, Any]) -> BaseAmisApiOut:
+        """处理 CRUD 的 api 请求，返回的 data 已预先编码为 RawJSON"""
+        try:
+            data = self.query(params)
+        except ValueError as e:
+            return BaseAmisApiOut(status=422, msg=str(e))
+        return BaseAmisApiOut(data=RawJSON(dumps(data)))
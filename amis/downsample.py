@@ -0,0 +1,260 @@
+"""图表降采样：序列化前用 LTTB 或分桶最大最小值将 Chart、Sparkline 的大数据量序列压缩到目标点数"""
+import math
+from numbers import Number
+from typing import Any, List, Mapping, Optional, Sequence, Tuple
+
+from .components import Chart, Sparkline
+from .types import is_array
+from .utils import walk
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SAMPLED_SERIES = ('line', 'bar', 'scatter', 'effectScatter')
+"""会被降采样的 ECharts 序列类型，未指定 type 的序列也会处理"""
+METHODS = ('lttb', 'minmax')
+"""支持的降采样方法"""
+
+
+def lttb(y: Sequence, threshold: int, x: Sequence = None) -> 'np.ndarray':
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留的点的下标（升序，含首尾两点）。
+    桶的边界与均值一次性向量化算出，每个桶内的三角形面积也是向量化计算，只按桶数循环。
+    """
+    if np is None:
+        raise RuntimeError('numpy is required for downsampling')
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    edges = np.floor(np.arange(threshold - 1) * every).astype(np.intp) + 1
+    edges[-1] = n - 1
+    sizes = np.maximum(edges[1:] - edges[:-1], 1)
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    avg_x = np.append((cx[edges[1:]] - cx[edges[:-1]]) / sizes, x[-1])
+    avg_y = np.append((cy[edges[1:]] - cy[edges[:-1]]) / sizes, y[-1])
+    result = np.empty(threshold, dtype=np.intp)
+    result[0], result[-1] = 0, n - 1
+    a = 0
+    for k in range(threshold - 2):
+        lo, hi = edges[k], max(edges[k + 1], edges[k] + 1)
+        nx, ny = avg_x[k + 1], avg_y[k + 1]
+        area = np.abs((x[a] - nx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (ny - y[a]))
+        a = lo + int(np.argmax(area))
+        result[k + 1] = a
+    return result
+
+
+def minmax(y: Sequence, threshold: int) -> 'np.ndarray':
+    """
+    分桶最大最小值降采样，每个桶保留最大、最小两个点，返回保留的点的下标（升序，含首尾两点）。
+    能保留所有尖峰，适合柱状图与波动剧烈的序列；空值（NaN）不会被选为极值，除非整个桶都是空值。
+    """
+    if np is None:
+        raise RuntimeError('numpy is required for downsampling')
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+    buckets = (threshold - 2) // 2
+    size = math.ceil(n / buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    nan = np.isnan(padded)
+    offsets = np.arange(buckets) * size
+    low = np.argmin(np.where(nan, np.inf, padded), axis=1) + offsets
+    high = np.argmax(np.where(nan, -np.inf, padded), axis=1) + offsets
+    indices = np.unique(np.concatenate(([0, n - 1], low, high)))
+    return indices[indices < n]
+
+
+def sample_indices(y: Sequence, threshold: int, method: str = 'lttb', x: Sequence = None) -> 'np.ndarray':
+    """按 method 计算保留的点的下标；含空值的序列无法计算三角形面积，LTTB 会退化为 minmax"""
+    if method not in METHODS:
+        raise ValueError(f'unknown downsampling method {method!r}')
+    y = np.asarray(y, dtype=float)
+    if method == 'minmax' or not np.isfinite(y).all() or (x is not None and not np.isfinite(x).all()):
+        return minmax(y, threshold)
+    return lttb(y, threshold, x)
+
+
+def _shared_indices(ys: List['np.ndarray'], threshold: int, method: str, x: Sequence = None) -> 'np.ndarray':
+    """
+    多个等长序列共用的保留下标，总点数不超过 threshold：threshold 按序列数均分，各序列降采样后取并集；
+    序列太多、均分后不足 4 个点时，改为对各序列归一化后的上、下包络各做一次 minmax
+    """
+    share = threshold // len(ys)
+    if share >= 4:
+        return np.unique(np.concatenate([sample_indices(y, share, method, x) for y in ys]))
+    n = len(ys[0])
+    if threshold < 8:
+        return np.unique(np.linspace(0, n - 1, max(threshold, 2)).round().astype(np.intp))
+    stacked = np.vstack(ys)
+    nan = np.isnan(stacked)
+    low = np.where(nan, np.inf, stacked).min(axis=1, keepdims=True)
+    span = np.where(nan, -np.inf, stacked).max(axis=1, keepdims=True) - low
+    normalized = (stacked - low) / np.where(span > 0, span, 1)
+    upper = np.where(nan, -np.inf, normalized).max(axis=0)
+    lower = np.where(nan, np.inf, normalized).min(axis=0)
+    upper[np.isinf(upper)] = np.nan
+    lower[np.isinf(lower)] = np.nan
+    return np.unique(np.concatenate((minmax(upper, threshold // 2), minmax(lower, threshold // 2))))
+
+
+def _to_float(values: Sequence) -> Optional['np.ndarray']:
+    try:
+        array = np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        return None
+    return array if array.ndim == 1 else None
+
+
+def _has_values(column: Optional['np.ndarray']) -> bool:
+    return column is not None and not np.isnan(column).all()
+
+
+def _series_values(data: Any) -> Tuple[Optional['np.ndarray'], Optional['np.ndarray'], bool]:
+    """解析序列数据，返回 (x, y, 是否为纯数值)，无法识别时 y 为 None"""
+    if isinstance(data, np.ndarray):
+        if data.ndim == 1 and data.dtype.kind in 'iuf':
+            return None, data.astype(float), True
+        if data.ndim == 2 and data.shape[1] >= 2:
+            return _to_float(data[:, 0]), _to_float(data[:, 1]), False
+        return None, None, False
+    if not isinstance(data, list):
+        return None, None, False
+    first = next((d for d in data if d is not None), None)
+    if isinstance(first, Number) and not isinstance(first, bool):
+        return None, _to_float(data), True
+    if isinstance(first, (list, tuple)) and len(first) >= 2:
+        try:
+            pairs = [(None, None) if d is None else (d[0], d[1]) for d in data]
+        except (TypeError, IndexError, KeyError):
+            return None, None, False
+        xs, ys = zip(*pairs)
+        return _to_float(xs), _to_float(ys), False
+    return None, None, False
+
+
+def _take(data: Any, indices: 'np.ndarray') -> Any:
+    if isinstance(data, np.ndarray):
+        return data[indices]
+    return [data[i] for i in indices.tolist()]
+
+
+def _as_list(value: Any) -> List[Any]:
+    if isinstance(value, list):
+        return value
+    return [value] if isinstance(value, Mapping) else []
+
+
+def _sample_source(source: Any, threshold: int, method: str) -> Tuple[Any, bool]:
+    """降采样 dataset.source，所有数值列共用保留的行（见 _shared_indices），返回 (新的source, 是否改变)"""
+    if isinstance(source, Mapping):
+        columns = {k: _to_float(v) if isinstance(v, (list, np.ndarray)) else None for k, v in source.items()}
+        lengths = {len(v) for v in source.values() if isinstance(v, (list, np.ndarray))}
+        if len(lengths) != 1 or lengths.pop() <= threshold:
+            return source, False
+        keys = list(source)
+        x = columns[keys[0]]
+        ys = [columns[k] for k in keys[1:] if _has_values(columns[k])]
+        if not ys:
+            return source, False
+        indices = _shared_indices(ys, threshold, method, x)
+        return {k: _take(v, indices) if isinstance(v, (list, np.ndarray)) else v for k, v in source.items()}, True
+    if isinstance(source, np.ndarray):
+        if source.ndim != 2 or len(source) <= threshold:
+            return source, False
+        rows, header = source, None
+    elif isinstance(source, list) and source and isinstance(source[0], (list, tuple)):
+        header = source[0] if all(isinstance(v, str) for v in source[0]) else None
+        rows = source[1:] if header is not None else source
+        if len(rows) <= threshold:
+            return source, False
+    else:
+        return source, False
+    try:
+        width = min(len(r) for r in rows) if isinstance(rows, list) else rows.shape[1]
+        columns = [_to_float([r[i] for r in rows]) for i in range(width)] if isinstance(rows, list) else \
+            [_to_float(rows[:, i]) for i in range(width)]
+    except TypeError:
+        return source, False
+    ys = [c for c in columns[1:] if _has_values(c)]
+    if not ys:
+        return source, False
+    indices = _shared_indices(ys, threshold, method, columns[0])
+    sampled = _take(rows, indices)
+    return ([header] + sampled if header is not None else sampled), True
+
+
+def downsample_config(config: Mapping[str, Any], threshold: int = 2000, method: str = 'lttb') -> int:
+    """
+    原地降采样 ECharts 配置中超过 threshold 个点的数值序列，返回降采样的序列数：
+    - series[].data 为 [x, y] 对时各序列独立降采样
+    - series[].data 为纯数值时，共用类目轴的各序列长度相同，阈值按序列数均分后取各序列保留点的并集，
+      总点数不超过 threshold，xAxis/yAxis 的 data 同步取点
+    - dataset.source 的各数值列同样均分阈值，按保留点的并集取行
+    """
+    if np is None:
+        raise RuntimeError('numpy is required for downsampling')
+    count = 0
+    aligned = {}
+    for series in _as_list(config.get('series')):
+        if not isinstance(series, dict) or series.get('type', 'line') not in SAMPLED_SERIES:
+            continue
+        data = series.get('data')
+        if data is None or len(data) <= threshold:
+            continue
+        x, y, plain = _series_values(data)
+        if y is None:
+            continue
+        if plain:
+            aligned.setdefault(len(data), []).append((series, y))
+            continue
+        if x is not None and not np.isfinite(x).all():
+            x = None
+        series['data'] = _take(data, sample_indices(y, threshold, method, x))
+        count += 1
+    for length, group in aligned.items():
+        indices = _shared_indices([y for _, y in group], threshold, method)
+        for series, _ in group:
+            series['data'] = _take(series['data'], indices)
+        for axis in _as_list(config.get('xAxis')) + _as_list(config.get('yAxis')):
+            data = axis.get('data') if isinstance(axis, dict) else None
+            if data is not None and len(data) == length:
+                axis['data'] = _take(data, indices)
+        count += len(group)
+    for dataset in _as_list(config.get('dataset')):
+        if isinstance(dataset, dict) and dataset.get('source') is not None:
+            dataset['source'], changed = _sample_source(dataset['source'], threshold, method)
+            count += changed
+    return count
+
+
+def downsample(root: Any, threshold: int = 2000, method: str = 'lttb') -> int:
+    """
+    降采样组件树中 Chart 的 config（dict 形式）与 Sparkline 的 value，返回降采样的序列数。
+    threshold 一般取图表宽度的像素数即可；组件会被原地修改。
+    """
+    if np is None:
+        raise RuntimeError('numpy is required for downsampling')
+    if method not in METHODS:
+        raise ValueError(f'unknown downsampling method {method!r}')
+    count = 0
+    for node in walk(root):
+        if isinstance(node, Chart) and isinstance(node.config, dict):
+            count += downsample_config(node.config, threshold, method)
+        elif isinstance(node, Sparkline) and (isinstance(node.value, list) or is_array(node.value)) \
+                and len(node.value) > threshold:
+            value = np.asarray(node.value) if is_array(node.value) else node.value
+            _, y, plain = _series_values(value)
+            if y is not None and plain:
+                node.value = _take(value, sample_indices(y, threshold, method))
+                count += 1
+    return count
@@ -0,0 +1,308 @@
+"""CRUD/Table 数据的流式导出：按列定义生成表头与映射后的值，分批写出 CSV/XLSX，内存占用与总行数无关"""
+import csv
+import io
+import math
+import re
+import zipfile
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple, Union
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from .components import CRUD, ActionType, ColumnOperation, Table
+from .types import RawJSON
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', '导出 CSV'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', '导出 Excel'),
+}
+"""支持的导出格式：(Content-Type, 按钮文字)"""
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+"""以这些字符开头的 CSV 文本会被 Excel 当作公式"""
+XLSX_MAX_ROWS = 1048576
+"""xlsx 单个工作表的最大行数，超出后写入下一个工作表"""
+
+_TAG_RE = re.compile(r'<[^>]*>')
+_XML_ILLEGAL_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{}</Types>'
+)
+_SHEET_TYPE = ('<Override PartName="/xl/worksheets/sheet{}.xml" '
+               'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>')
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>{}</sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{}</Relationships>'
+)
+_SHEET_REL = ('<Relationship Id="rId{0}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+              'worksheet" Target="worksheets/sheet{0}.xml"/>')
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+
+
+def _text(value: Any) -> str:
+    return _TAG_RE.sub('', str(value)).strip()
+
+
+def _lookup(row: Mapping[str, Any], name: str) -> Any:
+    if name in row:
+        return row[name]
+    value: Any = row
+    for part in name.split('.'):
+        if not isinstance(value, Mapping):
+            return None
+        value = value.get(part)
+    return value
+
+
+class _Sink(io.RawIOBase):
+    """zipfile 的输出目标，只记录写入的字节，由调用方分批取走；不支持 seek，zipfile 会使用数据描述符流式写入"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._size
+
+    def seek(self, *args):
+        raise OSError('unseekable')
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class TableExporter:
+    """
+    绑定到 CRUD/Table 列定义的导出器：
+    - 表头为列的 label（去掉 html 标签），没有 label 时为 name；操作列和没有 name 的列不导出
+    - Mapping 列按 map 转换为显示文字，其余列导出原始值，name 可以是 a.b 形式的路径
+    - csv/xlsx 从行迭代器中每次取 batch_size 行编码后产出，适合直接作为流式响应体
+    - escape_formulas 为 True 时，CSV 中以 = + - @ 制表符或回车开头的文本前加 ' ，避免在 Excel 中被当作公式执行
+    """
+
+    def __init__(self, node: Union[CRUD, Table], columns: Sequence[str] = None, batch_size: int = 1000,
+                 escape_formulas: bool = True):
+        self.node = node
+        self.batch_size = batch_size
+        """每批编码的行数"""
+        self.escape_formulas = escape_formulas
+        """是否转义 CSV 中可能被当作公式的文本"""
+        self.columns: List[Tuple[str, str, Dict[str, str]]] = []
+        """导出的列 (name, 表头, 值映射)"""
+        for column in node.columns or []:
+            get = column.get if isinstance(column, dict) else lambda k, c=column: getattr(c, k, None)
+            name = get('name')
+            if not name or isinstance(column, ColumnOperation) or get('type') == 'operation':
+                continue
+            if columns is not None and name not in columns:
+                continue
+            label = get('label')
+            self.columns.append((name, _text(label) if isinstance(label, str) and label else name,
+                                 self._value_map(get('map'), get('valueField'), get('labelField'))))
+        if columns is not None:
+            order = {name: i for i, name in enumerate(columns)}
+            self.columns.sort(key=lambda c: order[c[0]])
+
+    @staticmethod
+    def _value_map(mapping: Any, value_field: str = None, label_field: str = None) -> Dict[str, str]:
+        if isinstance(mapping, RawJSON):
+            mapping = mapping.loads()
+        if isinstance(mapping, list):
+            value_field, label_field = value_field or 'value', label_field or 'label'
+            return {str(m.get(value_field)): _text(m.get(label_field, '')) for m in mapping if isinstance(m, dict)}
+        if isinstance(mapping, dict):
+            return {str(k): _text(v) for k, v in mapping.items() if not isinstance(v, (dict, list))}
+        return {}
+
+    def header(self) -> List[str]:
+        return [label for _, label, _ in self.columns]
+
+    def values(self, row: Mapping[str, Any]) -> List[Any]:
+        """一行的导出值，映射列的值转换为显示文字（未命中时使用 * 的映射，仍没有时保留原值）"""
+        result = []
+        for name, _, mapping in self.columns:
+            value = _lookup(row, name)
+            if mapping:
+                key = ('true' if value else 'false') if isinstance(value, bool) else str(value)
+                value = mapping.get(key, mapping.get('*', value))
+            result.append(value)
+        return result
+
+    def _batches(self, rows: Iterable[Mapping[str, Any]]) -> Iterator[List[List[Any]]]:
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return
+            yield [self.values(row) for row in batch]
+
+    def _csv_value(self, value: Any) -> Any:
+        if value is None:
+            return ''
+        if self.escape_formulas and isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+            return "'" + value
+        return value
+
+    def csv(self, rows: Iterable[Mapping[str, Any]]) -> Iterator[bytes]:
+        """流式生成 CSV，带 BOM 以便 Excel 正确识别 UTF-8"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        buffer.write('\ufeff')
+        writer.writerow(self.header())
+        for batch in self._batches(rows):
+            writer.writerows([self._csv_value(v) for v in values] for values in batch)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    @staticmethod
+    def _cell(value: Any) -> str:
+        if value is None:
+            return '<c/>'
+        if isinstance(value, bool):
+            return f'<c t="b"><v>{int(value)}</v></c>'
+        if isinstance(value, (int, float)) and not (isinstance(value, float) and not math.isfinite(value)) \
+                and abs(value) < 1e15:
+            return f'<c><v>{int(value) if isinstance(value, int) else float(value)!r}</v></c>'
+        text = escape(_XML_ILLEGAL_RE.sub('', str(value)))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+    def _row(self, values: Sequence[Any]) -> str:
+        return '<row>' + ''.join(map(self._cell, values)) + '</row>'
+
+    def xlsx(self, rows: Iterable[Mapping[str, Any]]) -> Iterator[bytes]:
+        """
+        流式生成 XLSX：工作表 xml 边编码边写入 zip，单元格使用内联字符串，无需共享字符串表，
+        内存中只保留当前一批数据；超过 XLSX_MAX_ROWS 行时自动写入新的工作表。
+        """
+        sink = _Sink()
+        archive = zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED)
+        header = self._row(self.header()).encode('utf-8')
+        sheets = 0
+        entry, used = None, XLSX_MAX_ROWS
+        for batch in self._batches(rows):
+            while batch:
+                if used >= XLSX_MAX_ROWS:
+                    if entry is not None:
+                        entry.write(_SHEET_END.encode('utf-8'))
+                        entry.close()
+                    sheets += 1
+                    entry = archive.open(f'xl/worksheets/sheet{sheets}.xml', 'w', force_zip64=True)
+                    entry.write(_SHEET_START.encode('utf-8') + header)
+                    used = 1
+                part, batch = batch[:XLSX_MAX_ROWS - used], batch[XLSX_MAX_ROWS - used:]
+                entry.write(''.join(map(self._row, part)).encode('utf-8'))
+                used += len(part)
+            yield sink.drain()
+        if entry is None:
+            sheets = 1
+            archive.writestr('xl/worksheets/sheet1.xml', _SHEET_START + self._row(self.header()) + _SHEET_END)
+        else:
+            entry.write(_SHEET_END.encode('utf-8'))
+            entry.close()
+        numbers = range(1, sheets + 1)
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES.format(''.join(map(_SHEET_TYPE.format, numbers))))
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(''.join(
+            f'<sheet name="Sheet{n}" sheetId="{n}" r:id="rId{n}"/>' for n in numbers)))
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS.format(''.join(map(_SHEET_REL.format, numbers))))
+        archive.close()
+        yield sink.drain()
+
+    def stream(self, rows: Iterable[Mapping[str, Any]], format: str = 'csv') -> Iterator[bytes]:
+        """按格式流式生成文件内容"""
+        if format not in FORMATS:
+            raise ValueError(f'unsupported export format {format!r}')
+        return self.csv(rows) if format == 'csv' else self.xlsx(rows)
+
+    @staticmethod
+    def headers(format: str = 'csv', filename: str = 'export') -> Dict[str, str]:
+        """响应头：Content-Type 与 Content-Disposition，文件名支持非 ASCII 字符"""
+        if format not in FORMATS:
+            raise ValueError(f'unsupported export format {format!r}')
+        filename = f'{filename}.{format}'
+        fallback = filename.encode('ascii', 'replace').decode('ascii').replace('?', '_').replace('"', '_')
+        return {
+            'Content-Type': FORMATS[format][0],
+            'Content-Disposition': f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename)}',
+        }
+
+    def buttons(self, url: str, params: Iterable[str] = None,
+                formats: Sequence[str] = ('csv', 'xlsx')) -> List[ActionType.Url]:
+        """
+        导出按钮，点击后以当前的查询条件（params 中的变量及排序）请求 {url}.{格式}，
+        由浏览器直接下载流式响应，不经过前端内存。
+        params 为 None 时，导出 CRUD 取 CRUDQueryEngine 可以识别的全部过滤字段；导出 Table 时只带排序，需自行传入。
+        """
+        if params is None:
+            params = self._filter_params()
+        query = {name: f'${{{name}}}' for name in (*params, 'orderBy', 'orderDir')}
+        return [ActionType.Url(label=FORMATS[f][1], icon='fa fa-download', url=f'{url}.{f}', params=query)
+                for f in formats]
+
+    def _filter_params(self, crud: CRUD = None) -> List[str]:
+        from .crud import CRUDQueryEngine, ListBackend
+
+        crud = self.node if crud is None else crud
+        if not isinstance(crud, CRUD):
+            return []
+        return list(CRUDQueryEngine(crud, ListBackend([])).filters)
+
+    def configure(self, crud: CRUD, url: str, formats: Sequence[str] = ('csv', 'xlsx')) -> CRUD:
+        """在 CRUD 的 headerToolbar 中加入导出按钮，查询条件取自 CRUDQueryEngine 可以识别的过滤字段"""
+        crud.headerToolbar = [*(crud.headerToolbar or []), *self.buttons(url, self._filter_params(crud), formats)]
+        return crud
+
+
+def iter_rows(engine: Any, params: Mapping[str, Any], batch_size: int = 1000) -> Iterator[dict]:
+    """
+    按 CRUD 请求参数逐批从 CRUDQueryEngine 的后端取出全部匹配的行，不受每页条数上限限制，
+    不统计总数，支持键集分页的后端按上一批的最后一行继续查询。
+    游标只在本次迭代内使用，不依赖引擎的状态；最后一行的排序键含空值时该批之后改用 OFFSET。
+    """
+    query = engine.parse({k: v for k, v in params.items() if k not in (engine.page_field, engine.per_page_field)})
+    query.per_page, query.offset, query.count = batch_size, 0, False
+    if query.fields is not None:
+        query.fields = list(dict.fromkeys([*query.fields, *query.sort_keys]))
+    while True:
+        rows, _ = engine.backend.fetch(query)
+        yield from rows[:batch_size]
+        if len(rows) <= batch_size:
+            return
+        after = [rows[batch_size - 1].get(k) for k in query.sort_keys]
+        query.after = None if None in after else after
+        query.offset += batch_size
@@ -0,0 +1,670 @@
+"""amis 表达式与模板的服务端处理"""
+import math
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, List, Mapping, Optional, Set, Tuple
+
+from .utils import iter_children, prune
+
+TEMPLATE_RE = re.compile(r'\$\{(.*?)\}', re.S)
+"""${...} 数据映射"""
+SHORTHAND_RE = re.compile(r'\$([A-Za-z_][\w]*)')
+"""$name 简写形式的数据映射"""
+_STRING_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`', re.S)
+_FILTER_RE = re.compile(r'(?<!\|)\|(?!\|)')
+_IDENT_RE = re.compile(r'(?<![\w$.])([A-Za-z_$][\w$]*)(?![\w$])(?!\s*\()')
+_SCOPE_PREFIX_RE = re.compile(r'(?<![\w$.])(?:this|data)\.')
+_KEYWORDS = {'true', 'false', 'null', 'undefined', 'this', 'data', 'typeof', 'instanceof', 'in', 'new', 'void'}
+
+WHOLE_SCOPE = '&'
+"""引用了整个数据域（如 ${&}、$$）时 expression_vars 返回的标记"""
+
+
+def _code_vars(code: str) -> Set[str]:
+    code = _SCOPE_PREFIX_RE.sub('', _STRING_RE.sub('""', code))
+    if code.strip() == '&':
+        return {WHOLE_SCOPE}
+    return {name for name in _IDENT_RE.findall(code) if name not in _KEYWORDS}
+
+
+def expression_vars(text: str, expression: bool = False) -> Set[str]:
+    """
+    提取模板或表达式中引用的顶层变量名，如 "${user.name | html} $age" -> {'user', 'age'}。
+    expression 为 True 且文本中没有 ${} 时，按 js 表达式处理（如 visibleOn: "this.age > 18"）。
+    引用整个数据域时结果中包含 WHOLE_SCOPE。
+    """
+    if not isinstance(text, str) or '$' not in text and not expression:
+        return set()
+    result = set()
+    if '$$' in text:
+        result.add(WHOLE_SCOPE)
+    bodies = TEMPLATE_RE.findall(text)
+    if bodies:
+        for body in bodies:
+            result |= _code_vars(_FILTER_RE.split(body)[0])
+        result |= set(SHORTHAND_RE.findall(TEMPLATE_RE.sub('', text)))
+    elif expression:
+        result |= _code_vars(text)
+    else:
+        result |= set(SHORTHAND_RE.findall(text))
+    return result
+
+
+class _Unknown:
+    """求值时依赖前端数据、无法在服务端确定的值"""
+    __slots__ = ('truthy',)
+
+    def __init__(self, truthy: Optional[bool] = None):
+        self.truthy = truthy
+        """值未知但真假已知时为 True/False"""
+
+    def __repr__(self):
+        return 'UNKNOWN' if self.truthy is None else f'UNKNOWN({self.truthy})'
+
+
+UNKNOWN = _Unknown()
+"""evaluate 无法确定结果时的返回值"""
+_TRUTHY = _Unknown(True)
+_FALSY = _Unknown(False)
+
+_TOKEN_RE = re.compile(r'''\s*(?:
+    (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<str>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')
+    |(?P<name>[A-Za-z_$][\w$]*)
+    |(?P<op>===|!==|==|!=|<=|>=|&&|\|\||\?\?|[-+*/%<>!?:.,()\[\]])
+)''', re.X)
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0'}
+_LITERALS = {'true': True, 'false': False, 'null': None, 'undefined': None}
+_BINARY = {'??': 2, '||': 3, '&&': 4, '==': 5, '!=': 5, '===': 5, '!==': 5,
+           '<': 6, '>': 6, '<=': 6, '>=': 6, '+': 7, '-': 7, '*': 8, '/': 8, '%': 8}
+"""二元运算符的优先级"""
+
+
+def _tokenize(code: str) -> List[Tuple[str, Any]]:
+    tokens = []
+    pos, end = 0, len(code.rstrip())
+    while pos < end:
+        m = _TOKEN_RE.match(code, pos)
+        if m is None or m.end() == pos:
+            raise ValueError(f'unexpected character at {pos} in {code!r}')
+        pos = m.end()
+        kind = m.lastgroup
+        text = m.group(kind)
+        if kind == 'name' and text in ('this', 'data') and tokens[-1:] != [('op', '.')]:
+            # this.x、data.x 与 x 等价
+            rest = len(code) - len(code[pos:].lstrip())
+            if code.startswith('.', rest):
+                pos = rest + 1
+                continue
+        if kind == 'num':
+            tokens.append(('lit', float(text) if any(c in text for c in '.eE') else int(text)))
+        elif kind == 'str':
+            tokens.append(('lit', re.sub(r'\\(.)', lambda e: _ESCAPES.get(e.group(1), e.group(1)), text[1:-1])))
+        elif kind == 'name' and text in _LITERALS:
+            tokens.append(('lit', _LITERALS[text]))
+        else:
+            tokens.append((kind, text))
+    tokens.append(('end', None))
+    return tokens
+
+
+class _Parser:
+    """amis 表达式子集的语法分析（运算符优先级分析），生成元组形式的语法树"""
+
+    def __init__(self, code: str):
+        self.tokens = _tokenize(code)
+        self.pos = 0
+
+    def peek(self) -> Tuple[str, Any]:
+        return self.tokens[self.pos]
+
+    def take(self, value: str = None) -> Tuple[str, Any]:
+        token = self.tokens[self.pos]
+        if value is not None and token[1] != value:
+            raise ValueError(f'expected {value!r}, got {token[1]!r}')
+        self.pos += 1
+        return token
+
+    def parse(self):
+        tree = self.expression()
+        if self.peek()[0] != 'end':
+            raise ValueError(f'unexpected token {self.peek()[1]!r}')
+        return tree
+
+    def expression(self, min_power: int = 0):
+        left = self.unary()
+        while True:
+            kind, op = self.peek()
+            if kind != 'op':
+                return left
+            if op == '?' and min_power <= 1:
+                self.take()
+                then = self.expression(1)
+                self.take(':')
+                left = ('cond', left, then, self.expression(1))
+                continue
+            power = _BINARY.get(op)
+            if power is None or power <= min_power:
+                return left
+            self.take()
+            left = ('bin', op, left, self.expression(power))
+
+    def unary(self):
+        kind, value = self.peek()
+        if kind == 'op' and value in ('!', '-', '+'):
+            self.take()
+            return ('un', value, self.unary())
+        return self.postfix(self.primary())
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == 'lit':
+            return ('lit', value)
+        if kind == 'name':
+            return ('var', value)
+        if value == '(':
+            tree = self.expression()
+            self.take(')')
+            return tree
+        if value == '[':
+            return ('arr', self.arguments(']'))
+        raise ValueError(f'unexpected token {value!r}')
+
+    def arguments(self, close: str) -> list:
+        items = []
+        while self.peek()[1] != close:
+            items.append(self.expression())
+            if self.peek()[1] != close:
+                self.take(',')
+        self.take(close)
+        return items
+
+    def postfix(self, tree):
+        while True:
+            value = self.peek()[1]
+            if value == '.':
+                self.take()
+                kind, name = self.take()
+                if kind != 'name':
+                    raise ValueError(f'unexpected token {name!r}')
+                tree = ('get', tree, ('lit', name))
+            elif value == '[':
+                self.take()
+                tree = ('get', tree, self.expression())
+                self.take(']')
+            elif value == '(':
+                self.take()
+                tree = ('call', tree, self.arguments(')'))
+            else:
+                return tree
+
+
+@lru_cache(maxsize=1024)
+def _parse(code: str):
+    return _Parser(code).parse()
+
+
+def _truthy(value: Any) -> bool:
+    """js 的真值判断：空列表、空对象为真"""
+    if isinstance(value, (list, dict)):
+        return True
+    if isinstance(value, float) and value != value:
+        return False
+    return bool(value)
+
+
+def _to_number(value: Any) -> float:
+    if value is None:
+        return 0
+    if isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value) if value.strip() else 0
+        except ValueError:
+            return float('nan')
+    return float('nan')
+
+
+def _to_str(value: Any) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, list):
+        return ','.join('' if v is None else _to_str(v) for v in value)
+    return str(value)
+
+
+def _strict_equal(a: Any, b: Any) -> bool:
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    if isinstance(a, (list, dict)) or isinstance(b, (list, dict)):
+        return a is b
+    return type(a) is type(b) and a == b
+
+
+def _loose_equal(a: Any, b: Any) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    if isinstance(a, (list, dict)) or isinstance(b, (list, dict)):
+        return a is b
+    if isinstance(a, str) and isinstance(b, str):
+        return a == b
+    return _to_number(a) == _to_number(b)
+
+
+def _compare(op: str, a: Any, b: Any) -> bool:
+    if not (isinstance(a, str) and isinstance(b, str)):
+        a, b = _to_number(a), _to_number(b)
+    return {'<': a < b, '>': a > b, '<=': a <= b, '>=': a >= b}[op]
+
+
+def _arithmetic(op: str, a: Any, b: Any) -> Any:
+    if op == '+' and (isinstance(a, (str, list, dict)) or isinstance(b, (str, list, dict))):
+        return _to_str(a) + _to_str(b)
+    a, b = _to_number(a), _to_number(b)
+    if op == '+':
+        return a + b
+    if op == '-':
+        return a - b
+    if op == '*':
+        return a * b
+    if b == 0:
+        return float('nan') if op == '%' or a == 0 or a != a else float('inf') * (1 if a > 0 else -1)
+    return a / b if op == '/' else math.fmod(a, b)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == '' or value == [] or value == {}
+
+
+_METHODS = {
+    'includes': lambda obj, x, *_: x in obj if isinstance(obj, (list, str)) else UNKNOWN,
+    'indexOf': lambda obj, x, *_: (obj.index(x) if x in obj else -1) if isinstance(obj, (list, str)) else UNKNOWN,
+    'startsWith': lambda obj, x, *_: obj.startswith(x) if isinstance(obj, str) else UNKNOWN,
+    'endsWith': lambda obj, x, *_: obj.endswith(x) if isinstance(obj, str) else UNKNOWN,
+    'toLowerCase': lambda obj, *_: obj.lower() if isinstance(obj, str) else UNKNOWN,
+    'toUpperCase': lambda obj, *_: obj.upper() if isinstance(obj, str) else UNKNOWN,
+    'trim': lambda obj, *_: obj.strip() if isinstance(obj, str) else UNKNOWN,
+}
+"""支持的 js 方法"""
+
+_FUNCTIONS = {
+    'NOT': lambda x: not _truthy(x),
+    'ISEMPTY': _is_empty,
+    'CONTAINS': lambda text, search: search in text if isinstance(text, (str, list)) else False,
+    'LEN': lambda x: len(x) if isinstance(x, (str, list)) else UNKNOWN,
+    'UPPERMOST': lambda x: _to_str(x).upper(),
+    'LOWER': lambda x: _to_str(x).lower(),
+}
+"""支持的 amis 公式函数（AND/OR/IF 按短路求值单独处理）"""
+
+
+def _eval(tree, context: Mapping[str, Any]) -> Any:
+    kind = tree[0]
+    if kind == 'lit':
+        return tree[1]
+    if kind == 'var':
+        return context[tree[1]] if tree[1] in context else UNKNOWN
+    if kind == 'arr':
+        items = [_eval(item, context) for item in tree[1]]
+        return UNKNOWN if any(isinstance(v, _Unknown) for v in items) else items
+    if kind == 'get':
+        obj, key = _eval(tree[1], context), _eval(tree[2], context)
+        if isinstance(obj, _Unknown) or isinstance(key, _Unknown):
+            return UNKNOWN
+        if key == 'length' and isinstance(obj, (list, str)):
+            return len(obj)
+        if isinstance(obj, dict):
+            return obj.get(_to_str(key))
+        if isinstance(obj, (list, str)) and isinstance(key, (int, float)) and not isinstance(key, bool):
+            return obj[int(key)] if 0 <= key < len(obj) and float(key).is_integer() else None
+        return None if obj is not None else UNKNOWN
+    if kind == 'call':
+        return _call(tree[1], tree[2], context)
+    if kind == 'un':
+        value = _eval(tree[2], context)
+        if tree[1] == '!':
+            if isinstance(value, _Unknown):
+                return UNKNOWN if value.truthy is None else (_FALSY if value.truthy else _TRUTHY)
+            return not _truthy(value)
+        if isinstance(value, _Unknown) or value is None:
+            return UNKNOWN
+        return -_to_number(value) if tree[1] == '-' else _to_number(value)
+    if kind == 'cond':
+        test = _eval(tree[1], context)
+        if isinstance(test, _Unknown):
+            if test.truthy is None:
+                return UNKNOWN
+            test = test.truthy
+        return _eval(tree[2] if _truthy(test) else tree[3], context)
+    op, left = tree[1], _eval(tree[2], context)
+    if op in ('&&', '||'):
+        return _logical(op, left, lambda: _eval(tree[3], context))
+    if op == '??':
+        if isinstance(left, _Unknown):
+            return UNKNOWN
+        return _eval(tree[3], context) if left is None else left
+    right = _eval(tree[3], context)
+    if isinstance(left, _Unknown) or isinstance(right, _Unknown):
+        return UNKNOWN
+    if op in ('==', '!='):
+        return _loose_equal(left, right) == (op == '==')
+    if op in ('===', '!=='):
+        return _strict_equal(left, right) == (op == '===')
+    if left is None or right is None:
+        # None 可能是 null 也可能是 undefined，两者参与比较、运算的结果不同（如 null >= 0 为真，undefined >= 0 为假）
+        return UNKNOWN
+    if op in ('<', '>', '<=', '>='):
+        return _compare(op, left, right)
+    return _arithmetic(op, left, right)
+
+
+def _logical(op: str, left: Any, right: Callable[[], Any]) -> Any:
+    """短路求值，一侧未知时尽量确定结果的真假"""
+    stop = op == '||'
+    if not isinstance(left, _Unknown):
+        return left if _truthy(left) == stop else right()
+    if left.truthy is not None and left.truthy == stop:
+        return left
+    value = right()
+    if isinstance(value, _Unknown):
+        if left.truthy is not None:
+            return value
+        return value if value.truthy == stop else UNKNOWN
+    if left.truthy is not None:
+        return value
+    # 左侧未知：a && 假值 必为假，a || 真值 必为真
+    return (_TRUTHY if stop else _FALSY) if _truthy(value) == stop else UNKNOWN
+
+
+def _call(callee, args: list, context: Mapping[str, Any]) -> Any:
+    if callee[0] == 'var' and callee[1] in ('AND', 'OR'):
+        result = True if callee[1] == 'AND' else False
+        op = '&&' if callee[1] == 'AND' else '||'
+        for arg in args:
+            result = _logical(op, result, lambda arg=arg: _eval(arg, context))
+        if isinstance(result, _Unknown):
+            return result
+        return _truthy(result)
+    if callee[0] == 'var' and callee[1] == 'IF' and len(args) == 3:
+        return _eval(('cond',) + tuple(args), context)
+    values = [_eval(arg, context) for arg in args]
+    if any(isinstance(v, _Unknown) for v in values):
+        return UNKNOWN
+    if callee[0] == 'var' and callee[1] in _FUNCTIONS:
+        try:
+            return _FUNCTIONS[callee[1]](*values)
+        except TypeError:
+            return UNKNOWN
+    if callee[0] == 'get' and callee[2][0] == 'lit' and callee[2][1] in _METHODS:
+        obj = _eval(callee[1], context)
+        if isinstance(obj, _Unknown):
+            return UNKNOWN
+        try:
+            return _METHODS[callee[2][1]](obj, *values)
+        except TypeError:
+            return UNKNOWN
+    return UNKNOWN
+
+
+def evaluate(expression: str, context: Mapping[str, Any]) -> Any:
+    """
+    在服务端求值 amis 表达式，支持 js 表达式（如 "this.role == 'admin'"）与 ${...} 形式，
+    包括字面量、成员访问、算术、比较、逻辑、三元运算及部分方法、公式函数。
+    context 中没有的变量视为未知，结果依赖未知量、使用了过滤器或不支持的语法时返回 UNKNOWN；
+    结果的值未知但真假确定时（如 "x && false"），返回的 UNKNOWN 对象的 truthy 属性为 True/False。
+    """
+    if not isinstance(expression, str):
+        return expression
+    code = expression.strip()
+    m = TEMPLATE_RE.fullmatch(code)
+    if m is not None:
+        code = m.group(1)
+        if _FILTER_RE.search(_STRING_RE.sub('""', code)):
+            return UNKNOWN
+    elif '${' in code:
+        return UNKNOWN
+    try:
+        return _eval(_parse(code), context)
+    except (ValueError, RecursionError):
+        return UNKNOWN
+
+
+def truthiness(expression: str, context: Mapping[str, Any]) -> Optional[bool]:
+    """表达式结果的真假，无法确定时返回 None"""
+    value = evaluate(expression, context)
+    if isinstance(value, _Unknown):
+        return value.truthy
+    return _truthy(value)
+
+
+def _flag(value: Any) -> Optional[bool]:
+    # FormItem 等组件的 visible 声明为字符串，False 会被转换为 'False'
+    if isinstance(value, str) and value in ('True', 'False'):
+        return value == 'True'
+    return value
+
+
+def fold_conditions(root: Any, context: Mapping[str, Any]) -> int:
+    """
+    用服务端已知的数据（如用户角色、功能开关）预先计算组件树中的 visibleOn/hiddenOn/disabledOn/requiredOn：
+    - 确定隐藏的组件（包括 hidden=True、visible=False 的组件）连同其子组件一起移除
+    - 确定结果的表达式被去掉，disabledOn/requiredOn 为真时改为 disabled/required
+    - 无法确定的表达式保持原样
+    设置了 value 的表单项隐藏后仍会提交其值，只标记 hidden 而不移除。
+    context 中的变量应当是前端数据域不会覆盖的名称。返回移除的组件数。
+    """
+
+    def known(node, field: str) -> Optional[bool]:
+        value = getattr(node, field, None)
+        if not value:
+            return None
+        result = truthiness(value, context)
+        if result is not None:
+            setattr(node, field, None)
+        return result
+
+    def remove(node) -> bool:
+        visible = _flag(getattr(node, 'visible', None))
+        if isinstance(visible, str):
+            result = truthiness(visible, context)
+            visible = None if result is None else result
+            if visible is not None:
+                node.visible = None
+        hidden = getattr(node, 'hidden', None) is True or visible is False
+        hidden = known(node, 'visibleOn') is False or hidden
+        hidden = known(node, 'hiddenOn') is True or hidden
+        if hidden:
+            if getattr(node, 'name', None) and getattr(node, 'value', None) is not None:
+                node.hidden = True
+                node.visibleOn = node.hiddenOn = None
+                return False
+            return True
+        if known(node, 'disabledOn'):
+            node.disabled = True
+        if known(node, 'requiredOn'):
+            node.required = True
+        return False
+
+    return prune(root, remove)
+
+
+TEMPLATE_FIELDS = {'tpl', 'labelTpl', 'content', 'title', 'subTitle', 'description', 'desc', 'secondary'}
+"""interpolate_templates 处理的模板字段，地址类字段（href、source 等）不做处理"""
+ROW_SCOPES = {
+    'crud': ('columns', 'card', 'listItem', 'itemAction', 'itemActions', 'labelTpl', 'itemBadge'),
+    'table': ('columns', 'itemActions', 'itemBadge'),
+    'input-table': ('columns',),
+    'cards': ('card', 'itemAction'),
+    'list': ('listItem', 'itemAction'),
+    'each': ('items',),
+    'combo': ('items',),
+    'input-array': ('items',),
+}
+"""组件类型 -> 按行（每一项）的数据渲染的字段，其中的模板优先从行数据中取值；任何组件的 itemSchema 也是如此"""
+
+_HTML_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;', '/': '&#x2F;'}
+_HTML_RE = re.compile(r'[&<>"\'/]')
+_FILTER_ARG_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|(?:\\.|[^:\\])+')
+_THOUSANDS_RE = re.compile(r'(\d)(?=(\d{3})+$)')
+_MOMENT_RE = re.compile(r'\[[^\]]*\]|YYYY|YY|MM|M|DD|D|HH|H|hh|h|mm|m|ss|s|[A-Za-z]+|.', re.S)
+_MOMENT_TOKENS = {'YYYY': '%Y', 'YY': '%y', 'MM': '%m', 'DD': '%d', 'HH': '%H', 'hh': '%I', 'mm': '%M',
+                  'ss': '%S'}
+
+
+class _Unresolved(Exception):
+    pass
+
+
+def _escape_html(text: str) -> str:
+    return _HTML_RE.sub(lambda m: _HTML_ESCAPES[m.group()], text)
+
+
+def _moment_format(value: datetime, fmt: str) -> str:
+    result = []
+    for token in _MOMENT_RE.findall(fmt):
+        if token.startswith('['):
+            result.append(token[1:-1])
+        elif token in _MOMENT_TOKENS:
+            result.append(value.strftime(_MOMENT_TOKENS[token]))
+        elif token in ('M', 'D', 'H', 'm', 's'):
+            result.append(str({'M': value.month, 'D': value.day, 'H': value.hour, 'm': value.minute,
+                               's': value.second}[token]))
+        elif token == 'h':
+            result.append(str(value.hour % 12 or 12))
+        elif token.isascii() and token.isalpha():
+            # LLL、A 等依赖 moment 语言包的格式交给前端处理
+            raise _Unresolved
+        else:
+            result.append(token)
+    return ''.join(result)
+
+
+def _moment_parse(value: Any, fmt: str) -> datetime:
+    if fmt in ('X', 'x'):
+        # 时间戳按浏览器所在时区格式化，服务端无法确定
+        raise _Unresolved
+    pattern = []
+    for token in _MOMENT_RE.findall(fmt):
+        if token in _MOMENT_TOKENS:
+            pattern.append(_MOMENT_TOKENS[token])
+        elif token.startswith('[') or not (token.isascii() and token.isalpha()):
+            pattern.append(token.strip('[]').replace('%', '%%'))
+        else:
+            raise _Unresolved
+    try:
+        return datetime.strptime(str(value), ''.join(pattern))
+    except ValueError:
+        raise _Unresolved
+
+
+def _apply_filter(value: Any, name: str, args: List[str]) -> Any:
+    if name == 'raw':
+        return value
+    if name == 'html':
+        return _escape_html(_to_str(value))
+    if name == 'number':
+        parts = _to_str(value).split('.')
+        parts[0] = _THOUSANDS_RE.sub(r'\1,', parts[0])
+        return '.'.join(parts)
+    if name == 'date':
+        fmt = args[0] if args else 'LLL'
+        return _moment_format(_moment_parse(value, args[1] if len(args) > 1 else 'X'), fmt)
+    raise _Unresolved
+
+
+def _resolve_mapping(body: str, context: Mapping[str, Any]) -> str:
+    parts = _FILTER_RE.split(body)
+    value = evaluate(parts[0], context)
+    if isinstance(value, _Unknown) or isinstance(value, (dict, list)):
+        raise _Unresolved
+    filters = [p.strip() for p in parts[1:]]
+    if not filters:
+        filters = ['html']
+    for item in filters:
+        name, _, rest = item.partition(':')
+        args = [a.strip()[1:-1] if a.strip()[:1] in '"\'' else a.strip().replace('\\:', ':')
+                for a in _FILTER_ARG_RE.findall(rest)]
+        value = _apply_filter(value, name.strip(), [a for a in args if a])
+    text = '' if value is None else _to_str(value)
+    if '$' in text:
+        # 结果中的 $ 会被前端再次当作数据映射
+        raise _Unresolved
+    return text
+
+
+def interpolate(text: str, context: Mapping[str, Any]) -> str:
+    """
+    用服务端已知的数据替换模板中的 ${...} 与 $name，支持 html、raw、number、date 过滤器，
+    与 amis 一致，没有过滤器时默认按 html 转义。无法确定的部分保持原样。
+    """
+    if not isinstance(text, str) or '$' not in text:
+        return text
+
+    def replace(m):
+        if m.start() and text[m.start() - 1] == '\\':
+            return m.group(0)
+        try:
+            return _resolve_mapping(m.group(1), context)
+        except _Unresolved:
+            return m.group(0)
+
+    def replace_shorthand(m):
+        if m.group(1) not in context or m.string[m.start() - 1:m.start()] == '\\':
+            return m.group(0)
+        try:
+            return _resolve_mapping(m.group(1), context)
+        except _Unresolved:
+            return m.group(0)
+
+    # 先处理 $name 简写，再处理 ${}，避免替换结果被再次处理
+    pieces = []
+    last = 0
+    for m in TEMPLATE_RE.finditer(text):
+        pieces.append(SHORTHAND_RE.sub(replace_shorthand, text[last:m.start()]))
+        pieces.append(replace(m))
+        last = m.end()
+    pieces.append(SHORTHAND_RE.sub(replace_shorthand, text[last:]))
+    return ''.join(pieces)
+
+
+def _walk_page_scope(root: Any):
+    """与 walk 相同，但不进入 ROW_SCOPES 中按行渲染的字段"""
+    stack = list(iter_children(root))[::-1]
+    while stack:
+        current = stack.pop()
+        yield current
+        skipped = ROW_SCOPES.get(getattr(current, 'type', None), ())
+        children = []
+        for field, value in current.__dict__.items():
+            if field not in skipped and field != 'itemSchema':
+                children.extend(iter_children(value))
+        stack.extend(reversed(children))
+
+
+def interpolate_templates(root: Any, context: Mapping[str, Any]) -> int:
+    """
+    对组件树中 TEMPLATE_FIELDS 字段的模板字符串执行 interpolate，返回被改写的字段数。
+    CRUD/Table 的列、Cards 的 card、Each 的 items 等按行渲染的部分不处理：前端先从行数据中取值，
+    行中的同名字段会覆盖 context 中的变量。
+    """
+    count = 0
+    for node in _walk_page_scope(root):
+        skipped = ROW_SCOPES.get(getattr(node, 'type', None), ())
+        for field in TEMPLATE_FIELDS:
+            if field in skipped:
+                continue
+            value = getattr(node, field, None)
+            if isinstance(value, str) and '$' in value:
+                result = interpolate(value, context)
+                if result != value:
+                    setattr(node, field, result)
+                    count += 1
+    return count
@@ -0,0 +1,131 @@
+"""服务端数据注水：在服务端执行 initApi/Service.api，将结果直接写入组件的 data，省去首屏的数据请求"""
+import asyncio
+import inspect
+from typing import Any, Callable, List, Mapping, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+
+from .types import BaseAmisApiOut, RawJSON
+from .utils import split_api, walk
+
+HYDRATE_FIELDS = {'page': 'initApi', 'form': 'initApi', 'service': 'api'}
+"""可注水的组件类型及其初始化接口字段"""
+
+Resolver = Union[Mapping[str, Any], Callable[[str, Any], Any]]
+
+_SKIP = object()
+
+
+def _has_mapping(value: Any) -> bool:
+    """值中（包括嵌套的字典、列表的键和值）是否含有数据映射 $"""
+    if isinstance(value, str):
+        return '$' in value
+    if isinstance(value, RawJSON):
+        return '$' in value.raw
+    if isinstance(value, dict):
+        return any(_has_mapping(k) or _has_mapping(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return any(_has_mapping(v) for v in value)
+    return False
+
+
+def _scoped(api: Any, url: str) -> bool:
+    """接口的地址、data、trackExpression 或 headers 中引用了变量（$），结果依赖前端数据域"""
+    if '$' in url:
+        return True
+    if isinstance(api, str):
+        return False
+    get = api.get if isinstance(api, dict) else lambda name: getattr(api, name, None)
+    headers = get('headers')
+    if isinstance(headers, dict) and any(isinstance(v, str) and '$' in v for v in headers.values()):
+        return True
+    return _has_mapping(get('data')) or _has_mapping(get('trackExpression'))
+
+
+def _adapted(api: Any) -> bool:
+    """接口配置了 responseData、adaptor 或 requestAdaptor，前端拿到的数据与接口的原始返回不同"""
+    if isinstance(api, str):
+        return False
+    get = api.get if isinstance(api, dict) else lambda name: getattr(api, name, None)
+    return any(get(name) for name in ('responseData', 'adaptor', 'requestAdaptor'))
+
+
+def _targets(root: Any) -> List[Tuple[Any, str]]:
+    """
+    找出可以注水的组件及接口地址：GET 接口、默认拉取、没有轮询，
+    地址、参数、请求头中引用了变量（$）的接口依赖前端数据域，
+    配置了 responseData、adaptor、requestAdaptor 的接口的结果由前端转换，均不做处理
+    """
+    targets = []
+    for node in walk(root):
+        field = HYDRATE_FIELDS.get(getattr(node, 'type', None))
+        api = getattr(node, field, None) if field else None
+        if not api or getattr(node, 'initFetch', None) is False or getattr(node, 'initFetchOn', None):
+            continue
+        if getattr(node, 'interval', None) or getattr(api, 'sendOn', None):
+            continue
+        method, url = split_api(api)
+        if method != 'get' or not url or _scoped(api, url) or _adapted(api):
+            continue
+        targets.append((node, url))
+    return targets
+
+
+def _resolve(resolver: Resolver, url: str, node: Any) -> Any:
+    if callable(resolver):
+        return resolver(url, node)
+    parts = urlsplit(url)
+    if parts.path not in resolver:
+        return _SKIP
+    value = resolver[parts.path]
+    return value(dict(parse_qsl(parts.query, keep_blank_values=True))) if callable(value) else value
+
+
+def _apply(node: Any, result: Any) -> bool:
+    if result is _SKIP or result is None:
+        return False
+    if isinstance(result, BaseAmisApiOut):
+        # 接口出错时交给前端请求并提示
+        if result.status != 0:
+            return False
+        result = result.data
+    if not isinstance(result, (dict, RawJSON)):
+        return False
+    api = getattr(node, HYDRATE_FIELDS[node.type])
+    current = getattr(node, 'data', None)
+    if isinstance(current, RawJSON):
+        current = current.loads()
+    # 与 amis 一致，接口返回的数据合并到组件已有的 data 中，replaceData 为真时替换
+    replace = api.get('replaceData') if isinstance(api, dict) else getattr(api, 'replaceData', None)
+    if isinstance(current, dict) and current and not replace:
+        result = {**current, **(result.loads() if isinstance(result, RawJSON) else result)}
+    elif isinstance(result, RawJSON) and not result.raw.lstrip().startswith('{'):
+        return False
+    node.data = result
+    node.initFetch = False
+    return True
+
+
+def hydrate(root: Any, resolver: Resolver) -> int:
+    """
+    在服务端执行组件树中 Page/Form 的 initApi 与 Service 的 api，结果合并到组件的 data 并设置 initFetch=False。
+    resolver 可以是：
+    - 函数 resolver(url, node)，返回接口数据（dict/RawJSON）或 BaseAmisApiOut，返回 None 表示不处理
+    - 字典 {接口路径: 数据或函数}，函数接收查询参数字典
+    返回注水的组件数。组件会被原地修改，需要复用的组件树请先复制。
+    """
+    count = 0
+    for node, url in _targets(root):
+        count += _apply(node, _resolve(resolver, url, node))
+    return count
+
+
+async def hydrate_async(root: Any, resolver: Resolver) -> int:
+    """与 hydrate 相同，但 resolver 可以返回 awaitable，所有接口并发执行"""
+
+    async def run(node, url) -> Optional[Any]:
+        result = _resolve(resolver, url, node)
+        return await result if inspect.isawaitable(result) else result
+
+    targets = _targets(root)
+    results = await asyncio.gather(*(run(node, url) for node, url in targets))
+    return sum(_apply(node, result) for (node, _), result in zip(targets, results))
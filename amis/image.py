@@ -0,0 +1,233 @@
+"""图片处理：按 InputImage 的 limit/crop 配置校验上传的图片，在进程池中生成缩略图并按内容摘要缓存到磁盘"""
+import hashlib
+import io
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from .components import Image, InputImage
+from .types import BaseAmisApiOut
+from .utils import walk
+
+try:
+    from PIL import Image as PILImage, ImageOps
+except ImportError:
+    PILImage = None
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp', 'BMP': 'bmp'}
+"""支持的图片格式及其扩展名"""
+RATIO_TOLERANCE = 0.01
+"""宽高比校验的允许误差"""
+
+Size = Tuple[int, int, str]
+"""缩略图规格：(宽, 高, 模式)，模式为 cover（裁剪填满）或 contain（等比缩放到框内）"""
+
+
+def check_limit(width: int, height: int, limit: Any) -> Optional[str]:
+    """按 InputImage.Limit 校验图片尺寸，不通过时返回与 amis 一致的提示，通过时返回 None"""
+    if limit is None:
+        return None
+    get = limit.get if isinstance(limit, dict) else lambda k: getattr(limit, k, None)
+    if get('width') and width != get('width'):
+        return f'您选择的图片不符合尺寸要求, 请上传宽度为 {get("width")}px 的图片'
+    if get('height') and height != get('height'):
+        return f'您选择的图片不符合尺寸要求, 请上传高度为 {get("height")}px 的图片'
+    if get('minWidth') and width < get('minWidth'):
+        return f'您选择的图片不符合尺寸要求, 请上传宽度不小于 {get("minWidth")}px 的图片'
+    if get('minHeight') and height < get('minHeight'):
+        return f'您选择的图片不符合尺寸要求, 请上传高度不小于 {get("minHeight")}px 的图片'
+    if get('maxWidth') and width > get('maxWidth'):
+        return f'您选择的图片不符合尺寸要求, 请上传宽度不大于 {get("maxWidth")}px 的图片'
+    if get('maxHeight') and height > get('maxHeight'):
+        return f'您选择的图片不符合尺寸要求, 请上传高度不大于 {get("maxHeight")}px 的图片'
+    ratio = get('aspectRatio')
+    if ratio and height and abs(width / height - ratio) > RATIO_TOLERANCE:
+        return f'您选择的图片不符合尺寸要求, 请上传尺寸比率为 {ratio:.2f} 的图片'
+    return None
+
+
+def _crop_box(width: int, height: int, ratio: float) -> Tuple[int, int, int, int]:
+    """按宽高比居中裁剪的区域"""
+    if width / height > ratio:
+        w = round(height * ratio)
+        return (width - w) // 2, 0, (width - w) // 2 + w, height
+    h = round(width / ratio)
+    return 0, (height - h) // 2, width, (height - h) // 2 + h
+
+
+def _make_thumbnail(src: str, dst: str, width: int, height: int, mode: str, quality: int) -> str:
+    """生成缩略图，在进程池中执行"""
+    with PILImage.open(src) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'P') else 'RGB')
+        if mode == 'cover':
+            img = ImageOps.fit(img, (width, height), PILImage.LANCZOS)
+        else:
+            img.thumbnail((width, height), PILImage.LANCZOS)
+        tmp = f'{dst}.{os.getpid()}.tmp'
+        img.save(tmp, 'WEBP', quality=quality, method=4)
+    os.replace(tmp, dst)
+    return dst
+
+
+class ImagePipeline:
+    """
+    图片处理流水线：
+    - ingest 校验并保存上传的原图，原图以内容摘要命名（{摘要}.{扩展名}，即 InputImage 的值），相同图片只保存一份
+    - 缩略图在进程池中生成，保存为 {directory}/{规格名}/{摘要}.webp，访问时若还未生成则同步生成
+    - rewrite_columns 将表格中的图片列改为使用缩略图地址
+    原图地址为 {url_prefix}{值}，缩略图地址为 {url_prefix}{规格名}/{值}，需将其路由到 original_path/thumbnail_path。
+    """
+
+    def __init__(self, directory: Union[str, Path], sizes: Dict[str, Size] = None, url_prefix: str = '/images/',
+                 quality: int = 80, workers: int = None):
+        self.directory = Path(directory)
+        """图片保存目录"""
+        self.sizes = sizes or {'thumb': (160, 160, 'cover')}
+        """缩略图规格 {规格名: (宽, 高, 模式)}"""
+        self.url_prefix = url_prefix
+        """图片地址前缀"""
+        self.quality = quality
+        """缩略图质量（webp）"""
+        self.workers = workers
+        """进程池大小，默认为 CPU 数"""
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[Tuple[str, str], Future] = {}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def original_path(self, key: str) -> Optional[Path]:
+        """原图的文件路径，key 不合法或不存在时返回 None"""
+        digest, _, ext = str(key).partition('.')
+        if len(digest) != 64 or ext not in EXTENSIONS.values() or not all(c in '0123456789abcdef' for c in digest):
+            return None
+        path = self.directory / 'originals' / digest[:2] / key
+        return path if path.is_file() else None
+
+    def _thumbnail_target(self, size: str, key: str) -> Path:
+        width, height, mode = self.sizes[size]
+        # 规格参与目录名，修改规格后旧的缩略图自然失效
+        return self.directory / f'{size}-{width}x{height}-{mode}' / f'{key.partition(".")[0]}.webp'
+
+    def thumbnail_path(self, size: str, key: str) -> Optional[Path]:
+        """缩略图的文件路径，尚未生成时等待或同步生成；规格或原图不存在时返回 None"""
+        src = self.original_path(key)
+        if size not in self.sizes or src is None:
+            return None
+        target = self._thumbnail_target(size, key)
+        if target.is_file():
+            return target
+        future = self._pending.get((size, key))
+        if future is not None:
+            future.result()
+            return target
+        self._generate(size, key, src, target)
+        return target
+
+    def _generate(self, size: str, key: str, src: Path, target: Path, background: bool = False):
+        if PILImage is None:
+            raise RuntimeError('Pillow is required to generate thumbnails')
+        width, height, mode = self.sizes[size]
+        target.parent.mkdir(parents=True, exist_ok=True)
+        args = (str(src), str(target), width, height, mode, self.quality)
+        if not background:
+            _make_thumbnail(*args)
+            return
+        future = self._pool().submit(_make_thumbnail, *args)
+        self._pending[(size, key)] = future
+        future.add_done_callback(lambda _: self._pending.pop((size, key), None))
+
+    def ingest(self, data: Union[bytes, str, Path], field: InputImage = None) -> BaseAmisApiOut:
+        """
+        校验并保存上传的图片，data 为图片内容或文件路径（如 ChunkUploader 拼接好的文件）。
+        按 field 的 maxSize、limit 校验；配置了 crop.aspectRatio 而图片比例不符时（如绕过了前端裁剪）居中裁剪。
+        返回 {value, url, thumbs: {规格名: 地址}}，缩略图在后台生成。
+        """
+        if PILImage is None:
+            raise RuntimeError('Pillow is required to ingest images')
+        raw = Path(data).read_bytes() if isinstance(data, (str, Path)) else bytes(data)
+        if field is not None and field.maxSize and len(raw) > field.maxSize:
+            return BaseAmisApiOut(status=413, msg=f'您选择的文件大小超出了 {field.maxSize} B 的限制')
+        try:
+            with PILImage.open(io.BytesIO(raw)) as img:
+                fmt, width, height = img.format, img.width, img.height
+                if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                    # 按 EXIF 方向旋转 90 度显示的图片，宽高互换
+                    width, height = height, width
+                ratio = getattr(field.crop, 'aspectRatio', None) if field is not None else None
+                if fmt in EXTENSIONS and ratio and abs(width / height - ratio) > RATIO_TOLERANCE:
+                    cropped = ImageOps.exif_transpose(img).crop(_crop_box(width, height, ratio))
+                    buffer = io.BytesIO()
+                    cropped.save(buffer, fmt)
+                    raw, (width, height) = buffer.getvalue(), cropped.size
+        except (OSError, ValueError, PILImage.DecompressionBombError):
+            # DecompressionBombError 不是 OSError/ValueError 的子类，需单独捕获
+            return BaseAmisApiOut(status=422, msg='无法识别的图片')
+        if fmt not in EXTENSIONS:
+            return BaseAmisApiOut(status=422, msg=f'不支持的图片格式 {fmt}')
+        message = check_limit(width, height, field.limit if field is not None else None)
+        if message:
+            return BaseAmisApiOut(status=422, msg=message)
+        digest = hashlib.sha256(raw).hexdigest()
+        key = f'{digest}.{EXTENSIONS[fmt]}'
+        path = self.directory / 'originals' / digest[:2] / key
+        if not path.is_file():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f'{key}.{os.getpid()}.tmp')
+            tmp.write_bytes(raw)
+            os.replace(tmp, path)
+        for size in self.sizes:
+            target = self._thumbnail_target(size, key)
+            if not target.is_file() and (size, key) not in self._pending:
+                self._generate(size, key, path, target, background=True)
+        return BaseAmisApiOut(data={
+            'value': key,
+            'url': self.url_prefix + key,
+            'width': width,
+            'height': height,
+            'thumbs': {size: f'{self.url_prefix}{size}/{key}' for size in self.sizes},
+        })
+
+    def configure(self, field: InputImage, receiver: str) -> InputImage:
+        """设置 InputImage 的上传接口，使其值为 ingest 返回的 value"""
+        field.receiver = receiver
+        field.accept = ','.join(f'.{ext}' for ext in sorted(set(EXTENSIONS.values()) | {'jpeg'}))
+        return field
+
+    def rewrite_columns(self, root: Any, size: str = 'thumb', fields: set = None) -> int:
+        """
+        将组件树中 Table/CRUD 的图片列（值为 ingest 返回的 value）改为显示缩略图：
+        src 指向缩略图，originalSrc 指向原图并开启放大预览，thumbMode 与缩略图规格一致。
+        fields 用于限定处理的列名。返回改写的列数。
+        """
+        if size not in self.sizes:
+            raise ValueError(f'unknown thumbnail size {size!r}')
+        width, height, mode = self.sizes[size]
+        count = 0
+        for node in walk(root):
+            if getattr(node, 'type', None) not in ('table', 'crud'):
+                continue
+            for column in getattr(node, 'columns', None) or []:
+                name = getattr(column, 'name', None)
+                if not isinstance(column, Image) or not name or (fields is not None and name not in fields):
+                    continue
+                if column.src not in (None, f'${{{name}}}'):
+                    continue
+                column.src = f'{self.url_prefix}{size}/${{{name}}}'
+                column.originalSrc = f'{self.url_prefix}${{{name}}}'
+                column.enlargeAble = True
+                column.thumbMode = 'cover' if mode == 'cover' else 'contain'
+                column.width = column.width or width
+                column.height = column.height or height
+                count += 1
+        return count
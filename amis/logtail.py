@@ -0,0 +1,321 @@
+"""Log 组件的服务端：按行跟踪日志文件，新连接只发送末尾若干行，同一文件的所有连接共用一个读取任务"""
+import asyncio
+import mmap
+import os
+from typing import Callable, Dict, Mapping, Optional, Set, Union
+from urllib.parse import parse_qs, quote
+
+from .components import Log
+
+Resolve = Callable[[str], Optional[str]]
+
+
+def filter_lines(data: bytes, needle: Optional[bytes]) -> bytes:
+    """只保留包含 needle 的行，按 bytes.lower 忽略大小写（只对 ASCII 字母生效），needle 为 None 时原样返回"""
+    if needle is None:
+        return data
+    return b''.join(line for line in data.splitlines(keepends=True) if needle in line.lower())
+
+
+def tail(fileno: int, end: int, lines: int, needle: Optional[bytes] = None, max_scan: int = 64 * 2 ** 20,
+         block_size: int = 2 ** 20) -> bytes:
+    """
+    用 mmap 从 end 处向前查找最后 lines 行（有 needle 时为最后 lines 个匹配行），最多向前查找 max_scan 字节，
+    耗时与文件大小无关；有 needle 时按 block_size 分块转为小写后用 rfind 查找，不逐行处理
+    """
+    if end <= 0 or lines <= 0 or os.fstat(fileno).st_size == 0:
+        return b''
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mm:
+        end = min(end, len(mm))
+        floor = max(0, end - max_scan)
+        if needle is None:
+            start = end
+            for _ in range(lines):
+                if start <= floor:
+                    break
+                start = mm.rfind(b'\n', floor, start - 1) + 1 or floor
+            if start == floor and floor > 0 and mm[floor - 1:floor] != b'\n':
+                # 查找范围的第一行不完整
+                start = mm.find(b'\n', floor, end) + 1 or end
+            return mm[start:end]
+        found = []
+        hi = end
+        while hi > floor and len(found) < lines:
+            lo = max(floor, hi - block_size)
+            if lo > floor:
+                # 块的起点对齐到行首，超长的行延伸到 floor 为止
+                lo = mm.rfind(b'\n', floor, lo) + 1 or floor
+            raw = mm[lo:hi]
+            block = raw.lower()
+            pos = len(block)
+            while len(found) < lines:
+                i = block.rfind(needle, 0, pos)
+                if i < 0:
+                    break
+                line_start = block.rfind(b'\n', 0, i) + 1
+                line_end = block.find(b'\n', i)
+                line_end = len(block) if line_end < 0 else line_end + 1
+                if line_start == 0 and lo == floor and floor > 0 and mm[floor - 1:floor] != b'\n':
+                    break
+                found.append(raw[line_start:line_end])
+                pos = line_start
+            hi = lo
+        return b''.join(reversed(found))
+
+
+class Follower:
+    """
+    一个连接的跟踪状态，积压的数据超过上限时标记为溢出，由连接断开，
+    读取任务不会因为个别慢速客户端而阻塞
+    """
+    __slots__ = ('needle', 'pending', 'size', 'event', 'overflow')
+
+    def __init__(self, needle: Optional[bytes] = None):
+        self.needle = needle
+        """过滤关键字（小写），None 为不过滤"""
+        self.pending = []
+        self.size = 0
+        """积压的字节数"""
+        self.event = asyncio.Event()
+        self.overflow = False
+
+    def offer(self, chunk: bytes, limit: int):
+        if self.overflow:
+            return
+        self.pending.append(chunk)
+        self.size += len(chunk)
+        if self.size > limit:
+            self.overflow = True
+            self.pending.clear()
+        self.event.set()
+
+    async def next(self) -> Optional[bytes]:
+        """等待并取出积压的数据，溢出时返回 None"""
+        await self.event.wait()
+        self.event.clear()
+        if self.overflow:
+            return None
+        chunk = b''.join(self.pending)
+        self.pending.clear()
+        self.size = 0
+        return chunk
+
+
+class _Reader:
+    """单个文件的读取状态，offset 之前的内容都已分发，总是停在行尾"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.offset = self._line_end()
+        self.followers: Dict[Optional[bytes], Set[Follower]] = {}
+        """过滤关键字 -> 跟踪者，相同关键字的连接只过滤一次"""
+        self.task: Optional[asyncio.Task] = None
+
+    def _line_end(self) -> int:
+        size = os.fstat(self.file.fileno()).st_size
+        if size == 0:
+            return 0
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm.rfind(b'\n') + 1
+
+    def __len__(self) -> int:
+        return sum(map(len, self.followers.values()))
+
+    def add(self, follower: Follower):
+        self.followers.setdefault(follower.needle, set()).add(follower)
+
+    def remove(self, follower: Follower):
+        followers = self.followers.get(follower.needle)
+        if followers is not None:
+            followers.discard(follower)
+            if not followers:
+                del self.followers[follower.needle]
+
+    def read(self, size: int) -> bytes:
+        """读取 offset 之后最多 size 字节的完整行；文件被截断时从头读，被轮转时切换到新文件"""
+        length = os.fstat(self.file.fileno()).st_size
+        if length < self.offset:
+            self.offset = 0
+        if length == self.offset:
+            try:
+                inode = os.stat(self.path).st_ino
+            except OSError:
+                return b''
+            if inode != self.inode:
+                self.file.close()
+                self.file = open(self.path, 'rb')
+                self.inode, self.offset = inode, 0
+            return b''
+        self.file.seek(self.offset)
+        data = self.file.read(min(size, length - self.offset))
+        cut = data.rfind(b'\n') + 1
+        if cut == 0 and len(data) < size:
+            # 最后一行还没有写完
+            return b''
+        if cut:
+            data = data[:cut]
+        self.offset += len(data)
+        return data
+
+    def broadcast(self, data: bytes, limit: int):
+        for needle, followers in self.followers.items():
+            chunk = filter_lines(data, needle)
+            if chunk:
+                for follower in followers:
+                    follower.offer(chunk, limit)
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.file.close()
+
+
+class LogTail:
+    """
+    日志跟踪服务，是一个 ASGI 应用，作为 Log.source 的接口：
+    - 查询参数 file 为日志名，由 files 映射或解析为文件路径，无法解析的返回 404
+    - 连接后先发送末尾 lines 行（默认 default_lines，不超过 max_lines），之后以分块传输持续发送新写入的行
+    - 查询参数 filter 不为空时只发送包含该关键字的行（只有 ASCII 字母不区分大小写），末尾行数按匹配的行计算
+    - 同一文件的所有连接共用一个读取任务，每次读取的数据只过滤、分发一次；
+      积压超过 max_pending 字节或单次发送超过 send_timeout 秒的连接视为过慢的客户端并断开
+    """
+
+    def __init__(self, files: Union[Mapping[str, str], Resolve], default_lines: int = 1000,
+                 max_lines: int = 10000, interval: float = 0.5, chunk_size: int = 65536,
+                 max_pending: int = 4 * 2 ** 20, send_timeout: float = 10, max_scan: int = 64 * 2 ** 20):
+        self.resolve: Resolve = files.get if isinstance(files, Mapping) else files
+        """日志名 -> 文件路径"""
+        self.default_lines = default_lines
+        self.max_lines = max_lines
+        self.interval = interval
+        """文件没有新内容时检查的间隔秒数"""
+        self.chunk_size = chunk_size
+        """每次读取的最大字节数"""
+        self.max_pending = max_pending
+        self.send_timeout = send_timeout
+        self.max_scan = max_scan
+        """连接时查找末尾的行最多向前读取的字节数，关键字很少出现时返回的行可能少于 lines"""
+        self._readers: Dict[str, _Reader] = {}
+
+    def follower_count(self, path: str) -> int:
+        reader = self._readers.get(os.path.realpath(path))
+        return 0 if reader is None else len(reader)
+
+    async def _follow(self, reader: _Reader):
+        while True:
+            data = reader.read(self.chunk_size)
+            if data:
+                reader.broadcast(data, self.max_pending)
+                # 积压较多时分批读取，让出事件循环给发送数据的连接
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(self.interval)
+
+    def follow(self, path: str, needle: Optional[bytes] = None) -> Follower:
+        """开始跟踪文件，返回的 Follower 从当前读取位置开始接收新的行"""
+        path = os.path.realpath(path)
+        reader = self._readers.get(path)
+        if reader is None:
+            reader = self._readers[path] = _Reader(path)
+        follower = Follower(needle)
+        reader.add(follower)
+        if reader.task is None:
+            reader.task = asyncio.ensure_future(self._follow(reader))
+        return follower
+
+    def unfollow(self, path: str, follower: Follower):
+        path = os.path.realpath(path)
+        reader = self._readers.get(path)
+        if reader is None:
+            return
+        reader.remove(follower)
+        if not reader.followers:
+            reader.close()
+            del self._readers[path]
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable):
+        if scope['type'] != 'http':
+            return
+        params = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        path = self.resolve(params.get('file', [''])[0])
+        if not path or not os.path.isfile(path):
+            await send({'type': 'http.response.start', 'status': 404, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'log not found'})
+            return
+        try:
+            lines = min(int(params.get('lines', [self.default_lines])[0]), self.max_lines)
+        except ValueError:
+            lines = self.default_lines
+        keyword = params.get('filter', [''])[0]
+        # 与日志内容一样按 bytes 转为小写，两侧的大小写折叠方式一致
+        needle = keyword.encode('utf-8').lower() if keyword and '\n' not in keyword else None
+        follower = self.follow(path, needle)
+        try:
+            await self._serve(path, follower, lines, receive, send)
+        finally:
+            self.unfollow(path, follower)
+
+    async def _serve(self, path: str, follower: Follower, lines: int, receive: Callable, send: Callable):
+        reader = self._readers[os.path.realpath(path)]
+        # 末尾的行截止到注册时的读取位置，之后的内容由读取任务分发，两者不重不漏
+        # 复制文件描述符，读取末尾的行期间文件被轮转、关闭也不受影响
+        end, fileno = reader.offset, os.dup(reader.file.fileno())
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/plain; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+
+        def body(chunk: bytes):
+            return send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+        async def wait_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        closed = asyncio.ensure_future(wait_disconnect())
+        try:
+            try:
+                initial = await asyncio.get_running_loop().run_in_executor(None, tail, fileno, end, lines,
+                                                                            follower.needle, self.max_scan)
+            finally:
+                os.close(fileno)
+            if initial:
+                await asyncio.wait_for(body(initial), self.send_timeout)
+            while not closed.done():
+                getter = asyncio.ensure_future(follower.next())
+                done, _ = await asyncio.wait({getter, closed}, return_when=asyncio.FIRST_COMPLETED)
+                if closed in done:
+                    getter.cancel()
+                    return
+                chunk = getter.result()
+                if chunk is None:
+                    break
+                await asyncio.wait_for(body(chunk), self.send_timeout)
+        except asyncio.TimeoutError:
+            # 发送已经卡住的客户端不再等待结束响应
+            return
+        finally:
+            closed.cancel()
+        try:
+            await asyncio.wait_for(send({'type': 'http.response.body', 'body': b''}), self.send_timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    @staticmethod
+    def configure(log: Log, url: str, file: str, keyword: str = None) -> Log:
+        """
+        设置 Log 的 source，按 maxLength 请求末尾的行；
+        keyword 为过滤关键字，可以是变量（如 ${keyword}），变化时 Log 会重新连接
+        """
+        sep = '&' if '?' in url else '?'
+        source = f'{url}{sep}file={quote(file, safe="")}'
+        if log.maxLength:
+            source += f'&lines={log.maxLength}'
+        if keyword:
+            source += f'&filter={quote(keyword, safe="${}")}'
+        log.source = source
+        return log
@@ -0,0 +1,225 @@
+"""超大选项组卸载：将内联的大量选项移入进程内存储，组件改为通过分页、可检索的选项接口获取"""
+import hashlib
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .components import Select, Transfer, TabsTransfer, TabsTransferPicker, InputTree
+from .types import BaseAmisApiOut, OptionsColumns, RawJSON, dumps
+from .utils import walk
+
+
+def _normalize(options: Sequence, label_field: str, value_field: str) -> List[dict]:
+    if isinstance(options, OptionsColumns):
+        return options.to_list()
+    return [o if isinstance(o, dict) else {label_field: o, value_field: o} for o in options]
+
+
+def _count(options: Sequence, children_field: str = 'children') -> int:
+    if isinstance(options, OptionsColumns):
+        return len(options)
+    total = 0
+    stack = [options]
+    while stack:
+        items = stack.pop()
+        total += len(items)
+        stack.extend(o[children_field] for o in items if isinstance(o, dict) and o.get(children_field))
+    return total
+
+
+class OptionIndex:
+    """
+    选项索引，构建时一次性计算好小写标签，检索时：
+    - 前缀匹配通过有序标签二分查找
+    - 子串匹配在拼接好的标签文本上用str.find查找
+    树形选项会被展开，有子节点的选项去掉children并标记defer，子节点按父节点的值索引。
+    """
+
+    def __init__(self, options: List[dict], label_field: str = 'label', value_field: str = 'value',
+                 tree: bool = False, children_field: str = 'children'):
+        self.label_field = label_field
+        self.value_field = value_field
+        self.options: List[dict] = []
+        """展开后的全部选项（不含children）"""
+        self.roots: Tuple[int, ...] = ()
+        """顶层选项的下标"""
+        self.children: Dict[str, Tuple[int, ...]] = {}
+        """父选项值 -> 子选项下标"""
+        self._flatten(options, tree, children_field)
+
+        labels = [str(o.get(label_field, '')).lower().replace('\n', ' ') for o in self.options]
+        self._haystack = '\n'.join(labels)
+        self._starts = []
+        offset = 0
+        for label in labels:
+            self._starts.append(offset)
+            offset += len(label) + 1
+        self._prefix_order = sorted(range(len(labels)), key=labels.__getitem__)
+        self._prefix_keys = [labels[i] for i in self._prefix_order]
+        self._by_value = {str(o.get(value_field)): i for i, o in enumerate(self.options)}
+        self.search = lru_cache(maxsize=256)(self._search)
+
+    def _flatten(self, options: List[dict], tree: bool, children_field: str):
+        roots = []
+        stack = [(None, o) for o in reversed(options)]
+        while stack:
+            parent, option = stack.pop()
+            children = option.get(children_field)
+            if children and not tree:
+                # 非树形组件中的children为选项分组，只保留叶子选项
+                stack.extend((None, o) for o in reversed(children))
+                continue
+            item = {k: v for k, v in option.items() if k != children_field}
+            if children:
+                item['defer'] = True
+                stack.extend((option.get(self.value_field), o) for o in reversed(children))
+            index = len(self.options)
+            self.options.append(item)
+            if parent is None:
+                roots.append(index)
+            else:
+                self.children.setdefault(str(parent), []).append(index)
+        self.roots = tuple(roots)
+        self.children = {k: tuple(v) for k, v in self.children.items()}
+
+    def _search(self, term: str) -> Tuple[int, ...]:
+        """检索标签，前缀匹配的排在前面，其余子串匹配按原顺序排列"""
+        term = term.lower().replace('\n', ' ')
+        if not term:
+            return tuple(range(len(self.options)))
+        lo = bisect_left(self._prefix_keys, term)
+        hi = bisect_left(self._prefix_keys, term + '\uffff', lo)
+        prefix = self._prefix_order[lo:hi]
+        seen = set(prefix)
+        rest = []
+        haystack, starts = self._haystack, self._starts
+        pos = haystack.find(term)
+        while pos != -1:
+            i = bisect_right(starts, pos) - 1
+            if i not in seen:
+                rest.append(i)
+            pos = haystack.find(term, starts[i + 1] if i + 1 < len(starts) else len(haystack))
+        return tuple(prefix + rest)
+
+    def lookup(self, values: Sequence[Any]) -> List[dict]:
+        """按选项值查找选项"""
+        result = []
+        for v in values:
+            i = self._by_value.get(str(v))
+            if i is not None:
+                result.append(self.options[i])
+        return result
+
+    def page(self, indices: Sequence[int], page: int, per_page: int) -> dict:
+        """分页取出选项"""
+        start = (page - 1) * per_page
+        return {
+            'options': [self.options[i] for i in indices[start:start + per_page]],
+            'total': len(indices),
+            'page': page,
+            'hasNext': start + per_page < len(indices),
+        }
+
+
+class OptionStore:
+    """进程内的选项存储，配合 offload_options 使用，通过 handle 响应组件发来的选项请求"""
+
+    def __init__(self, per_page: int = 50, max_per_page: int = 500):
+        self.per_page = per_page
+        """默认每页选项数"""
+        self.max_per_page = max_per_page
+        """每页选项数上限"""
+        self._indexes: Dict[str, OptionIndex] = {}
+
+    def register(self, options: Sequence, label_field: str = 'label', value_field: str = 'value',
+                 tree: bool = False, key: str = None) -> str:
+        """注册选项组并建立索引，返回其key；不指定key时以内容摘要作为key，相同的选项组只会建立一次索引"""
+        options = _normalize(options, label_field, value_field)
+        if key is None:
+            raw = dumps([label_field, value_field, tree, options], ensure_ascii=False)
+            key = hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+        if key not in self._indexes:
+            self._indexes[key] = OptionIndex(options, label_field, value_field, tree)
+        return key
+
+    def get(self, key: str) -> Optional[OptionIndex]:
+        return self._indexes.get(key)
+
+    def remove(self, key: str):
+        self._indexes.pop(key, None)
+
+    def handle(self, key: str, params: Mapping[str, Any]) -> BaseAmisApiOut:
+        """
+        响应选项请求，与框架无关，传入请求的查询参数即可：
+        - term: 检索关键字（autoComplete/searchApi）
+        - parent: 父选项的值，返回其子选项（deferApi）
+        - value: 当前已选的值，多个用英文逗号分隔，会附加在第一页中以便回显
+        - page/perPage: 分页参数
+        """
+        index = self._indexes.get(key)
+        if index is None:
+            return BaseAmisApiOut(status=404, msg=f'options {key} not found')
+        try:
+            page = max(int(params.get('page') or 1), 1)
+            per_page = min(max(int(params.get('perPage') or self.per_page), 1), self.max_per_page)
+        except (TypeError, ValueError):
+            return BaseAmisApiOut(status=422, msg='invalid page or perPage')
+        term = params.get('term') or ''
+        parent = params.get('parent')
+        if parent not in (None, ''):
+            indices = index.children.get(str(parent), ())
+        elif term:
+            indices = index.search(term)
+        else:
+            indices = index.roots
+        data = index.page(indices, page, per_page)
+        value = params.get('value')
+        if value not in (None, '') and page == 1:
+            values = value.split(',') if isinstance(value, str) else value
+            shown = {str(o.get(index.value_field)) for o in data['options']}
+            selected = [o for o in index.lookup(values) if str(o.get(index.value_field)) not in shown]
+            data['options'] = selected + data['options']
+        return BaseAmisApiOut(data=data)
+
+
+def offload_options(root: Any, store: OptionStore, url: str, threshold: int = 2000) -> int:
+    """
+    将组件树中选项数超过 threshold 的 Select、Transfer、InputTree 的内联选项移入 store，并改写组件：
+    - Select: 使用 source 加载第一页及已选项，autoComplete 检索
+    - Transfer: 使用 source 加载第一页及已选项，searchApi 检索
+    - InputTree/TreeSelect: 只内联顶层节点，子节点标记 defer 并通过 deferApi 懒加载
+    选项接口地址为 {url}/{key}，需将其路由到 store.handle(key, 查询参数)。
+    RawJSON 形式的选项无法计数，会被跳过。返回被改写的组件数。
+    """
+    url = url.rstrip('/')
+    count = 0
+    for node in walk(root):
+        if isinstance(node, (TabsTransfer, TabsTransferPicker)) or not isinstance(node, (Select, Transfer, InputTree)):
+            continue
+        options = node.options
+        if not options or isinstance(options, RawJSON):
+            continue
+        tree = isinstance(node, InputTree)
+        if (_count(options) if tree else len(options)) <= threshold:
+            continue
+        label_field = getattr(node, 'labelField', None) or 'label'
+        value_field = getattr(node, 'valueField', None) or 'value'
+        key = store.register(options, label_field, value_field, tree=tree)
+        api = f'{url}/{key}'
+        value_query = f'&value=${{{node.name}}}' if node.name else ''
+        if tree:
+            index = store.get(key)
+            node.options = [index.options[i] for i in index.roots]
+            node.deferApi = f'{api}?parent=${{value}}'
+            if node.searchable:
+                node.autoComplete = f'{api}?term=${{term}}'
+        else:
+            node.options = None
+            node.source = f'{api}?page=1{value_query}'
+            if isinstance(node, Transfer):
+                node.searchApi = f'{api}?term=${{term}}'
+            else:
+                node.autoComplete = f'{api}?term=${{term}}{value_query}'
+            node.searchable = True
+        count += 1
+    return count
@@ -0,0 +1,195 @@
+"""在服务端将 Markdown、Code 组件预先渲染为静态 Html 组件，渲染结果按内容摘要缓存"""
+import hashlib
+import html
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from .components import Code, Html, Markdown
+from .utils import transform
+
+try:
+    import markdown as markdown_lib
+    from markdown.extensions import Extension
+    from markdown.treeprocessors import Treeprocessor
+except ImportError:
+    markdown_lib = None
+
+try:
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+except ImportError:
+    highlight = None
+
+EDITOR_THEMES = {'vs': 'vs', 'vs-dark': 'native', 'hc-black': 'native'}
+"""Code 的 editorTheme 与 pygments 样式的对应关系"""
+LANGUAGE_ALIASES = {'plaintext': 'text', 'shell': 'bash', 'dockerfile': 'docker', 'csharp': 'c#', 'objective-c': 'objc'}
+"""Code 的 language（monaco 语言名）与 pygments 词法分析器名称不同的部分"""
+_CARRIED_FIELDS = ('id', 'className', 'visible', 'hidden', 'visibleOn', 'hiddenOn')
+_UNSAFE_URL_RE = re.compile(r'^(javascript|vbscript|file|data):', re.IGNORECASE)
+_SAFE_DATA_RE = re.compile(r'^data:image/(gif|png|jpeg|webp);', re.IGNORECASE)
+_URL_IGNORED_RE = re.compile(r'[\x00-\x20\x7f]+')
+SAFE_EXTENSIONS = ['abbr', 'def_list', 'fenced_code', 'footnotes', 'tables', 'sane_lists']
+"""不允许原始 html 时使用的 markdown 扩展，不含可以写入任意属性的 attr_list 与 md_in_html"""
+
+
+class RenderCache:
+    """
+    按内容摘要缓存渲染结果的 LRU 缓存；指定 directory 时同时写入该目录，供多个进程共享。
+    """
+
+    def __init__(self, max_size: int = 1024, directory: Union[str, Path] = None):
+        self.max_size = max_size
+        """内存中最多缓存的条数"""
+        self.directory = Path(directory) if directory else None
+        """磁盘缓存目录"""
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        return hashlib.sha256('\0'.join(map(str, parts)).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if self.directory is not None:
+            path = self.directory / f'{key}.html'
+            if path.is_file():
+                value = path.read_text('utf-8')
+                self._store(key, value)
+                return value
+        return None
+
+    def set(self, key: str, value: str):
+        self._store(key, value)
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再改名，避免其他进程读到写了一半的文件
+            tmp = self.directory / f'{key}.{os.getpid()}.tmp'
+            tmp.write_text(value, 'utf-8')
+            os.replace(tmp, self.directory / f'{key}.html')
+
+    def _store(self, key: str, value: str):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+default_cache = RenderCache()
+"""prerender 默认使用的缓存"""
+
+
+def _safe_url(url: str, image: bool = False) -> bool:
+    url = _URL_IGNORED_RE.sub('', html.unescape(url))
+    return not _UNSAFE_URL_RE.match(url) or (image and bool(_SAFE_DATA_RE.match(url)))
+
+
+if markdown_lib is not None:
+    class _EscapeHtml(Extension):
+        """与前端 Markdown 默认的 html: false 一致：原始 html 作为文本转义输出，去掉不安全协议的链接"""
+
+        def extendMarkdown(self, md):
+            md.preprocessors.deregister('html_block', strict=False)
+            md.inlinePatterns.deregister('html', strict=False)
+            md.treeprocessors.register(_SafeLinks(md), 'amis_safe_links', 0)
+
+    class _SafeLinks(Treeprocessor):
+        def run(self, root):
+            for element in root.iter():
+                for attr in ('href', 'src'):
+                    value = element.get(attr)
+                    if value is not None and not _safe_url(value, element.tag == 'img'):
+                        del element.attrib[attr]
+
+
+def render_markdown(text: str, allow_html: bool = False) -> str:
+    """
+    渲染 markdown 文本，需要安装 markdown。
+    默认与前端 Markdown 组件一致，不解析原始 html（转义为文本）、不允许 javascript: 等协议的链接；
+    allow_html 为 True 时原样保留 html，只能用于可信的内容。
+    """
+    if markdown_lib is None:
+        raise RuntimeError('markdown is required to pre-render Markdown nodes')
+    if allow_html:
+        body = markdown_lib.markdown(text, extensions=['extra', 'sane_lists'])
+    else:
+        body = markdown_lib.markdown(text, extensions=[*SAFE_EXTENSIONS, _EscapeHtml()])
+    return f'<div class="markdown-body">{body}</div>'
+
+
+def render_code(code: str, language: str = 'plaintext', theme: str = 'vs', tab_size: int = 4,
+                word_wrap: bool = True) -> Optional[str]:
+    """用 pygments 高亮代码，样式内联在 html 中；不支持的语言返回 None，需要安装 pygments"""
+    if highlight is None:
+        raise RuntimeError('pygments is required to pre-render Code nodes')
+    try:
+        lexer = get_lexer_by_name(LANGUAGE_ALIASES.get(language, language or 'text'), tabsize=tab_size)
+    except ClassNotFound:
+        return None
+    formatter = HtmlFormatter(noclasses=True, style=EDITOR_THEMES.get(theme, 'vs'), nowrap=True)
+    wrap = 'pre-wrap' if word_wrap else 'pre'
+    background = html.escape(formatter.style.background_color or 'transparent', quote=True)
+    return (f'<pre class="amis-prerender-code" style="white-space:{wrap};margin:0;padding:8px;'
+            f'background:{background}"><code>{highlight(code, lexer, formatter)}</code></pre>')
+
+
+def _static_value(node: Any) -> Optional[str]:
+    value = node.value
+    if value is None or getattr(node, 'src', None):
+        return None
+    value = str(value)
+    # 值中引用了数据域时需要前端渲染
+    return None if '${' in value else value
+
+
+def _to_html(node: Any, content: str) -> Html:
+    carried = {f: getattr(node, f, None) for f in _CARRIED_FIELDS}
+    return Html(html=content, **{k: v for k, v in carried.items() if v is not None})
+
+
+def prerender(root: Any, cache: RenderCache = None, markdown: bool = True, code: bool = True,
+              allow_html: bool = False) -> int:
+    """
+    将组件树中值固定的 Markdown、Code 组件替换为预先渲染好的 Html 组件，返回替换的组件数。
+    Markdown 中的原始 html 默认转义输出，allow_html 见 render_markdown；
+    Markdown 需要安装 markdown，Code 需要安装 pygments，未安装时对应的组件保持不变；
+    值中含有数据映射（${}）、Markdown 使用 src 加载、Code 语言不受支持时也保持不变。
+    """
+    cache = default_cache if cache is None else cache
+    markdown = markdown and markdown_lib is not None
+    code = code and highlight is not None
+
+    def replace(node):
+        if markdown and isinstance(node, Markdown):
+            value = _static_value(node)
+            if value is None:
+                return node
+            key = cache.key('markdown-html' if allow_html else 'markdown', value)
+            content = cache.get(key)
+            if content is None:
+                content = render_markdown(value, allow_html)
+                cache.set(key, content)
+            return _to_html(node, content)
+        if code and isinstance(node, Code):
+            value = _static_value(node)
+            if value is None:
+                return node
+            wrap = node.wordWrap not in (False, 'off', 'false')
+            options = (node.language, node.editorTheme, node.tabSize, wrap)
+            key = cache.key('code', *options, value)
+            content = cache.get(key)
+            if content is None:
+                content = render_code(value, *options)
+                if content is None:
+                    return node
+                cache.set(key, content)
+            return _to_html(node, content)
+        return node
+
+    return transform(root, replace)
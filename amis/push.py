@@ -0,0 +1,237 @@
+"""基于 asyncio 的数据推送中心，作为 Service.ws 的服务端，用推送代替组件的 interval 轮询"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from urllib.parse import parse_qs, quote
+
+from .components import Service
+from .hydrate import _scoped
+from .types import BaseAmisApiOut, encode_response
+from .utils import split_api, walk
+
+Fetch = Callable[[], Awaitable[Any]]
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """
+    一个连接的订阅状态。每个主题只保留最新一条未发送的消息，
+    连接发送不及时时旧消息会被新消息覆盖（合并），因此积压的内存不超过订阅的主题数。
+    """
+    __slots__ = ('topics', 'pending', 'event', 'coalesced')
+
+    def __init__(self, topics: Set[str]):
+        self.topics = topics
+        self.pending: Dict[str, str] = {}
+        """主题 -> 未发送的最新消息"""
+        self.event = asyncio.Event()
+        self.coalesced = 0
+        """被合并掉的消息数"""
+
+    def offer(self, topic: str, message: str):
+        if topic in self.pending:
+            self.coalesced += 1
+        self.pending[topic] = message
+        self.event.set()
+
+    async def next(self):
+        """等待并取出待发送的消息"""
+        await self.event.wait()
+        self.event.clear()
+        messages = list(self.pending.values())
+        self.pending.clear()
+        return messages
+
+
+class _Source:
+    __slots__ = ('fetch', 'interval', 'task')
+
+    def __init__(self, fetch: Fetch, interval: float):
+        self.fetch = fetch
+        self.interval = interval
+        self.task: Optional[asyncio.Task] = None
+
+
+class PushHub:
+    """
+    数据推送中心，同时是一个 ASGI 应用：
+    - websocket 请求：配合 Service(ws=...) 使用
+    - http 请求：以 SSE（text/event-stream）推送，供自定义组件或其他客户端使用
+    订阅的主题通过查询参数 topic 指定，可以有多个。
+    发布时消息只编码一次，再分发给所有订阅者；新订阅者会立即收到主题的最新消息，
+    主题的最新消息只在有订阅者期间保留，没有订阅者时发布的消息直接丢弃。
+    通过 source 注册的数据源只在主题有订阅者时才在服务端轮询，且数据未变化时不推送，
+    这样 N 个页面的轮询请求变为每个主题一次服务端查询。
+    """
+
+    def __init__(self, send_timeout: float = 10, heartbeat: float = 30):
+        self.send_timeout = send_timeout
+        """单次发送的超时秒数，超时的连接视为过慢的客户端并断开"""
+        self.heartbeat = heartbeat
+        """SSE 连接空闲时发送注释行保活的间隔秒数"""
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._latest: Dict[str, str] = {}
+        self._sources: Dict[str, _Source] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self._subscribers.get(topic, ()))
+
+    def publish(self, topic: str, data: Any) -> int:
+        """发布数据，返回收到消息的订阅者数；需在事件循环所在线程调用"""
+        subscribers = self._subscribers.get(topic)
+        if not subscribers:
+            return 0
+        message = encode_response(data)
+        if self._latest.get(topic) == message:
+            return 0
+        self._latest[topic] = message
+        for subscriber in subscribers:
+            subscriber.offer(topic, message)
+        return len(subscribers)
+
+    def publish_threadsafe(self, topic: str, data: Any):
+        """在其他线程中发布数据"""
+        # 还没有连接过的推送中心没有订阅者，无需发布
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.publish, topic, data)
+
+    def source(self, topic: str, fetch: Fetch, interval: float = 3):
+        """注册主题的数据源，fetch 为返回最新数据的协程函数，有订阅者时每 interval 秒调用一次"""
+        self._sources[topic] = _Source(fetch, interval)
+
+    async def _poll(self, topic: str, source: _Source):
+        while True:
+            try:
+                self.publish(topic, await source.fetch())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 异常信息可能包含 SQL、路径等内部细节，只记录日志，推送通用的错误消息
+                logger.exception('push source %r failed', topic)
+                self.publish(topic, BaseAmisApiOut(status=500, msg='data source error'))
+            await asyncio.sleep(source.interval)
+
+    def subscribe(self, topics: Set[str]) -> Subscriber:
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(topics)
+        for topic in topics:
+            self._subscribers.setdefault(topic, set()).add(subscriber)
+            if topic in self._latest:
+                subscriber.offer(topic, self._latest[topic])
+            source = self._sources.get(topic)
+            if source is not None and source.task is None:
+                source.task = asyncio.ensure_future(self._poll(topic, source))
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        for topic in subscriber.topics:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscriber)
+            if subscribers:
+                continue
+            del self._subscribers[topic]
+            # 无人订阅期间数据不再更新，丢弃缓存避免下次订阅时先收到过期数据，也避免主题只增不减
+            self._latest.pop(topic, None)
+            source = self._sources.get(topic)
+            if source is not None and source.task is not None:
+                source.task.cancel()
+                source.task = None
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable):
+        topics = set(parse_qs(scope.get('query_string', b'').decode('latin-1')).get('topic', []))
+        if scope['type'] == 'websocket':
+            await self._serve_websocket(topics, receive, send)
+        elif scope['type'] == 'http':
+            await self._serve_sse(topics, receive, send)
+
+    async def _pump(self, subscriber: Subscriber, receive: Callable, write: Callable, disconnect: str,
+                    idle: Callable = None) -> bool:
+        """发送循环，直到客户端断开或发送超时，客户端断开时返回 True"""
+
+        async def wait_disconnect():
+            while (await receive())['type'] != disconnect:
+                pass
+
+        closed = asyncio.ensure_future(wait_disconnect())
+        try:
+            while True:
+                getter = asyncio.ensure_future(subscriber.next())
+                done, _ = await asyncio.wait({getter, closed}, timeout=self.heartbeat if idle else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if closed in done:
+                    getter.cancel()
+                    return True
+                if getter not in done:
+                    getter.cancel()
+                    await asyncio.wait_for(idle(), self.send_timeout)
+                    continue
+                for message in getter.result():
+                    await asyncio.wait_for(write(message), self.send_timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            closed.cancel()
+            self.unsubscribe(subscriber)
+
+    async def _serve_websocket(self, topics: Set[str], receive: Callable, send: Callable):
+        if (await receive())['type'] != 'websocket.connect':
+            return
+        if not topics:
+            await send({'type': 'websocket.close', 'code': 1008})
+            return
+        await send({'type': 'websocket.accept'})
+        subscriber = self.subscribe(topics)
+        if not await self._pump(subscriber, receive, lambda m: send({'type': 'websocket.send', 'text': m}),
+                                'websocket.disconnect'):
+            await send({'type': 'websocket.close', 'code': 1008})
+
+    async def _serve_sse(self, topics: Set[str], receive: Callable, send: Callable):
+        if not topics:
+            await send({'type': 'http.response.start', 'status': 400, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'topic is required'})
+            return
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+
+        def body(chunk: bytes):
+            return send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+        subscriber = self.subscribe(topics)
+        if not await self._pump(subscriber, receive, lambda m: body(b'data: ' + m.encode('utf-8') + b'\n\n'),
+                                'http.disconnect', idle=lambda: body(b':\n\n')):
+            await send({'type': 'http.response.body', 'body': b''})
+
+
+def polling_to_push(root: Any, url: str, topic: Callable[[Service], Optional[str]] = None) -> Dict[str, Any]:
+    """
+    将组件树中使用 interval 轮询的 Service 改写为通过 ws 接收推送：
+    去掉 interval 等轮询配置，ws 设为 {url}?topic={主题}，api 保留用于首次加载。
+    topic 用于确定 Service 的主题，返回 None 时跳过；默认使用 Service 的 name，没有时使用 api 地址，
+    api 的地址或参数引用了变量（$）时各实例的数据不同、不能共用主题，不传 topic 时跳过。
+    返回 {主题: 原 api}，可据此为 PushHub 注册数据源。
+    """
+    sep = '&' if '?' in url else '?'
+    topics = {}
+    for node in walk(root):
+        if not isinstance(node, Service) or not node.interval or node.ws:
+            continue
+        api = node.api
+        if topic is None and _scoped(api, split_api(api)[1]):
+            continue
+        name = topic(node) if topic is not None else (node.name or split_api(api)[1])
+        if not name:
+            continue
+        node.ws = f'{url}{sep}topic={quote(name, safe="")}'
+        node.interval = None
+        node.silentPolling = None
+        node.stopAutoRefreshWhen = None
+        topics[name] = api
+    return topics
+
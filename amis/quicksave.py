@@ -0,0 +1,239 @@
+"""CRUD 批量保存与拖拽排序的服务端处理：按修改的字段分组批量写入，排序使用分数索引只改写被移动的行"""
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+from urllib.parse import urlsplit
+
+from .cache import ResponseCache
+from .crud import CRUDQueryEngine, _get
+from .types import BaseAmisApiOut
+from .utils import split_api
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+"""分数索引使用的数字，按 ASCII 顺序排列，字符串键的字典序即为数值顺序"""
+ACTIONS = ('quickSave', 'quickSaveItem', 'saveOrder')
+"""handle 支持的操作"""
+
+Key = Union[str, int, float]
+
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    # a、b 为 (0, 1) 之间小数的各位数字，均不以 0 结尾，a 为空表示 0，b 为 None 表示 1
+    if b is not None:
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else '0') == b[n]:
+            n += 1
+        if n:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    da = DIGITS.index(a[0]) if a else 0
+    db = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if db - da > 1:
+        return DIGITS[(da + db) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[da] + _midpoint(a[1:], None)
+
+
+def _check_key(key: Optional[str]):
+    if key is not None and (not key or key[-1] == '0' or any(c not in DIGITS for c in key)):
+        raise ValueError(f'invalid order key {key!r}')
+
+
+def key_between(a: Optional[Key], b: Optional[Key]) -> Key:
+    """
+    a 与 b 之间的排序键，None 表示没有边界：
+    - 字符串键为 62 进制小数的各位数字，总能在两个键之间插入新键，长度按插入次数的对数增长
+    - 任一边界为数字时按数值取中点，兼容已有的整数排序字段，但反复在同一位置插入会耗尽浮点精度
+    """
+    if isinstance(a, (int, float)) or isinstance(b, (int, float)):
+        return keys_between(a, b, 1)[0]
+    _check_key(a)
+    _check_key(b)
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f'order key {a!r} is not less than {b!r}')
+    return _midpoint(a or '', b)
+
+
+def keys_between(a: Optional[Key], b: Optional[Key], n: int) -> List[Key]:
+    """a 与 b 之间 n 个递增的排序键，字符串键用二分生成，使新键尽量短"""
+    if n <= 0:
+        return []
+    if isinstance(a, (int, float)) or isinstance(b, (int, float)):
+        lo = b - n - 1 if a is None else a
+        hi = a + n + 1 if b is None else b
+        if lo >= hi:
+            raise ValueError(f'order key {a!r} is not less than {b!r}')
+        step = (hi - lo) / (n + 1)
+        return [lo + step * (i + 1) for i in range(n)]
+    mid = key_between(a, b)
+    left = (n - 1) // 2
+    return keys_between(a, mid, left) + [mid] + keys_between(mid, b, n - 1 - left)
+
+
+def editable_fields(crud: Any) -> Set[str]:
+    """CRUD 中可以快速编辑的字段：配置了 quickEdit 的列名及 quickEdit 表单项的 name"""
+    fields = set()
+    for column in _get(crud, 'columns', None) or []:
+        quick_edit = _get(column, 'quickEdit')
+        if not quick_edit:
+            continue
+        name = _get(column, 'name')
+        if name:
+            fields.add(name)
+        if not isinstance(quick_edit, bool) and _get(quick_edit, 'name'):
+            fields.add(_get(quick_edit, 'name'))
+    return fields
+
+
+class QuickSaveHandler:
+    """
+    处理 CRUD 的 quickSaveApi、quickSaveItemApi 与 saveOrderApi，与框架无关，传入请求体即可：
+    - 快速编辑的修改按字段组合分组，每组一次 executemany，全部在同一事务中写入
+    - 只写入 fields 中的字段（默认为配置了 quickEdit 的列），主键与排序字段不会被快速编辑修改
+    - 拖拽排序按 insertAfter/insertBefore 计算被移动行的新排序键，只写入被移动的行；
+      排序字段需按升序展示，值为字符串分数索引（初始值可由 keys_between(None, None, 行数) 生成）或数字
+    - 写入后失效后端缓存及 ResponseCache 中该 CRUD 接口的缓存
+    """
+
+    def __init__(self, engine: CRUDQueryEngine, fields: Iterable[str] = None, cache: ResponseCache = None,
+                 cache_path: str = None):
+        self.engine = engine
+        self.primary_field = engine.primary_field
+        self.order_field = engine.crud.orderField
+        self.fields: Set[str] = set(editable_fields(engine.crud) if fields is None else fields)
+        """允许快速编辑的字段"""
+        self.fields -= {self.primary_field, self.order_field}
+        self.cache = cache
+        self.cache_path = cache_path
+        """失效缓存的地址前缀，默认为 CRUD api 的路径"""
+        if cache_path is None and engine.crud.api is not None:
+            self.cache_path = urlsplit(split_api(engine.crud.api)[1]).path or None
+
+    def invalidate(self):
+        """数据写入后调用，失效后端缓存及响应缓存"""
+        self.engine.invalidate()
+        if self.cache is not None:
+            self.cache.invalidate(self.cache_path)
+
+    def _diff(self, row: Mapping[str, Any]) -> Tuple[Tuple[str, ...], tuple]:
+        fields = tuple(sorted(k for k in row if k in self.fields))
+        return fields, tuple(row[k] for k in fields) + (row[self.primary_field],)
+
+    def write(self, rows: Iterable[Mapping[str, Any]]) -> int:
+        """写入多行修改，每行需包含主键，其他不可编辑的字段被忽略，返回更新的行数"""
+        batches: Dict[Tuple[str, ...], List[tuple]] = {}
+        for row in rows:
+            if not isinstance(row, Mapping) or row.get(self.primary_field) in (None, ''):
+                raise ValueError(f'row without {self.primary_field!r}')
+            fields, values = self._diff(row)
+            if fields:
+                batches.setdefault(fields, []).append(values)
+        if not batches:
+            return 0
+        count = self.engine.backend.update_many(self.primary_field, batches)
+        self.invalidate()
+        return count
+
+    def quick_save(self, data: Mapping[str, Any]) -> BaseAmisApiOut:
+        """
+        quickSaveApi 的请求体：rowsDiff 为每行修改过的字段（含主键），没有时使用 rows；
+        indexes、unModifiedItems 等其他字段不需要处理
+        """
+        rows = data.get('rowsDiff')
+        if rows is None:
+            rows = data.get('rows')
+        if not isinstance(rows, list):
+            return BaseAmisApiOut(status=422, msg='rowsDiff or rows is required')
+        try:
+            count = self.write(rows)
+        except ValueError as e:
+            return BaseAmisApiOut(status=422, msg=str(e))
+        return BaseAmisApiOut(data={'updated': count})
+
+    def quick_save_item(self, data: Mapping[str, Any]) -> BaseAmisApiOut:
+        """quickSaveItemApi 的请求体为修改后的整行数据，带有 diff 时只写入 diff 中的字段"""
+        row = data
+        if isinstance(data.get('diff'), Mapping):
+            row = {**data['diff'], self.primary_field: data.get(self.primary_field)}
+        try:
+            count = self.write([row])
+        except ValueError as e:
+            return BaseAmisApiOut(status=422, msg=str(e))
+        return BaseAmisApiOut(data={'updated': count})
+
+    def _moves(self, data: Mapping[str, Any]) -> List[Tuple[str, List[Any], bool]]:
+        # [(锚点行主键, 被移动行的主键, 是否在锚点之后)]
+        moves = []
+        for field, after in (('insertBefore', False), ('insertAfter', True)):
+            groups = data.get(field) or {}
+            if not isinstance(groups, Mapping) or not all(isinstance(ids, list) for ids in groups.values()):
+                raise ValueError(f'invalid {field}')
+            moves.extend((str(anchor), ids, after) for anchor, ids in groups.items())
+        return moves
+
+    def reorder(self, data: Mapping[str, Any]) -> int:
+        """
+        按 saveOrderApi 的请求体计算并写入新的排序键，返回更新的行数。
+        锚点行的排序键从后端按主键读取：amis 发送前会把 rows 中的 orderField 改写为行在页面中的位置，
+        不能作为存储的排序键使用。另一侧的边界为后端中与锚点相邻、且没有被移动的行，
+        因此只需查询每个锚点的一个相邻值，写入被移动的行。
+        """
+        if not self.order_field:
+            raise ValueError('orderField is not configured')
+        moves = self._moves(data)
+        backend = self.engine.backend
+        keys = backend.get(self.primary_field, list({anchor for anchor, _, _ in moves}), self.order_field)
+        moved = [i for _, ids, _ in moves for i in ids]
+        updates = []
+        for anchor, ids, after in moves:
+            key = keys.get(anchor)
+            if key is None:
+                raise ValueError(f'row {anchor} has no {self.order_field!r}')
+            neighbor = backend.neighbor(self.order_field, key, after, self.primary_field, moved)
+            bounds = (key, neighbor) if after else (neighbor, key)
+            if isinstance(key, str) and neighbor is not None and not isinstance(neighbor, str):
+                raise ValueError(f'{self.order_field!r} mixes string and numeric keys')
+            updates.extend((k, i) for k, i in zip(keys_between(*bounds, len(ids)), ids))
+        if not updates:
+            return 0
+        count = backend.update_many(self.primary_field, {(self.order_field,): updates})
+        self.invalidate()
+        return count
+
+    def save_order(self, data: Mapping[str, Any]) -> BaseAmisApiOut:
+        """saveOrderApi 的请求体：insertAfter/insertBefore 为 锚点行主键 -> 被移动行的主键列表"""
+        try:
+            count = self.reorder(data)
+        except ValueError as e:
+            return BaseAmisApiOut(status=422, msg=str(e))
+        except TypeError:
+            # 存储的排序键类型不一致（如数字与字符串混用）时无法比较
+            return BaseAmisApiOut(status=422, msg=f'{self.order_field!r} has keys of mixed types')
+        return BaseAmisApiOut(data={'updated': count})
+
+    def handle(self, params: Mapping[str, Any], data: Mapping[str, Any]) -> BaseAmisApiOut:
+        """按查询参数 action 分发请求，configure 设置的接口地址都带有该参数"""
+        action = params.get('action')
+        if action not in ACTIONS:
+            return BaseAmisApiOut(status=404, msg=f'unknown action {action!r}')
+        if not isinstance(data, Mapping):
+            return BaseAmisApiOut(status=422, msg='request body must be an object')
+        if action == 'quickSave':
+            return self.quick_save(data)
+        if action == 'quickSaveItem':
+            return self.quick_save_item(data)
+        return self.save_order(data)
+
+    def configure(self, url: str, item: bool = False) -> Any:
+        """
+        设置 CRUD 的 quickSaveApi（item 为 True 时设置 quickSaveItemApi，修改后立即保存单行），
+        配置了 orderField 时同时设置 saveOrderApi 并开启拖拽；接口地址需路由到 handle(查询参数, 请求体)
+        """
+        crud = self.engine.crud
+        sep = '&' if '?' in url else '?'
+        if item:
+            crud.quickSaveItemApi = f'post:{url}{sep}action=quickSaveItem'
+        else:
+            crud.quickSaveApi = f'post:{url}{sep}action=quickSave'
+        if self.order_field:
+            crud.saveOrderApi = f'post:{url}{sep}action=saveOrder'
+            crud.draggable = True
+        return crud
@@ -0,0 +1,354 @@
+"""由 pydantic 模型、dataclass、SQLAlchemy 模型生成 Form/CRUD，生成结果按 (模型, 选项) 缓存，只在首次使用时反射"""
+import dataclasses
+import datetime
+import decimal
+import enum
+import typing
+from typing import Any, Callable, Dict, List, Literal, Optional, Sequence, Tuple
+from weakref import WeakKeyDictionary
+
+from .components import (
+    CRUD, ColumnDate, ColumnMapping, Form, FormItem, InputDate, InputDatetime, InputNumber, InputPassword, InputText,
+    InputTime, Select, Switch, TableColumn, Validation,
+)
+from .types import AmisNode, BaseAmisModel, dumps
+
+CONSTRAINTS = ('minimum', 'maximum', 'minLength', 'maxLength', 'matchRegexp', 'isEmail', 'isUrl')
+"""从模型字段约束映射到 Validation 的校验规则"""
+DATE_FORMATS = {
+    datetime.datetime: ('YYYY-MM-DDTHH:mm:ss', 'YYYY-MM-DD HH:mm:ss'),
+    datetime.date: ('YYYY-MM-DD', 'YYYY-MM-DD'),
+    datetime.time: ('HH:mm:ss', 'HH:mm:ss'),
+}
+"""日期时间类型的 (值格式, 显示格式)，值格式与模型解析 ISO 8601 字符串的格式一致"""
+
+
+class ModelField(BaseAmisModel):
+    """从模型中反射出的字段"""
+    name: str
+    """字段名"""
+    label: str = None
+    """标签，取自字段的 title/label，没有时为字段名"""
+    description: str = None
+    """描述"""
+    annotation: Any = None
+    """字段类型，已去掉 Optional"""
+    required: bool = False
+    """是否必填"""
+    default: Any = None
+    """默认值"""
+    primary: bool = False
+    """是否为主键"""
+    secret: bool = False
+    """是否为密码等敏感字段"""
+    constraints: Dict[str, Any] = {}
+    """校验规则，键为 CONSTRAINTS 中的规则名"""
+
+
+def _unwrap_optional(annotation: Any) -> Tuple[Any, bool]:
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(args) < len(typing.get_args(annotation)):
+            return (args[0] if len(args) == 1 else typing.Union[tuple(args)]), True
+    return annotation, False
+
+
+def _bounds(constraints: Dict[str, Any], ge=None, gt=None, le=None, lt=None, integer: bool = False):
+    """gt/lt 为开区间，整数转换为闭区间，其余直接作为 minimum/maximum"""
+    if ge is not None:
+        constraints['minimum'] = ge
+    elif gt is not None:
+        constraints['minimum'] = gt + 1 if integer else gt
+    if le is not None:
+        constraints['maximum'] = le
+    elif lt is not None:
+        constraints['maximum'] = lt - 1 if integer else lt
+
+
+def _regexp(pattern: Any) -> Optional[str]:
+    pattern = getattr(pattern, 'pattern', pattern)
+    return f'/{pattern}/' if pattern else None
+
+
+def _pydantic_fields(model: type) -> List[ModelField]:
+    """Field 的额外参数（v1 的 extra、v2 的 json_schema_extra）中可以提供 primary"""
+    fields = []
+    if hasattr(model, 'model_fields'):
+        # pydantic v2
+        for name, info in model.model_fields.items():
+            annotation, optional = _unwrap_optional(info.annotation)
+            constraints = {}
+            meta = {type(m).__name__: m for m in info.metadata}
+            integer = annotation is int
+            _bounds(constraints, *(getattr(meta.get(n), n.lower(), None) for n in ('Ge', 'Gt', 'Le', 'Lt')),
+                    integer=integer)
+            for key, attr in (('MinLen', 'min_length'), ('MaxLen', 'max_length')):
+                if key in meta:
+                    constraints['minLength' if key == 'MinLen' else 'maxLength'] = getattr(meta[key], attr)
+            pattern = next((getattr(m, 'pattern', None) for m in info.metadata if getattr(m, 'pattern', None)), None)
+            if pattern:
+                constraints['matchRegexp'] = _regexp(pattern)
+            default = None if info.is_required() else info.get_default(call_default_factory=True)
+            extra = info.json_schema_extra if isinstance(info.json_schema_extra, dict) else {}
+            fields.append(ModelField(name=info.alias or name, label=info.title or name, description=info.description,
+                                     annotation=annotation, required=info.is_required() and not optional,
+                                     default=default, primary=bool(extra.get('primary')), constraints=constraints))
+        return fields
+    for field in model.__fields__.values():
+        info = field.field_info
+        annotation, optional = _unwrap_optional(field.outer_type_)
+        constraints = {}
+        # conint/constr 等受约束类型的约束保存在类型上
+        sources = [info, field.type_]
+
+        def get(attr):
+            return next((getattr(s, attr) for s in sources if getattr(s, attr, None) is not None), None)
+
+        integer = isinstance(field.type_, type) and issubclass(field.type_, int) and not issubclass(field.type_, bool)
+        _bounds(constraints, get('ge'), get('gt'), get('le'), get('lt'), integer=integer)
+        for key, attr in (('minLength', 'min_length'), ('maxLength', 'max_length')):
+            if get(attr) is not None:
+                constraints[key] = get(attr)
+        if get('regex') is not None:
+            constraints['matchRegexp'] = _regexp(get('regex'))
+        type_name = getattr(field.type_, '__name__', '')
+        if type_name == 'EmailStr' or type_name == 'NameEmail':
+            constraints['isEmail'] = True
+        elif 'Url' in type_name:
+            constraints['isUrl'] = True
+        fields.append(ModelField(name=field.alias, label=info.title or field.name, description=info.description,
+                                 annotation=annotation, required=field.required and not optional,
+                                 default=None if field.required else field.get_default(), constraints=constraints,
+                                 primary=bool(info.extra.get('primary')),
+                                 secret=type_name in ('SecretStr', 'SecretBytes')))
+    return fields
+
+
+def _dataclass_fields(model: type) -> List[ModelField]:
+    """dataclass 字段的 metadata 中可以提供 label、description、primary 及 CONSTRAINTS 中的校验规则"""
+    hints = typing.get_type_hints(model)
+    fields = []
+    for field in dataclasses.fields(model):
+        annotation, optional = _unwrap_optional(hints.get(field.name, field.type))
+        has_default = field.default is not dataclasses.MISSING or field.default_factory is not dataclasses.MISSING
+        default = None
+        if field.default is not dataclasses.MISSING:
+            default = field.default
+        elif field.default_factory is not dataclasses.MISSING:
+            default = field.default_factory()
+        meta = field.metadata
+        fields.append(ModelField(name=field.name, label=meta.get('label', field.name),
+                                 description=meta.get('description'), annotation=annotation,
+                                 required=not has_default and not optional, default=default,
+                                 primary=bool(meta.get('primary')), secret=bool(meta.get('secret')),
+                                 constraints={k: meta[k] for k in CONSTRAINTS if k in meta}))
+    return fields
+
+
+def _sqlalchemy_fields(model: type) -> List[ModelField]:
+    """SQLAlchemy 列的 info 中可以提供 label、secret 及 CONSTRAINTS 中的校验规则，comment 作为描述"""
+    fields = []
+    for column in model.__table__.columns:
+        try:
+            annotation = column.type.python_type
+        except NotImplementedError:
+            annotation = str
+        enum_class = getattr(column.type, 'enum_class', None)
+        if enum_class is not None:
+            annotation = enum_class
+        elif getattr(column.type, 'enums', None):
+            annotation = Literal[tuple(column.type.enums)]
+        constraints = {k: column.info[k] for k in CONSTRAINTS if k in column.info}
+        length = getattr(column.type, 'length', None)
+        if isinstance(length, int) and annotation is str:
+            constraints.setdefault('maxLength', length)
+        default = getattr(column.default, 'arg', None)
+        if callable(default):
+            default = None
+        has_default = column.default is not None or column.server_default is not None
+        fields.append(ModelField(name=column.key, label=column.info.get('label', column.key),
+                                 description=column.comment, annotation=annotation,
+                                 required=not column.nullable and not has_default and not column.primary_key,
+                                 default=default, primary=column.primary_key, secret=bool(column.info.get('secret')),
+                                 constraints=constraints))
+    return fields
+
+
+def model_fields(model: type) -> List[ModelField]:
+    """反射模型的字段，支持 pydantic 模型（v1/v2）、dataclass 与 SQLAlchemy 声明式模型"""
+    if dataclasses.is_dataclass(model):
+        return _dataclass_fields(model)
+    if hasattr(model, '__fields__') or hasattr(model, 'model_fields'):
+        return _pydantic_fields(model)
+    if hasattr(model, '__table__'):
+        return _sqlalchemy_fields(model)
+    raise TypeError(f'{model!r} is not a pydantic model, dataclass or SQLAlchemy model')
+
+
+def _choices(annotation: Any) -> Optional[List[dict]]:
+    """Enum、Literal 的选项"""
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return [{'label': str(m.name), 'value': m.value} for m in annotation]
+    if typing.get_origin(annotation) is Literal:
+        return [{'label': str(v), 'value': v} for v in typing.get_args(annotation)]
+    return None
+
+
+def _item_type(annotation: Any) -> Tuple[Any, bool]:
+    """(元素类型, 是否为列表)"""
+    if typing.get_origin(annotation) in (list, set, tuple, frozenset, List, typing.Set):
+        args = typing.get_args(annotation)
+        return (args[0] if args else str), True
+    return annotation, False
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+def _base_type(annotation: Any) -> Any:
+    """受约束的类型（如 conint、EmailStr）归为其基础类型"""
+    if not isinstance(annotation, type) or issubclass(annotation, enum.Enum):
+        return annotation
+    for base in (bool, int, float, decimal.Decimal, datetime.datetime, datetime.date, datetime.time, str):
+        if issubclass(annotation, base):
+            return base
+    return annotation
+
+
+def form_item(field: ModelField) -> FormItem:
+    """按字段类型生成表单项，约束转换为 validations，InputNumber 同时设置 min/max"""
+    annotation, many = _item_type(field.annotation)
+    annotation = _base_type(annotation)
+    common = {'name': field.name, 'label': field.label, 'description': field.description}
+    choices = _choices(annotation)
+    if choices is not None:
+        item = Select(options=choices, **common)
+        if many:
+            item.update_from_kwargs(multiple=True, extractValue=True, joinValues=False)
+    elif many:
+        item = Select(multiple=True, creatable=True, extractValue=True, joinValues=False, **common)
+    elif annotation is bool:
+        item = Switch(**common)
+    elif annotation in (int, float, decimal.Decimal):
+        item = InputNumber(precision=0 if annotation is int else None, **common)
+        item.min = field.constraints.get('minimum')
+        item.max = field.constraints.get('maximum')
+    elif annotation in DATE_FORMATS:
+        value_format, display_format = DATE_FORMATS[annotation]
+        cls = {datetime.datetime: InputDatetime, datetime.date: InputDate, datetime.time: InputTime}[annotation]
+        item = cls(format=value_format, inputFormat=display_format, **common)
+    elif field.secret:
+        item = InputPassword(**common)
+    else:
+        item = InputText(**common)
+    if field.required:
+        item.required = True
+    constraints = {k: v for k, v in field.constraints.items() if v is not None}
+    if constraints:
+        item.validations = Validation(**constraints)
+    if field.default is not None:
+        # 直接赋值，避免 value 字段的类型校验改变默认值的类型
+        default = field.default
+        item.value = [_plain(v) for v in default] if isinstance(default, (list, set, tuple)) else _plain(default)
+    return item
+
+
+def table_column(field: ModelField) -> TableColumn:
+    """按字段类型生成表格列"""
+    annotation, many = _item_type(field.annotation)
+    annotation = _base_type(annotation)
+    common = {'name': field.name, 'label': field.label, 'sortable': not many}
+    choices = _choices(annotation)
+    if choices is not None:
+        return ColumnMapping(map={str(c['value']): c['label'] for c in choices}, **common)
+    if annotation is bool:
+        return TableColumn(type='status', **common)
+    if annotation in (int, float, decimal.Decimal):
+        return TableColumn(align='right', **common)
+    if annotation in DATE_FORMATS:
+        value_format, display_format = DATE_FORMATS[annotation]
+        return ColumnDate(valueFormat=value_format, format=display_format, **common)
+    return TableColumn(searchable=annotation is str and not field.secret, **common)
+
+
+def _select(fields: List[ModelField], include: Sequence[str], exclude: Sequence[str]) -> List[ModelField]:
+    if include is not None:
+        by_name = {f.name: f for f in fields}
+        fields = [by_name[name] for name in include if name in by_name]
+    return [f for f in fields if f.name not in exclude]
+
+
+def _fingerprint(model: type) -> tuple:
+    """模型字段定义的指纹，字段被增删、替换（如 update_forward_refs、动态添加列）后随之变化"""
+    if dataclasses.is_dataclass(model):
+        fields = model.__dataclass_fields__
+    elif hasattr(model, 'model_fields'):
+        fields = model.model_fields
+    elif hasattr(model, '__fields__'):
+        fields = model.__fields__
+    else:
+        table = model.__table__
+        return id(table), tuple((c.key, id(c), id(c.type)) for c in table.columns)
+    return id(fields), tuple((k, id(v), id(getattr(v, 'type_', None))) for k, v in fields.items())
+
+
+_cache: 'WeakKeyDictionary[type, Dict[str, Tuple[tuple, AmisNode]]]' = WeakKeyDictionary()
+
+
+def _memoized(kind: str, model: type, options: Dict[str, Any], build: Callable[[], AmisNode]) -> AmisNode:
+    key = dumps([kind, options], repr, sort_keys=True)
+    fingerprint = _fingerprint(model)
+    entries = _cache.setdefault(model, {})
+    entry = entries.get(key)
+    if entry is None or entry[0] != fingerprint:
+        entry = entries[key] = (fingerprint, build())
+    # 返回副本，调用方修改生成的组件不影响缓存
+    return entry[1].copy(deep=True)
+
+
+def clear_cache(model: type = None):
+    """清除生成结果的缓存，model 为 None 时清除全部"""
+    if model is None:
+        _cache.clear()
+    else:
+        _cache.pop(model, None)
+
+
+def form_from_model(model: type, api: Any = None, include: Sequence[str] = None, exclude: Sequence[str] = (),
+                    primary: bool = False, **kwargs) -> Form:
+    """
+    由模型生成 Form，字段类型对应的表单项见 form_item。
+    include 指定字段及顺序，exclude 排除字段，primary 为 False 时不包含主键字段；其余参数传给 Form。
+    结果按 (模型, 参数) 缓存，模型的字段定义变化或重新定义模型类后重新生成。
+    """
+    options = {'api': api, 'include': include, 'exclude': list(exclude), 'primary': primary, 'kwargs': kwargs}
+
+    def build():
+        fields = [f for f in _select(model_fields(model), include, exclude) if primary or not f.primary]
+        return Form(api=api, body=[form_item(f) for f in fields], **kwargs)
+
+    return _memoized('form', model, options, build)
+
+
+def crud_from_model(model: type, api: Any, include: Sequence[str] = None, exclude: Sequence[str] = (),
+                    **kwargs) -> CRUD:
+    """
+    由模型生成 CRUD，字段类型对应的列见 table_column，主键字段作为 primaryField，不包含密码等敏感字段。
+    参数与缓存规则同 form_from_model，其余参数传给 CRUD。
+    """
+    options = {'api': api, 'include': include, 'exclude': list(exclude), 'kwargs': kwargs}
+
+    def build():
+        fields = model_fields(model)
+        primary = next((f.name for f in fields if f.primary), None)
+        columns = [table_column(f) for f in _select(fields, include, exclude) if not f.secret]
+        return CRUD(api=api, columns=columns, **{'primaryField': primary or 'id', **kwargs})
+
+    return _memoized('crud', model, options, build)
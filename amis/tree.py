@@ -0,0 +1,137 @@
+"""超大树的懒加载：由扁平的父子关系表一次性建立索引，只内联前几层节点，其余节点通过 deferApi 按需加载"""
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from .components import InputTree, Nav
+from .options import OptionIndex
+from .types import BaseAmisApiOut
+
+
+class TreeSource:
+    """
+    树形数据源，rows 为扁平的父子关系表，每行是字典或 (id, 父id, 标签, ...) 元组：
+    - 父id 为空或不存在于表中的行为顶层节点，同一父节点下的子节点保持表中的顺序
+    - tree 按层数内联节点，被截断的节点标记 defer，由 handle 在 O(子节点数) 内返回其子节点
+    - 检索复用 OptionIndex，结果带上命中节点的祖先路径
+    extra 为需要一并输出的其他列，如 Nav 的 to、icon。
+    """
+
+    def __init__(self, rows: Iterable[Any], id_field: str = 'id', parent_field: str = 'parent_id',
+                 label_field: str = 'label', value_field: str = 'value', extra: Sequence[str] = (),
+                 depth: int = 1, max_matches: int = 200):
+        self.label_field = label_field
+        self.value_field = value_field
+        self.depth = depth
+        """默认内联的层数"""
+        self.max_matches = max_matches
+        """检索时最多返回的命中节点数"""
+        items, parents = [], []
+        for row in rows:
+            if isinstance(row, Mapping):
+                item = {label_field: row.get(label_field), value_field: row.get(id_field)}
+                item.update((f, row[f]) for f in extra if row.get(f) is not None)
+                parents.append(row.get(parent_field))
+            else:
+                item = {label_field: row[2], value_field: row[0]}
+                item.update((f, v) for f, v in zip(extra, row[3:]) if v is not None)
+                parents.append(row[1])
+            items.append(item)
+        self._index = OptionIndex(items, label_field, value_field)
+        self.items: List[dict] = self._index.options
+        """全部节点（不含children），有子节点的标记 defer"""
+        self._position: Dict[str, int] = {str(item[value_field]): i for i, item in enumerate(self.items)}
+        self.parents: List[int] = [self._position.get(str(p), -1) if p not in (None, '') else -1 for p in parents]
+        """节点 -> 父节点下标，顶层节点为 -1"""
+        children: Dict[int, List[int]] = {}
+        for i, p in enumerate(self.parents):
+            if p == i:
+                self.parents[i] = p = -1
+            children.setdefault(p, []).append(i)
+        self.children: Dict[int, Tuple[int, ...]] = {p: tuple(c) for p, c in children.items()}
+        """父节点下标 -> 子节点下标，-1 为顶层"""
+        for p in self.children:
+            if p != -1:
+                self.items[p]['defer'] = True
+
+    def _expand(self, indices: Sequence[int], depth: int) -> List[dict]:
+        if depth <= 1:
+            return [self.items[i] for i in indices]
+        result = []
+        for i in indices:
+            children = self.children.get(i)
+            if children:
+                item = {k: v for k, v in self.items[i].items() if k != 'defer'}
+                item['children'] = self._expand(children, depth - 1)
+                result.append(item)
+            else:
+                result.append(self.items[i])
+        return result
+
+    def tree(self, depth: int = None) -> List[dict]:
+        """内联前 depth 层节点"""
+        return self._expand(self.children.get(-1, ()), self.depth if depth is None else depth)
+
+    def children_of(self, value: Any) -> List[dict]:
+        """某个节点的直接子节点，节点不存在时返回空列表"""
+        i = self._position.get(str(value))
+        return [] if i is None else [self.items[c] for c in self.children.get(i, ())]
+
+    def search(self, term: str) -> List[dict]:
+        """检索标签，返回命中节点及其祖先组成的树，祖先节点展开且只包含通向命中节点的子节点"""
+        built: Dict[int, dict] = {}
+        roots = []
+        for i in self._index.search(term)[:self.max_matches]:
+            child, j, steps = None, i, 0
+            # 父子关系表中可能存在环，最多向上找节点总数步
+            while j != -1 and steps <= len(self.items):
+                node = built.get(j)
+                exists = node is not None
+                if not exists:
+                    node = built[j] = dict(self.items[j])
+                if child is not None:
+                    node.pop('defer', None)
+                    node['unfolded'] = True
+                    node.setdefault('children', []).append(child)
+                if exists:
+                    break
+                if self.parents[j] == -1:
+                    roots.append(node)
+                child, j, steps = node, self.parents[j], steps + 1
+        return roots
+
+    def handle(self, params: Mapping[str, Any], field: str = 'options') -> BaseAmisApiOut:
+        """
+        响应树的请求，与框架无关，传入请求的查询参数即可：
+        - parent: 父节点的值，返回其子节点（deferApi）
+        - term: 检索关键字，返回命中节点及祖先路径
+        - 都没有时返回内联的前几层
+        field 为返回数据中节点列表的字段名，InputTree/TreeSelect 为 options，Nav 为 links。
+        """
+        parent = params.get('parent')
+        term = params.get('term')
+        if parent not in (None, ''):
+            if str(parent) not in self._position:
+                return BaseAmisApiOut(status=404, msg=f'node {parent} not found')
+            nodes = self.children_of(parent)
+        elif term:
+            nodes = self.search(term)
+        else:
+            nodes = self.tree()
+        return BaseAmisApiOut(data={field: nodes})
+
+    def configure(self, node: Any, url: str, depth: int = None) -> Any:
+        """
+        设置 InputTree/TreeSelect/Nav 的内联节点与 deferApi，可检索的 InputTree 同时设置 autoComplete。
+        接口地址需路由到 handle(查询参数)，Nav 使用 handle(查询参数, 'links')。
+        """
+        if isinstance(node, Nav):
+            node.links = self.tree(depth)
+            node.deferApi = f'{url}?parent=${{value}}'
+        elif isinstance(node, InputTree):
+            node.options = self.tree(depth)
+            node.deferApi = f'{url}?parent=${{value}}'
+            if node.searchable:
+                node.autoComplete = f'{url}?term=${{term}}'
+        else:
+            raise TypeError(f'{type(node).__name__} is not a tree component')
+        return node
+
@@ -1,15 +1,318 @@
-from typing import Dict, Any, Union, List, Literal
+import re
+from array import array
+from functools import partial
+from json.encoder import encode_basestring
+from typing import Dict, Any, Union, List, Literal, Sequence, Iterator, Optional
+from uuid import uuid4
 
 try:
     import ujson as json
 except ImportError:
     import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import numpy as np
+except ImportError:
+    np = None
 from pydantic import BaseModel, Extra
 
+
+class RawJSON:
+    """已序列化好的json片段，to_json时原样写入，省去先json.loads再重新编码的开销"""
+    __slots__ = ('raw',)
+
+    def __init__(self, raw: Union[str, bytes]):
+        if isinstance(raw, (bytes, bytearray, memoryview)):
+            raw = bytes(raw).decode('utf-8')
+        self.raw = raw
+        """json文本，不做校验，需保证其本身是合法的json"""
+
+    def __raw_json__(self) -> str:
+        return self.raw
+
+    def loads(self) -> Any:
+        """解析为python对象"""
+        return json.loads(self.raw)
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and other.raw == self.raw
+
+    def __hash__(self):
+        return hash(self.raw)
+
+    def __repr__(self):
+        return f'RawJSON({self.raw[:50]!r}{"..." if len(self.raw) > 50 else ""})'
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def __modify_schema__(cls, field_schema: Dict[str, Any]):
+        field_schema.update(type='object')
+
+    @classmethod
+    def validate(cls, v):
+        if not isinstance(v, cls):
+            raise TypeError('RawJSON required')
+        return v
+
+
+def _encode_value(v: Any) -> str:
+    if isinstance(v, str):
+        return encode_basestring(v)
+    if v is None:
+        return 'null'
+    if v is True:
+        return 'true'
+    if v is False:
+        return 'false'
+    if isinstance(v, int):
+        return int.__repr__(v)
+    if isinstance(v, float):
+        return float.__repr__(v) if v == v and v not in (float('inf'), float('-inf')) else 'null'
+    return json.dumps(v, ensure_ascii=False)
+
+
+def _orjson_numeric(array: Any) -> Optional[str]:
+    """用orjson编码数值数组，orjson不可用或不支持该类型（如float16）时返回None"""
+    if orjson is None:
+        return None
+    if not array.dtype.isnative:
+        array = array.astype(array.dtype.newbyteorder('='))
+    try:
+        return orjson.dumps(np.ascontiguousarray(array), option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    except orjson.JSONEncodeError:
+        return None
+
+
+def _encode_column(column: Sequence) -> List[str]:
+    """将一列数据编码为json文本列表，numpy数组走向量化格式化"""
+    if np is not None and isinstance(column, np.ndarray):
+        kind = column.dtype.kind
+        if kind in 'iuf' and column.size:
+            text = _orjson_numeric(column)
+            if text is not None:
+                # 一维数值数组的json文本中只有分隔符是逗号
+                return text[1:-1].split(',')
+        if kind == 'b':
+            return np.where(column, 'true', 'false').tolist()
+        if kind in 'iu':
+            return column.astype(str).tolist()
+        if kind == 'f':
+            return np.where(np.isfinite(column), column.astype(str), 'null').tolist()
+        if kind == 'U':
+            return list(map(encode_basestring, column.tolist()))
+        if kind == 'M':
+            text = np.char.add(np.char.add('"', np.datetime_as_string(column)), '"')
+            return np.where(np.isnat(column), 'null', text).tolist()
+        column = column.tolist()
+    return list(map(_encode_value, column))
+
+
+def is_array(value: Any) -> bool:
+    """是否为可直接向量化编码的数组：numpy数组、array.array、memoryview"""
+    return isinstance(value, (array, memoryview)) or (np is not None and isinstance(value, np.ndarray))
+
+
+def _encode_array(value: Any) -> str:
+    """将数组编码为json文本，多维数组编码为嵌套列表"""
+    if np is None:
+        return json.dumps(value.tolist())
+    value = np.asarray(value)
+    if value.size == 0 or value.dtype.kind not in 'biufUM':
+        return dumps(value.tolist(), str)
+    if value.dtype.kind in 'biuf':
+        text = _orjson_numeric(value)
+        if text is not None:
+            return text
+    items = _encode_column(value.reshape(-1))
+    if value.ndim == 0:
+        return items[0]
+    for size in reversed(value.shape):
+        items = ['[' + ','.join(items[i:i + size]) + ']' for i in range(0, len(items), size)]
+    return items[0]
+
+
+def _encode_records(fields: Sequence[str], columns: Sequence[Sequence]) -> str:
+    """将列式数据编码为 [{字段: 值}] 格式的json文本"""
+    template = '{' + ','.join(f'{encode_basestring(f).replace("%", "%%")}:%s' for f in fields) + '}'
+    return '[' + ','.join(map(template.__mod__, zip(*map(_encode_column, columns)))) + ']'
+
+
+class OptionsColumns:
+    """
+    列式存储的选项组，适用于数万条以上的大选项列表。
+    各列以list或numpy数组保存，不会为每个选项创建dict，序列化时一次性批量编码为 [{label, value}] 格式。
+    """
+    __slots__ = ('labels', 'values', 'extra_columns', 'label_field', 'value_field', '_raw')
+
+    def __init__(self, labels: Sequence, values: Sequence = None, extra_columns: Dict[str, Sequence] = None,
+                 label_field: str = 'label', value_field: str = 'value'):
+        self.labels = labels
+        """选项标签列"""
+        self.values = labels if values is None else values
+        """选项值列，不传则与标签相同"""
+        self.extra_columns = extra_columns or {}
+        """其他字段列，如 {'disabled': [...], 'description': [...]}"""
+        self.label_field = label_field
+        """标签字段名，对应组件的labelField"""
+        self.value_field = value_field
+        """值字段名，对应组件的valueField"""
+        self._raw = None
+        size = len(self.labels)
+        for name, column in (('values', self.values), *self.extra_columns.items()):
+            if len(column) != size:
+                raise ValueError(f'column {name!r} has {len(column)} items, expected {size}')
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __iter__(self) -> Iterator[dict]:
+        fields = [self.label_field, self.value_field, *self.extra_columns]
+        columns = [self.labels, self.values, *self.extra_columns.values()]
+        if np is not None:
+            columns = [c.tolist() if isinstance(c, np.ndarray) else c for c in columns]
+        for row in zip(*columns):
+            yield dict(zip(fields, row))
+
+    def to_list(self) -> List[dict]:
+        """转换为普通的选项dict列表"""
+        return list(self)
+
+    def __raw_json__(self) -> str:
+        if self._raw is None:
+            fields = [self.label_field, self.value_field, *self.extra_columns]
+            self._raw = _encode_records(fields, [self.labels, self.values, *self.extra_columns.values()])
+        return self._raw
+
+    def __repr__(self):
+        return f'OptionsColumns(<{len(self)} options>)'
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def __modify_schema__(cls, field_schema: Dict[str, Any]):
+        field_schema.update(type='array', items={'type': 'object'})
+
+    @classmethod
+    def validate(cls, v):
+        if not isinstance(v, cls):
+            raise TypeError('OptionsColumns required')
+        return v
+
+
+class ColumnarRows:
+    """
+    列式存储的表格数据，如 Table/CRUD 的 items。各列以list或numpy数组保存，
+    序列化时一次性批量编码为 [{列名: 值}] 格式，无需先转换为dict列表。
+    """
+    __slots__ = ('columns', '_raw')
+
+    def __init__(self, columns: Dict[str, Sequence]):
+        self.columns = dict(columns)
+        """列名 -> 列数据"""
+        self._raw = None
+        sizes = {name: len(column) for name, column in self.columns.items()}
+        if len(set(sizes.values())) > 1:
+            raise ValueError(f'columns have different lengths: {sizes}')
+
+    @classmethod
+    def from_dataframe(cls, df: Any) -> 'ColumnarRows':
+        """由 pandas DataFrame 创建，各列直接使用其numpy数组"""
+        return cls({str(name): df[name].to_numpy() for name in df.columns})
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def __iter__(self) -> Iterator[dict]:
+        fields = list(self.columns)
+        columns = [c.tolist() if is_array(c) else c for c in self.columns.values()]
+        for row in zip(*columns):
+            yield dict(zip(fields, row))
+
+    def to_list(self) -> List[dict]:
+        """转换为普通的dict列表"""
+        return list(self)
+
+    def __raw_json__(self) -> str:
+        if self._raw is None:
+            self._raw = _encode_records(list(self.columns), list(self.columns.values())) if self.columns else '[]'
+        return self._raw
+
+    def __repr__(self):
+        return f'ColumnarRows(<{len(self)} rows x {len(self.columns)} columns>)'
+
+
+class ArrayData:
+    """字段类型：numpy数组、array.array、memoryview，序列化时直接向量化编码，无需先tolist"""
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def __modify_schema__(cls, field_schema: Dict[str, Any]):
+        field_schema.update(type='array')
+
+    @classmethod
+    def validate(cls, v):
+        if not is_array(v):
+            raise TypeError('array required')
+        return v
+
+
 Expression = str
 Template = Union[str, "Tpl", dict]
-SchemaNode = Union[Template, "AmisNode", List["AmisNode"], dict]
-OptionsNode = Union[List[dict], List[str]]
+SchemaNode = Union[RawJSON, Template, "AmisNode", List[Union[RawJSON, "AmisNode", dict]], dict]
+OptionsNode = Union[RawJSON, OptionsColumns, List[dict], List[str]]
+
+
+def dumps(obj: Any, encoder=None, **kwargs) -> str:
+    """
+    序列化为json，实现了 __raw_json__ 方法的对象(如RawJSON)与数组会先以占位符编码，
+    最后再一次性替换为其原始json文本；encoder 用于编码其他无法直接序列化的对象
+    """
+    fragments = []
+    token = uuid4().hex
+
+    def default(o):
+        if np is not None and isinstance(o, np.generic):
+            # df[col].max() 等得到的numpy标量
+            return o.item()
+        raw_json = getattr(o, '__raw_json__', None)
+        if raw_json is None and is_array(o):
+            raw_json = partial(_encode_array, o)
+        if raw_json is None:
+            if encoder is None:
+                raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+            return encoder(o)
+        fragments.append(raw_json())
+        return f'{token}{len(fragments) - 1}'
+
+    if isinstance(obj, BaseModel):
+        text = obj.json(encoder=default, **kwargs)
+    elif orjson is not None and not kwargs and encoder is None:
+        # 紧凑输出时优先使用orjson；指定了 encoder 时使用标准库，
+        # 否则 orjson 原生支持的类型（日期时间、UUID、枚举等）不会经过 encoder，结果取决于是否安装了 orjson
+        try:
+            text = orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except orjson.JSONEncodeError:
+            fragments.clear()
+            text = json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':'))
+    elif not kwargs:
+        # 与orjson的输出格式保持一致
+        text = json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':'))
+    else:
+        text = json.dumps(obj, default=default, **kwargs)
+    if not fragments:
+        return text
+    return re.sub(f'"{token}(\\d+)"', lambda m: fragments[int(m.group(1))], text)
 
 
 class BaseAmisModel(BaseModel):
@@ -19,9 +322,10 @@ class BaseAmisModel(BaseModel):
         json_dumps = json.dumps
 
     def to_json(self):
-        return self.json(exclude_none=True, by_alias=True, ensure_ascii=False, indent=4)
+        return dumps(self, self.__json_encoder__, exclude_none=True, by_alias=True, ensure_ascii=False, indent=4)
 
     def to_dict(self):
+        """输出为python字典，其中的RawJSON会保持原样，不会被解析"""
         return self.dict(exclude_none=True, by_alias=True)
 
     def update_from_dict(self, kwargs: Dict[str, Any]):
@@ -39,10 +343,17 @@ class BaseAmisApiOut(BaseAmisModel):
     """状态码，0代表成功，其他代表失败"""
     msg: str = ''
     """提示信息"""
-    data: dict = None
+    data: Union[RawJSON, dict] = None
     """回传数据"""
 
 
+def encode_response(data: Any) -> str:
+    """编码为接口返回的json文本，data 为 BaseAmisApiOut 时原样编码，否则作为其 data"""
+    if isinstance(data, BaseAmisApiOut):
+        return dumps(data, exclude_none=True)
+    return dumps({'status': 0, 'msg': '', 'data': data})
+
+
 class AmisNode(BaseAmisModel):
     """组件配置"""
     type: str = None
@@ -70,7 +381,7 @@ class AmisAPI(BaseAmisModel):
     """当前接口 Api 地址"""
     method: Literal["get", "post", "put", "delete"] = None
     """请求方式 支持：get、post、put、delete"""
-    data: Union[str, dict] = None
+    data: Union[str, RawJSON, dict] = None
     """请求的数据体,支持数据映射"""
     dataType: str = "json"
     """
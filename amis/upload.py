@@ -0,0 +1,299 @@
+"""InputFile 分块上传（startChunkApi/chunkApi/finishChunkApi）的服务端实现，与 web 框架无关"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Mapping, Optional, Union
+
+from .components import InputFile
+from .types import BaseAmisApiOut
+
+BLOCK_SIZE = 1024 * 1024
+"""流式写入时每次读取的字节数"""
+MAX_PARTS = 10000
+"""单个文件最多的分块数"""
+
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+_PART_RE = re.compile(r'^(\d+)-([0-9a-f]{32})$')
+_UNSAFE_NAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def _safe_filename(filename: str) -> str:
+    name = _UNSAFE_NAME_RE.sub('_', os.path.basename(str(filename or '').replace('\\', '/'))).strip(' .')
+    return name[:200] or 'file'
+
+
+def _preallocate(fd: int, size: int):
+    if size > 0 and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            # 部分文件系统不支持预分配
+            pass
+
+
+def _copy_range(src: int, dst: int, size: int, offset: int):
+    """将 src 的全部内容复制到 dst 的 offset 处，优先使用内核内的零拷贝"""
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < size:
+                n = os.copy_file_range(src, dst, size - copied, copied, offset + copied)
+                if n == 0:
+                    break
+                copied += n
+            return
+        except OSError:
+            pass
+    if hasattr(os, 'sendfile'):
+        try:
+            os.lseek(dst, offset + copied, os.SEEK_SET)
+            while copied < size:
+                n = os.sendfile(dst, src, copied, size - copied)
+                if n == 0:
+                    break
+                copied += n
+            return
+        except OSError:
+            pass
+    os.lseek(src, copied, os.SEEK_SET)
+    os.lseek(dst, offset + copied, os.SEEK_SET)
+    while copied < size:
+        block = os.read(src, min(BLOCK_SIZE, size - copied))
+        if not block:
+            break
+        os.write(dst, block)
+        copied += len(block)
+
+
+class ChunkUploader:
+    """
+    分块上传接收器：
+    - start 创建上传任务，返回 key 与 uploadId；传入已有的 uploadId 时继续之前中断的上传
+    - chunk 将分块流式写入独立的文件（预分配空间），分块可以并发、乱序上传，重复上传的分块会覆盖之前的
+    - finish 按 partList 校验每个分块的 eTag（md5），再按顺序零拷贝拼接为最终文件
+    上传中的分块保存在 {directory}/.uploads/{uploadId} 下，完成的文件保存在 {directory}/{key}。
+    """
+
+    def __init__(self, directory: Union[str, Path], chunk_size: int = 5 * 1024 * 1024, max_size: int = None,
+                 url_prefix: str = '', expire: float = 24 * 3600):
+        self.directory = Path(directory)
+        """文件保存目录"""
+        self.chunk_size = chunk_size
+        """分块大小，同时是单个分块允许的最大字节数"""
+        self.max_size = max_size
+        """文件大小上限（字节），None 为不限制"""
+        self.url_prefix = url_prefix
+        """下载地址前缀，完成上传后返回的 url 为 url_prefix + key"""
+        self.expire = expire
+        """未完成的上传任务保留的秒数，见 cleanup"""
+        self._uploads = self.directory / '.uploads'
+
+    @classmethod
+    def from_input_file(cls, field: InputFile, directory: Union[str, Path], **kwargs) -> 'ChunkUploader':
+        """按 InputFile 的 chunkSize、maxSize 创建接收器"""
+        kwargs.setdefault('chunk_size', field.chunkSize or 5 * 1024 * 1024)
+        kwargs.setdefault('max_size', field.maxSize)
+        return cls(directory, **kwargs)
+
+    def configure(self, field: InputFile, url: str) -> InputFile:
+        """
+        设置 InputFile 的分块上传配置，接口地址为 {url}/start、{url}/chunk、{url}/finish，
+        小于一个分块的文件通过 {url}/receive 直接上传。
+        """
+        url = url.rstrip('/')
+        field.receiver = f'post:{url}/receive'
+        field.useChunk = 'auto'
+        field.chunkSize = self.chunk_size
+        field.startChunkApi = f'post:{url}/start'
+        field.chunkApi = f'post:{url}/chunk'
+        field.finishChunkApi = f'post:{url}/finish'
+        if self.max_size:
+            field.maxSize = self.max_size
+        return field
+
+    def input_file(self, name: str, url: str, **kwargs) -> InputFile:
+        """生成配置好分块上传接口的 InputFile"""
+        return self.configure(InputFile(name=name, **kwargs), url)
+
+    def _upload_dir(self, upload_id: Any) -> Path:
+        if not isinstance(upload_id, str) or not _UPLOAD_ID_RE.match(upload_id):
+            raise ValueError('invalid uploadId')
+        return self._uploads / upload_id
+
+    def _meta(self, upload_id: str) -> Optional[dict]:
+        try:
+            return json.loads((self._upload_dir(upload_id) / 'meta.json').read_text('utf-8'))
+        except FileNotFoundError:
+            return None
+
+    def parts(self, upload_id: str) -> Dict[int, str]:
+        """已接收的分块 {分块号: eTag}，用于断点续传"""
+        result = {}
+        for entry in os.scandir(self._upload_dir(upload_id)):
+            m = _PART_RE.match(entry.name)
+            if m:
+                result[int(m.group(1))] = m.group(2)
+        return result
+
+    def start(self, filename: str, upload_id: str = None) -> BaseAmisApiOut:
+        """startChunkApi：创建上传任务，upload_id 为之前中断的任务时返回其已接收的分块"""
+        if upload_id:
+            try:
+                meta = self._meta(upload_id)
+            except ValueError as e:
+                return BaseAmisApiOut(status=422, msg=str(e))
+            if meta is not None:
+                parts = [{'partNumber': n, 'eTag': e} for n, e in sorted(self.parts(upload_id).items())]
+                return BaseAmisApiOut(data={'key': meta['key'], 'uploadId': upload_id, 'parts': parts})
+        upload_id = uuid.uuid4().hex
+        key = f'{upload_id[:2]}/{upload_id}/{_safe_filename(filename)}'
+        path = self._upload_dir(upload_id)
+        path.mkdir(parents=True)
+        meta = {'key': key, 'filename': _safe_filename(filename), 'created': time.time()}
+        (path / 'meta.json').write_text(json.dumps(meta), 'utf-8')
+        return BaseAmisApiOut(data={'key': key, 'uploadId': upload_id})
+
+    def chunk(self, upload_id: str, part_number: Any, stream: Union[BinaryIO, bytes],
+              part_size: Any = None) -> BaseAmisApiOut:
+        """chunkApi：流式写入一个分块，返回其 eTag"""
+        try:
+            path = self._upload_dir(upload_id)
+            part_number = int(part_number)
+            part_size = int(part_size) if part_size not in (None, '') else None
+        except (TypeError, ValueError) as e:
+            return BaseAmisApiOut(status=422, msg=str(e))
+        if not 1 <= part_number <= MAX_PARTS:
+            return BaseAmisApiOut(status=422, msg='invalid partNumber')
+        if part_size is not None and not 0 <= part_size <= self.chunk_size:
+            return BaseAmisApiOut(status=413, msg='chunk too large')
+        if not (path / 'meta.json').is_file():
+            return BaseAmisApiOut(status=404, msg='upload not found')
+        if isinstance(stream, (bytes, bytearray, memoryview)):
+            data, stream = memoryview(stream), None
+        digest = hashlib.md5()
+        size = 0
+        # 每次写入使用独立的临时文件，同一分块并发重传时互不影响
+        tmp = path / f'{part_number}.{uuid.uuid4().hex}.tmp'
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            _preallocate(fd, part_size if part_size is not None else (len(data) if stream is None else 0))
+            while True:
+                if stream is None:
+                    block, data = data[:BLOCK_SIZE], data[BLOCK_SIZE:]
+                else:
+                    block = stream.read(BLOCK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if size > self.chunk_size:
+                    raise OverflowError
+                digest.update(block)
+                view = memoryview(block)
+                while view:
+                    view = view[os.write(fd, view):]
+            if part_size is not None and size != part_size:
+                raise EOFError
+            # 预分配的空间可能大于实际写入的数据
+            os.ftruncate(fd, size)
+        except (OverflowError, EOFError) as e:
+            os.close(fd)
+            tmp.unlink()
+            if isinstance(e, OverflowError):
+                return BaseAmisApiOut(status=413, msg='chunk too large')
+            return BaseAmisApiOut(status=422, msg='incomplete chunk')
+        except BaseException:
+            os.close(fd)
+            tmp.unlink()
+            raise
+        os.close(fd)
+        etag = digest.hexdigest()
+        for n, old in self.parts(upload_id).items():
+            if n == part_number and old != etag:
+                (path / f'{n}-{old}').unlink(missing_ok=True)
+        os.replace(tmp, path / f'{part_number}-{etag}')
+        return BaseAmisApiOut(data={'eTag': etag})
+
+    @staticmethod
+    def _assemble(path: Path, files: List[Path], sizes: List[int], total: int, target: Path):
+        # 每次拼接使用唯一的临时文件，同一上传并发 finish 时互不覆盖，最后原子替换为目标文件
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=path)
+        try:
+            _preallocate(fd, total)
+            offset = 0
+            for f, size in zip(files, sizes):
+                src = os.open(f, os.O_RDONLY)
+                try:
+                    _copy_range(src, fd, size, offset)
+                finally:
+                    os.close(src)
+                offset += size
+            os.ftruncate(fd, total)
+        except BaseException:
+            os.close(fd)
+            os.unlink(tmp)
+            raise
+        os.close(fd)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+
+    def finish(self, upload_id: str, part_list: List[Mapping[str, Any]]) -> BaseAmisApiOut:
+        """finishChunkApi：校验分块并拼接为最终文件，返回 {value: key, url, filename, size}"""
+        try:
+            path = self._upload_dir(upload_id)
+            expected = sorted((int(p['partNumber']), str(p['eTag'])) for p in part_list or [])
+        except (KeyError, TypeError, ValueError) as e:
+            return BaseAmisApiOut(status=422, msg=f'invalid partList: {e}')
+        meta = self._meta(upload_id)
+        if meta is None:
+            return BaseAmisApiOut(status=404, msg='upload not found')
+        if not expected or [n for n, _ in expected] != list(range(1, len(expected) + 1)):
+            return BaseAmisApiOut(status=422, msg='partList must be numbered from 1 without gaps')
+        received = self.parts(upload_id)
+        for n, etag in expected:
+            if received.get(n) != etag.strip('"'):
+                return BaseAmisApiOut(status=422, msg=f'part {n} is missing or its eTag does not match')
+        files = [path / f'{n}-{received[n]}' for n, _ in expected]
+        sizes = [f.stat().st_size for f in files]
+        total = sum(sizes)
+        if self.max_size and total > self.max_size:
+            return BaseAmisApiOut(status=413, msg='file too large')
+        target = self.directory / meta['key']
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self._assemble(path, files, sizes, total, target)
+        except FileNotFoundError:
+            # 同一上传的另一个 finish 已完成拼接并清理了分块
+            if not target.exists():
+                raise
+            total = target.stat().st_size
+        shutil.rmtree(path, ignore_errors=True)
+        return BaseAmisApiOut(data={'value': meta['key'], 'url': self.url_prefix + meta['key'],
+                                    'filename': meta['filename'], 'size': total})
+
+    def receive(self, filename: str, stream: Union[BinaryIO, bytes]) -> BaseAmisApiOut:
+        """receiver：不分块的小文件直接上传"""
+        start = self.start(filename)
+        upload_id = start.data['uploadId']
+        result = self.chunk(upload_id, 1, stream)
+        if result.status != 0:
+            shutil.rmtree(self._upload_dir(upload_id), ignore_errors=True)
+            return result
+        return self.finish(upload_id, [{'partNumber': 1, 'eTag': result.data['eTag']}])
+
+    def cleanup(self) -> int:
+        """删除超过 expire 秒未完成的上传任务，返回删除的任务数"""
+        if not self._uploads.is_dir():
+            return 0
+        deadline = time.time() - self.expire
+        count = 0
+        for entry in os.scandir(self._uploads):
+            if entry.is_dir() and entry.stat().st_mtime < deadline:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                count += 1
+        return count
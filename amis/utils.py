@@ -0,0 +1,89 @@
+"""组件树遍历等通用工具"""
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+from .types import BaseAmisModel
+
+
+def iter_children(value: Any) -> Iterator[BaseAmisModel]:
+    """遍历某个字段值中直接包含的组件，会深入到list/tuple/dict中"""
+    if isinstance(value, BaseAmisModel):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from iter_children(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from iter_children(item)
+
+
+def walk(node: Any) -> Iterator[BaseAmisModel]:
+    """深度优先遍历组件树中的所有组件（包括自身），包括额外传入的字段"""
+    stack = list(iter_children(node))[::-1]
+    while stack:
+        current = stack.pop()
+        yield current
+        children = []
+        for value in current.__dict__.values():
+            children.extend(iter_children(value))
+        stack.extend(reversed(children))
+
+
+def split_api(api: Any) -> Tuple[str, str]:
+    """取出 api 配置的请求方法（小写）与地址，支持 "post:/api/x" 形式的字符串"""
+    if isinstance(api, str):
+        method, sep, url = api.partition(':')
+        if sep and method.lower() in ('get', 'post', 'put', 'delete', 'patch', 'jsonp', 'js'):
+            return method.lower(), url
+        return 'get', api
+    if isinstance(api, dict):
+        return (api.get('method') or 'get').lower(), api.get('url') or ''
+    return (getattr(api, 'method', None) or 'get').lower(), getattr(api, 'url', None) or ''
+
+
+def transform(node: Any, func: Callable[[BaseAmisModel], Optional[BaseAmisModel]]) -> int:
+    """
+    自上而下遍历组件树，用 func 的返回值替换每个组件：返回组件本身时保留并继续遍历其子组件，
+    返回其他组件时替换，返回 None 时移除（列表中的直接删除，字段值设为 None）。
+    被替换、移除的组件的子组件不再遍历；不会处理传入的根节点。返回替换、移除的组件数。
+    """
+    count = 0
+    stack = list(iter_children(node))
+    while stack:
+        current = stack.pop()
+        for key, value in list(current.__dict__.items()):
+            new, changed = _transform_value(value, func, stack)
+            if changed:
+                setattr(current, key, new)
+                count += changed
+    return count
+
+
+def _transform_value(value: Any, func: Callable, stack: list) -> Tuple[Any, int]:
+    if isinstance(value, BaseAmisModel):
+        new = func(value)
+        if new is value:
+            stack.append(value)
+            return value, 0
+        return new, 1
+    if isinstance(value, (list, tuple)):
+        items, count = [], 0
+        for item in value:
+            new, changed = _transform_value(item, func, stack)
+            count += changed
+            if new is not None or item is None:
+                items.append(new)
+        return (type(value)(items) if count else value), count
+    if isinstance(value, dict):
+        items, count = {}, 0
+        for k, item in value.items():
+            new, changed = _transform_value(item, func, stack)
+            count += changed
+            if new is not None or item is None:
+                items[k] = new
+        return (items if count else value), count
+    return value, 0
+
+
+def prune(node: Any, remove: Callable[[BaseAmisModel], bool]) -> int:
+    """自上而下遍历组件树，移除 remove 返回 True 的组件，见 transform，返回移除的组件数"""
+    return transform(node, lambda child: None if remove(child) else child)
@@ -0,0 +1,325 @@
+"""根据 Form 定义编译服务端校验器，用于校验表单提交的数据"""
+import json
+import re
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .components import Form
+from .expression import truthiness
+from .types import BaseAmisApiOut, BaseAmisModel
+
+Check = Callable[[Any, Mapping], Optional[str]]
+
+MESSAGES = {
+    'required': '这是必填项',
+    'isEmail': 'Email 格式不正确',
+    'isUrl': 'Url 格式不正确',
+    'isNumeric': '请输入数字',
+    'isAlpha': '请输入字母',
+    'isAlphanumeric': '请输入字母或者数字',
+    'isInt': '请输入整型数字',
+    'isFloat': '请输入浮点型数值',
+    'isLength': '请输入长度为 {} 的内容',
+    'minLength': '请输入更多的内容，至少输入 {} 个字符。',
+    'maxLength': '请控制内容长度, 不要输入 {} 个字符以上',
+    'maximum': '当前输入值超出最大值 {}，请检查',
+    'minimum': '当前输入值低于最小值 {}，请检查',
+    'equals': '输入的数据与 {} 不一致',
+    'equalsField': '输入的数据与 {} 值不一致',
+    'isJson': '请检查 Json 格式。',
+    'isUrlPath': '只能输入字母、数字、`-` 和 `_`.',
+    'isPhoneNumber': '请输入合法的手机号码',
+    'isTelNumber': '请输入合法的电话号码',
+    'isZipcode': '请输入合法的邮编地址',
+    'isId': '请输入合法的身份证号',
+    'matchRegexp': '格式不正确, 请输入符合规则为 `{}` 的内容。',
+    'minItems': '请至少添加 {} 项',
+    'maxItems': '最多只能添加 {} 项',
+}
+"""默认错误提示，与 amis 中文提示保持一致，可通过表单项的 validationErrors 覆盖"""
+
+PATTERNS = {
+    'isEmail': re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$'),
+    'isUrl': re.compile(r'^(?:(?:https?|ftp)://)[^\s/$.?#].[^\s]*$', re.I),
+    'isNumeric': re.compile(r'^[-+]?(?:\d*[.])?\d+$'),
+    'isAlpha': re.compile(r'^[a-zA-Z]+$'),
+    'isAlphanumeric': re.compile(r'^[0-9a-zA-Z]+$'),
+    'isInt': re.compile(r'^[-+]?(?:0|[1-9]\d*)$'),
+    'isFloat': re.compile(r'^[-+]?(?:\d+)?(?:\.\d*)?(?:[eE][+\-]?\d+)?$'),
+    'isUrlPath': re.compile(r'^[a-z0-9_\-]+$', re.I),
+    'isPhoneNumber': re.compile(r'^1[3-9]\d{9}$'),
+    'isTelNumber': re.compile(r'^(\(\d{3,4}\)|\d{3,4}-|\s)?\d{7,14}$'),
+    'isZipcode': re.compile(r'^[1-9]\d{5}$'),
+    'isId': re.compile(r'^(\d{15}|\d{17}[\dXx])$'),
+}
+
+NESTED_TYPES = {'combo', 'input-table', 'input-sub-form'}
+"""拥有独立子数据域的表单项"""
+SCOPE_TYPES = {'form', 'crud', 'dialog', 'drawer'}
+"""遍历时不再深入的组件，其中的表单项不属于当前表单"""
+
+_RULE_RE = re.compile(r'(\w+)(?::(/(?:\\.|[^/])*/[gimsuy]*|[^,]*))?')
+
+
+def _get(node: Any, key: str, default: Any = None) -> Any:
+    if isinstance(node, dict):
+        return node.get(key, default)
+    return getattr(node, key, default)
+
+
+def _lookup(data: Mapping, name: str) -> Any:
+    value = data
+    for part in name.split('.'):
+        if not isinstance(value, Mapping):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == '' or value == [] or value == {}
+
+
+def _parse_regexp(pattern: str):
+    # amis 中正则写作 /xxx/flags 的形式
+    m = re.match(r'^/(.*)/([gimsuy]*)$', pattern, re.S)
+    if not m:
+        return re.compile(pattern)
+    flags = 0
+    for flag, value in (('i', re.I), ('m', re.M), ('s', re.S)):
+        if flag in m.group(2):
+            flags |= value
+    return re.compile(m.group(1), flags)
+
+
+def _parse_rules(validations: Any) -> List[Tuple[str, Any]]:
+    if validations is None:
+        return []
+    if isinstance(validations, str):
+        # 字符串形式如 "isEmail,minLength:3,matchRegexp:/^a/"
+        return [(name, arg or True) for name, arg in _RULE_RE.findall(validations) if name]
+    if isinstance(validations, BaseAmisModel):
+        validations = validations.dict(exclude_none=True)
+    return [(k, v) for k, v in validations.items() if v is not None and v is not False]
+
+
+def _to_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rule_check(rule: str, arg: Any, message: str) -> Optional[Check]:
+    if rule in PATTERNS:
+        pattern = PATTERNS[rule]
+        return lambda v, d: None if pattern.match(str(v)) else message
+    if rule.startswith('matchRegexp'):
+        pattern = _parse_regexp(str(arg))
+        return lambda v, d: None if pattern.search(str(v)) else message
+    if rule in ('minLength', 'maxLength', 'isLength'):
+        n = int(arg)
+        compare = {'minLength': lambda x: x >= n, 'maxLength': lambda x: x <= n, 'isLength': lambda x: x == n}[rule]
+        return lambda v, d: None if compare(len(v) if isinstance(v, (str, list, tuple)) else len(str(v))) else message
+    if rule in ('minimum', 'maximum'):
+        n = float(arg)
+        compare = (lambda x: x >= n) if rule == 'minimum' else (lambda x: x <= n)
+        return lambda v, d: None if (_to_number(v) is not None and compare(_to_number(v))) else message
+    if rule == 'equals':
+        return lambda v, d: None if str(v) == str(arg) else message
+    if rule == 'equalsField':
+        return lambda v, d: None if v == _lookup(d, str(arg)) else message
+    if rule == 'isJson':
+        def check_json(v, d):
+            if not isinstance(v, str):
+                return None
+            try:
+                json.loads(v)
+            except ValueError:
+                return message
+            return None
+
+        return check_json
+    return None
+
+
+class FieldValidator:
+    """
+    单个表单项的校验规则，嵌套的 Combo/InputTable/InputSubForm 通过 item 校验每个子项。
+    表单项（或其所在容器）的 visibleOn/hiddenOn 及 requiredOn 按提交的数据求值：
+    隐藏的表单项 amis 不会校验，结果无法确定时同样不校验。
+    """
+    __slots__ = ('name', 'required', 'required_message', 'checks', 'item', 'multiple', 'flat', 'min_items',
+                 'max_items', 'conditions', 'required_on')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.required = False
+        self.required_message = MESSAGES['required']
+        self.checks: List[Check] = []
+        self.item: Optional['FormValidator'] = None
+        self.multiple = False
+        self.flat = False
+        self.min_items = None
+        self.max_items = None
+        self.conditions: List[Tuple[str, bool]] = []
+        """(表达式, 显示时的真假)，来自 visibleOn/hiddenOn，全部满足时表单项才显示"""
+        self.required_on: Optional[str] = None
+
+    def visible(self, data: Mapping) -> bool:
+        return all(truthiness(expression, data) is shown for expression, shown in self.conditions)
+
+    def validate(self, data: Mapping, errors: Dict[str, str], prefix: str = ''):
+        if self.conditions and not self.visible(data):
+            return
+        path = prefix + self.name
+        value = _lookup(data, self.name)
+        if _is_empty(value):
+            if self.required or self.required_on and truthiness(self.required_on, data) is True:
+                errors[path] = self.required_message
+            return
+        for check in self.checks:
+            message = check(value, data)
+            if message:
+                errors[path] = message
+                return
+        if self.item is None:
+            return
+        items = value if self.multiple else [value]
+        if not isinstance(items, list):
+            errors[path] = '数据格式不正确'
+            return
+        if self.min_items and len(items) < self.min_items:
+            errors[path] = MESSAGES['minItems'].format(self.min_items)
+            return
+        if self.max_items and len(items) > self.max_items:
+            errors[path] = MESSAGES['maxItems'].format(self.max_items)
+            return
+        for i, item in enumerate(items):
+            sub_prefix = f'{path}.{i}.' if self.multiple else f'{path}.'
+            if self.flat:
+                self.item.fields[0].validate({self.item.fields[0].name: item}, errors, sub_prefix)
+            elif isinstance(item, Mapping):
+                self.item.validate(item, errors, sub_prefix)
+            else:
+                errors[path] = '数据格式不正确'
+
+
+class FormValidator:
+    """由 Form 定义预先编译好的校验器，校验时不再访问表单定义"""
+
+    def __init__(self, fields: List[FieldValidator]):
+        self.fields = fields
+
+    def validate(self, data: Mapping, errors: Dict[str, str] = None, prefix: str = '') -> Dict[str, str]:
+        """校验数据，返回 {字段路径: 错误信息}，没有错误时为空字典"""
+        errors = {} if errors is None else errors
+        for field in self.fields:
+            field.validate(data, errors, prefix)
+        return errors
+
+    def response(self, data: Mapping) -> Optional[BaseAmisApiOut]:
+        """校验数据，不通过时返回 amis 可识别的错误响应（含 errors），通过时返回 None"""
+        errors = self.validate(data)
+        if not errors:
+            return None
+        return BaseAmisApiOut(status=422, msg=next(iter(errors.values())), errors=errors)
+
+
+def _conditions(node: Any) -> Optional[List[Tuple[str, bool]]]:
+    """组件的显示条件，确定隐藏（hidden、visible 为 False）时返回 None"""
+    # FormItem 的 visible 声明为字符串，False 会被转换为 'False'
+    if _get(node, 'hidden') is True or _get(node, 'visible') in (False, 'False'):
+        return None
+    conditions = []
+    for key, shown in (('visibleOn', True), ('hiddenOn', False)):
+        if isinstance(_get(node, key), str) and _get(node, key):
+            conditions.append((_get(node, key), shown))
+    return conditions
+
+
+def _compile_field(node: Any, name: str) -> FieldValidator:
+    field = FieldValidator(name)
+    node_type = _get(node, 'type')
+    field.required = bool(_get(node, 'required'))
+    if isinstance(_get(node, 'requiredOn'), str) and _get(node, 'requiredOn'):
+        field.required_on = _get(node, 'requiredOn')
+    custom = _get(node, 'validationErrors') or {}
+    if custom.get('required'):
+        field.required_message = custom['required']
+    if node_type == 'input-number':
+        field.checks.append(lambda v, d: None if _to_number(v) is not None else MESSAGES['isNumeric'])
+        for rule, key in (('minimum', 'min'), ('maximum', 'max')):
+            bound = _to_number(_get(node, key))
+            if bound is not None:
+                field.checks.append(_rule_check(rule, bound, MESSAGES[rule].format(_get(node, key))))
+    for rule, arg in _parse_rules(_get(node, 'validations')):
+        if custom.get(rule):
+            message = custom[rule].replace('$1', str(arg))
+        else:
+            message = MESSAGES.get('matchRegexp' if rule.startswith('matchRegexp') else rule, '').format(arg)
+        check = _rule_check(rule, arg, message)
+        if check is not None:
+            field.checks.append(check)
+    if node_type in NESTED_TYPES:
+        if node_type == 'combo':
+            field.item = FormValidator(_compile_items(_get(node, 'items') or []))
+            field.multiple = bool(_get(node, 'multiple'))
+            field.flat = (bool(_get(node, 'flat')) and field.multiple and len(_get(node, 'items') or []) == 1
+                          and len(field.item.fields) == 1)
+        elif node_type == 'input-table':
+            columns = []
+            for column in _get(node, 'columns') or []:
+                quick_edit = _get(column, 'quickEdit')
+                if isinstance(quick_edit, (dict, BaseAmisModel)) and _get(column, 'name'):
+                    columns.append(_compile_field(quick_edit, _get(quick_edit, 'name') or _get(column, 'name')))
+            field.item = FormValidator([c for c in columns if c.required or c.required_on or c.checks or c.item])
+            field.multiple = True
+        else:
+            form = _get(node, 'form')
+            field.item = FormValidator(_compile_items(_get(form, 'body') or []) if form is not None else [])
+            field.multiple = bool(_get(node, 'multiple'))
+        if field.multiple:
+            field.min_items = _to_number(_get(node, 'minLength')) or None
+            field.max_items = _to_number(_get(node, 'maxLength')) or None
+    return field
+
+
+def _compile_items(nodes: Any) -> List[FieldValidator]:
+    fields = []
+    # (节点, 所在容器的显示条件)
+    stack = [(nodes, [])]
+    while stack:
+        value, inherited = stack.pop()
+        if isinstance(value, (list, tuple)):
+            stack.extend((v, inherited) for v in reversed(value))
+            continue
+        if not isinstance(value, (dict, BaseAmisModel)):
+            continue
+        node_type = _get(value, 'type')
+        if node_type in SCOPE_TYPES:
+            continue
+        conditions = _conditions(value) if node_type is not None else []
+        if conditions is None:
+            continue
+        conditions = inherited + conditions
+        name = _get(value, 'name')
+        if isinstance(name, str) and name and node_type is not None:
+            field = _compile_field(value, name)
+            field.conditions = conditions
+            if field.required or field.required_on or field.checks or field.item is not None:
+                fields.append(field)
+            if node_type in NESTED_TYPES:
+                continue
+        children = value.values() if isinstance(value, dict) else value.__dict__.values()
+        stack.extend((v, conditions) for v in reversed(
+            [v for v in children if isinstance(v, (list, tuple, dict, BaseAmisModel))]))
+    return fields
+
+
+def compile_validator(form: Form) -> FormValidator:
+    """编译表单的校验器，见 Form.compile_validator"""
+    return FormValidator(_compile_items(form.body or []))